@@ -44,7 +44,8 @@ INSTALLED_APPS = [
     'core',
     'user',
     'label',
-    'dataset'
+    'dataset',
+    'classifier'
 ]
 
 MIDDLEWARE = [
@@ -138,6 +139,52 @@ STATIC_ROOT = '/vol/web/static'
 
 AUTH_USER_MODEL = 'core.User'
 
+# Number of worker processes running background jobs such as csv ingest,
+# 0 runs the jobs inline in the request
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+
+# Number of processes parsing the shards of one large csv
+INGEST_PARSE_WORKERS = int(
+    os.environ.get('INGEST_PARSE_WORKERS', os.cpu_count() or 1)
+)
+
+# Number of trained models whose weights are kept in memory per process
+MODEL_CACHE_SIZE = 16
+
+# Micro-batching of predict requests: requests smaller than
+# PREDICT_BATCH_MAX_ITEMS images wait up to PREDICT_BATCH_MAX_WAIT_MS for
+# others to share one forward pass
+PREDICT_BATCHING = True
+PREDICT_BATCH_MAX_ITEMS = 256
+PREDICT_BATCH_MAX_WAIT_MS = 2
+
+# Token lookups cached per process for up to AUTH_TOKEN_CACHE_TTL seconds;
+# AUTH_TOKEN_SHARED_CACHE optionally names a cache of CACHES shared by the
+# processes of a server
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 300
+AUTH_TOKEN_SHARED_CACHE = os.environ.get('AUTH_TOKEN_SHARED_CACHE')
+
+# CACHE_BACKEND and CACHE_LOCATION switch the default cache to one shared
+# by the processes, e.g. memcached or redis
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+    'lists': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lists',
+    },
+}
+
+# Per process cache of the per user list responses; their generation
+# counters live in the database, where the job workers bump them
+LIST_CACHE = 'lists'
+LIST_CACHE_SECONDS = 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -24,4 +24,5 @@ urlpatterns = [
     path('api/user/', include('user.urls')),
     path('api/label/', include('label.urls')),
     path('api/dataset/', include('dataset.urls')),
+    path('api/', include('classifier.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from django.conf import settings
+
+from classifier import engine
+
+
+class MicroBatcher:
+    """Coalesce concurrent predictions into one forward pass per model
+
+    Callers put their images on a queue and wait on a future. A single
+    worker thread collects requests until max_items images are queued or
+    max_wait_ms has passed since the first one, runs one forward pass per
+    model over the stacked images and hands every caller its rows back.
+    The thread is started lazily and again after a fork, so the batcher
+    works in every process of a WSGI or ASGI server.
+    """
+
+    def __init__(self, max_items=None, max_wait_ms=None):
+        self._max_items = max_items
+        self._max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._batch_sizes = Counter()
+        self._batches = 0
+        self._items = 0
+
+    @property
+    def max_items(self):
+        return self._max_items or settings.PREDICT_BATCH_MAX_ITEMS
+
+    @property
+    def max_wait(self):
+        wait_ms = self._max_wait_ms
+        if wait_ms is None:
+            wait_ms = settings.PREDICT_BATCH_MAX_WAIT_MS
+
+        return wait_ms / 1000
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(
+                    target=self._run, name='predict-batcher', daemon=True
+                )
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, key, params, pixels):
+        """Queue a batch of images, return a future of its probabilities"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((key, params, pixels, future))
+
+        return future
+
+    def predict(self, key, params, pixels, timeout=None):
+        """Return the probabilities of a batch, blocking until computed"""
+        return self.submit(key, params, pixels).result(timeout=timeout)
+
+    async def apredict(self, key, params, pixels):
+        """Return the probabilities of a batch from a coroutine"""
+        return await asyncio.wrap_future(self.submit(key, params, pixels))
+
+    def _collect(self):
+        """Block for a first request, then gather more until full or late"""
+        requests = [self._queue.get()]
+        items = len(requests[0][2])
+        deadline = time.monotonic() + self.max_wait
+        while items < self.max_items:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            requests.append(request)
+            items += len(request[2])
+
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            groups = {}
+            for request in requests:
+                groups.setdefault(request[0], []).append(request)
+            for group in groups.values():
+                self._forward(group)
+
+    def _forward(self, group):
+        """Run one forward pass for the requests of a single model"""
+        params = group[0][1]
+        sizes = [len(pixels) for _, _, pixels, _ in group]
+        try:
+            probs = engine.predict_proba(
+                params, np.concatenate([pixels for _, _, pixels, _ in group])
+            )
+        except Exception as exc:
+            for _, _, _, future in group:
+                future.set_exception(exc)
+            return
+        with self._lock:
+            self._batches += 1
+            self._items += sum(sizes)
+            self._batch_sizes[1 << (sum(sizes).bit_length() - 1)] += 1
+        for (_, _, _, future), part in zip(
+                group, np.split(probs, np.cumsum(sizes)[:-1])):
+            future.set_result(part)
+
+    def stats(self):
+        """Return the queue depth and the histogram of batch sizes
+
+        Batch sizes are bucketed by power of two, bucket n counting the
+        batches of n to 2n - 1 images.
+        """
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'batch_sizes': {
+                    str(size): count
+                    for size, count in sorted(self._batch_sizes.items())
+                },
+            }
+
+
+batcher = MicroBatcher()
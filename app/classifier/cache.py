@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from classifier import training
+
+
+class ModelCache:
+    """Thread safe LRU of loaded weights keyed by model id and version
+
+    A new training run bumps the version of a model, so stale weights are
+    never served and simply age out of the cache.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        """Return the weights and classes of a trained model"""
+        key = (model.id, model.version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        entry = training.load_checkpoint(model)
+        maxsize = self.maxsize or settings.MODEL_CACHE_SIZE
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+model_cache = ModelCache()
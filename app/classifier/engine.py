@@ -0,0 +1,124 @@
+import time
+
+import numpy as np
+
+
+SOFTMAX = 'softmax'
+MLP = 'mlp'
+
+
+def init_params(architecture, n_inputs, n_classes, hidden_units=128,
+                seed=0):
+    """Return freshly initialised float32 weights of a classifier"""
+    rng = np.random.default_rng(seed)
+    params = {
+        'mean': np.zeros(n_inputs, dtype=np.float32),
+        'scale': np.full(n_inputs, 1 / 255, dtype=np.float32),
+    }
+    if architecture == SOFTMAX:
+        params['W1'] = np.zeros((n_inputs, n_classes), dtype=np.float32)
+        params['b1'] = np.zeros(n_classes, dtype=np.float32)
+    elif architecture == MLP:
+        params['W1'] = (rng.standard_normal((n_inputs, hidden_units)) *
+                        np.sqrt(2 / n_inputs)).astype(np.float32)
+        params['b1'] = np.zeros(hidden_units, dtype=np.float32)
+        params['W2'] = (rng.standard_normal((hidden_units, n_classes)) *
+                        np.sqrt(2 / hidden_units)).astype(np.float32)
+        params['b2'] = np.zeros(n_classes, dtype=np.float32)
+    else:
+        raise ValueError(f'architecture {architecture} is not valid!')
+
+    return params
+
+
+def preprocess(params, pixels):
+    """Flatten uint8 pixels and normalise them with the model statistics"""
+    X = np.asarray(pixels, dtype=np.float32).reshape(len(pixels), -1)
+    X -= params['mean']
+    X *= params['scale']
+
+    return X
+
+
+def softmax(logits):
+    """Row wise softmax, computed in place"""
+    logits -= logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+
+    return logits
+
+
+def _forward(params, X):
+    """Return the class probabilities and the hidden activations"""
+    if 'W2' not in params:
+        return softmax(X @ params['W1'] + params['b1']), None
+    hidden = X @ params['W1'] + params['b1']
+    np.maximum(hidden, 0, out=hidden)
+
+    return softmax(hidden @ params['W2'] + params['b2']), hidden
+
+
+def predict_proba(params, pixels):
+    """Return the class probabilities of a batch of uint8 images"""
+    return _forward(params, preprocess(params, pixels))[0]
+
+
+def sgd_step(params, X, y, learning_rate):
+    """Run one mini-batch SGD step, return the loss and the hits"""
+    probs, hidden = _forward(params, X)
+    rows = np.arange(len(y))
+    loss = -np.log(np.maximum(probs[rows, y], 1e-12)).mean()
+    hits = int((probs.argmax(axis=1) == y).sum())
+    grad = probs
+    grad[rows, y] -= 1
+    grad /= len(y)
+    if hidden is None:
+        params['W1'] -= learning_rate * (X.T @ grad)
+        params['b1'] -= learning_rate * grad.sum(axis=0)
+    else:
+        grad_hidden = grad @ params['W2'].T
+        grad_hidden[hidden <= 0] = 0
+        params['W2'] -= learning_rate * (hidden.T @ grad)
+        params['b2'] -= learning_rate * grad.sum(axis=0)
+        params['W1'] -= learning_rate * (X.T @ grad_hidden)
+        params['b1'] -= learning_rate * grad_hidden.sum(axis=0)
+
+    return float(loss), hits
+
+
+def train(params, load_batch, targets, epochs, batch_size, learning_rate,
+          seed=0, on_epoch=None):
+    """Train params with mini-batch SGD, return per epoch metrics
+
+    load_batch(indices) returns the uint8 pixels of the given rows and
+    targets holds the class index of every row.
+    """
+    rng = np.random.default_rng(seed)
+    targets = np.asarray(targets)
+    metrics = []
+    for epoch in range(epochs):
+        started = time.perf_counter()
+        order = rng.permutation(len(targets))
+        loss = 0.0
+        hits = 0
+        for start in range(0, len(order), batch_size):
+            batch = np.sort(order[start:start + batch_size])
+            X = preprocess(params, load_batch(batch))
+            batch_loss, batch_hits = sgd_step(
+                params, X, targets[batch], learning_rate
+            )
+            loss += batch_loss * len(batch)
+            hits += batch_hits
+        seconds = time.perf_counter() - started
+        metrics.append({
+            'epoch': epoch + 1,
+            'seconds': seconds,
+            'samples_per_sec': len(order) / max(seconds, 1e-9),
+            'loss': loss / max(len(order), 1),
+            'accuracy': hits / max(len(order), 1),
+        })
+        if on_epoch is not None:
+            on_epoch(metrics)
+
+    return metrics
@@ -0,0 +1,9 @@
+from rest_framework.parsers import BaseParser
+
+
+class RawBytesParser(BaseParser):
+    """Return the request body as raw bytes"""
+    media_type = 'application/octet-stream'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream.read() if stream is not None else b''
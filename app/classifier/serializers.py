@@ -0,0 +1,40 @@
+from rest_framework import serializers
+
+from core.models import Dataset, TrainedModel
+
+
+class TrainedModelSerializer(serializers.ModelSerializer):
+    """Serializer for trained model objects"""
+    dataset = serializers.PrimaryKeyRelatedField(
+        queryset=Dataset.objects.all()
+    )
+
+    class Meta:
+        model = TrainedModel
+        fields = ('id',
+                  'name',
+                  'dataset',
+                  'architecture',
+                  'hidden_units',
+                  'epochs',
+                  'batch_size',
+                  'learning_rate',
+                  'state',
+                  'version',
+                  'metrics',
+                  'errors'
+                  )
+        read_only_fields = ('id', 'state', 'version', 'metrics', 'errors')
+        extra_kwargs = {
+            'hidden_units': {'min_value': 1, 'max_value': 4096},
+            'epochs': {'min_value': 1, 'max_value': 100},
+            'batch_size': {'min_value': 1, 'max_value': 65536},
+            'learning_rate': {'min_value': 0},
+        }
+
+    def validate_dataset(self, dataset):
+        """Only allow training on datasets of the authenticated user"""
+        if dataset.user != self.context['request'].user:
+            raise serializers.ValidationError('dataset not found')
+
+        return dataset
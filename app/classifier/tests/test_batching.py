@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+
+from django.test import SimpleTestCase
+
+from classifier import engine
+from classifier.batching import MicroBatcher
+from classifier.tests.test_engine import sample_data
+
+
+class MicroBatcherTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pixels, self.targets = sample_data()
+        self.params = engine.init_params(engine.SOFTMAX, 16, 4)
+        engine.train(self.params, lambda batch: self.pixels[batch],
+                     self.targets, epochs=2, batch_size=32,
+                     learning_rate=0.5)
+
+    def test_concurrent_requests_share_batches(self):
+        """Test that concurrent callers are served by fewer passes"""
+        batcher = MicroBatcher(max_items=64, max_wait_ms=50)
+        results = {}
+
+        def call(i):
+            results[i] = batcher.predict(
+                'model', self.params, self.pixels[i:i + 1], timeout=5
+            )
+
+        threads = [threading.Thread(target=call, args=(i,))
+                   for i in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = engine.predict_proba(self.params, self.pixels[:32])
+        stats = batcher.stats()
+        for i in range(32):
+            np.testing.assert_allclose(results[i][0], expected[i],
+                                       rtol=1e-5)
+        self.assertEqual(stats['items'], 32)
+        self.assertLess(stats['batches'], 32)
+        self.assertEqual(sum(stats['batch_sizes'].values()),
+                         stats['batches'])
+        self.assertEqual(stats['queue_depth'], 0)
+
+    def test_models_are_not_mixed(self):
+        """Test that requests of different models get their own pass"""
+        batcher = MicroBatcher(max_items=64, max_wait_ms=20)
+        other = engine.init_params(engine.SOFTMAX, 16, 4)
+
+        first = batcher.submit('a', self.params, self.pixels[:2])
+        second = batcher.submit('b', other, self.pixels[:2])
+
+        np.testing.assert_allclose(
+            first.result(timeout=5),
+            engine.predict_proba(self.params, self.pixels[:2]), rtol=1e-5
+        )
+        np.testing.assert_allclose(second.result(timeout=5), 0.25)
+
+    def test_errors_reach_callers(self):
+        """Test that a failing forward pass fails the waiting callers"""
+        batcher = MicroBatcher(max_items=4, max_wait_ms=1)
+
+        future = batcher.submit('a', self.params, np.zeros((1, 3)))
+
+        with self.assertRaises(ValueError):
+            future.result(timeout=5)
@@ -0,0 +1,51 @@
+import numpy as np
+
+from django.test import SimpleTestCase
+
+from classifier import engine
+
+
+def sample_data(count=400, seed=0):
+    """Return 4x4 images whose class is the bright quadrant"""
+    rng = np.random.default_rng(seed)
+    targets = rng.integers(0, 4, count)
+    pixels = rng.integers(0, 60, (count, 4, 4)).astype(np.uint8)
+    for i, target in enumerate(targets):
+        row, col = divmod(target, 2)
+        pixels[i, row*2:row*2 + 2, col*2:col*2 + 2] += 180
+
+    return pixels, targets
+
+
+class EngineTests(SimpleTestCase):
+
+    def check_learns(self, architecture):
+        pixels, targets = sample_data()
+        params = engine.init_params(architecture, 16, 4, hidden_units=16)
+
+        metrics = engine.train(
+            params, lambda batch: pixels[batch], targets,
+            epochs=5, batch_size=32, learning_rate=0.5
+        )
+
+        test_pixels, test_targets = sample_data(seed=1)
+        probs = engine.predict_proba(params, test_pixels)
+        self.assertEqual(len(metrics), 5)
+        self.assertLess(metrics[-1]['loss'], metrics[0]['loss'])
+        self.assertGreater(metrics[0]['samples_per_sec'], 0)
+        np.testing.assert_allclose(probs.sum(axis=1), 1, rtol=1e-5)
+        self.assertGreater((probs.argmax(axis=1) == test_targets).mean(),
+                           0.95)
+
+    def test_softmax_regression_learns(self):
+        """Test softmax regression separates simple classes"""
+        self.check_learns(engine.SOFTMAX)
+
+    def test_mlp_learns(self):
+        """Test the multilayer perceptron separates simple classes"""
+        self.check_learns(engine.MLP)
+
+    def test_invalid_architecture(self):
+        """Test initialising an unknown architecture fails"""
+        with self.assertRaises(ValueError):
+            engine.init_params('cnn', 16, 4)
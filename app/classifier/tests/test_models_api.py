@@ -0,0 +1,351 @@
+import base64
+import io
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image as Img
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Csvfile, Dataset, Label, TrainedModel
+
+from classifier import engine, training
+from classifier.cache import model_cache
+from classifier.tests.test_engine import sample_data
+from dataset import materialize, store
+
+
+MODELS_URL = reverse('classifier:trainedmodel-list')
+
+
+def predict_url(model_id):
+    """Return URL for predicting with a model"""
+    return reverse('classifier:trainedmodel-predict', args=[model_id])
+
+
+def sample_dataset(user, count=200):
+    """Create a dataset with four labels backed by a tensor store"""
+    labels = [Label.objects.create(user=user, name=str(i)) for i in range(4)]
+    pixels, targets = sample_data(count)
+    csvfile = Csvfile.objects.create(user=user,
+                                     name='train',
+                                     labelcol=0,
+                                     imgcolstart=1,
+                                     imgcolend=16
+                                     )
+    store.write_store(csvfile, pixels,
+                      [labels[target].id for target in targets])
+    dataset = Dataset.objects.create(user=user, name='quadrants')
+    dataset.csvfiles.add(csvfile)
+    dataset.labels.add(*labels)
+
+    return dataset
+
+
+class PublicModelsApiTests(TestCase):
+    """Test the publicly available models API"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_login_required(self):
+        """Test that login is required for retrieving models"""
+        res = self.client.get(MODELS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(JOB_WORKERS=0)
+class PrivateModelsApiTests(TestCase):
+    """Test training models through the API"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'psswd123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.dataset = sample_dataset(self.user)
+
+    def tearDown(self):
+        for csvfile in self.dataset.csvfiles.all():
+            csvfile.img_arrays.delete()
+            csvfile.label_array.delete()
+        for model in TrainedModel.objects.all():
+            model.weights.delete()
+
+    def test_train_softmax(self):
+        """Test training a softmax regression on a dataset"""
+        payload = {'name': 'quadrants', 'dataset': self.dataset.id,
+                   'epochs': 3, 'learning_rate': 0.5}
+
+        res = self.client.post(MODELS_URL, payload)
+
+        model = TrainedModel.objects.get(id=res.data['id'])
+        params, classes = training.load_checkpoint(model)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['state'], TrainedModel.DONE)
+        self.assertEqual(model.version, 1)
+        self.assertEqual(len(model.metrics), 3)
+        self.assertIn('samples_per_sec', model.metrics[0])
+        self.assertEqual(params['W1'].dtype, np.float32)
+        self.assertEqual(params['W1'].shape, (16, 4))
+        self.assertEqual(
+            classes.tolist(),
+            sorted(self.dataset.labels.values_list('id', flat=True))
+        )
+
+    def test_train_mlp(self):
+        """Test training a multilayer perceptron on a dataset"""
+        payload = {'name': 'quadrants', 'dataset': self.dataset.id,
+                   'architecture': 'mlp', 'hidden_units': 8, 'epochs': 2}
+
+        res = self.client.post(MODELS_URL, payload)
+
+        params, _ = training.load_checkpoint(
+            TrainedModel.objects.get(id=res.data['id'])
+        )
+        self.assertEqual(res.data['state'], TrainedModel.DONE)
+        self.assertEqual(params['W2'].shape, (8, 4))
+
+    def test_train_normalizes_with_dataset_stats(self):
+        """Test that the stored statistics standardize the inputs"""
+        csvfile = self.dataset.csvfiles.get()
+        pixels = store.load_pixels(csvfile)
+        csvfile.stats = store.pixel_stats(pixels,
+                                          store.load_label_ids(csvfile))
+        csvfile.save()
+
+        res = self.client.post(MODELS_URL, {'name': 'quadrants',
+                                            'dataset': self.dataset.id,
+                                            'epochs': 1})
+
+        params, _ = training.load_checkpoint(
+            TrainedModel.objects.get(id=res.data['id'])
+        )
+        flat = pixels.reshape(len(pixels), -1)
+        np.testing.assert_allclose(params['mean'], flat.mean(axis=0),
+                                   rtol=1e-5)
+        np.testing.assert_allclose(
+            params['scale'], 1 / np.maximum(flat.std(axis=0), 1), rtol=1e-5
+        )
+
+    def test_train_without_stats_keeps_default_scale(self):
+        """Test that csvfiles without statistics are scaled to [0, 1]"""
+        res = self.client.post(MODELS_URL, {'name': 'quadrants',
+                                            'dataset': self.dataset.id,
+                                            'epochs': 1})
+
+        params, _ = training.load_checkpoint(
+            TrainedModel.objects.get(id=res.data['id'])
+        )
+        self.assertFalse(params['mean'].any())
+        np.testing.assert_allclose(params['scale'], 1 / 255)
+
+    def test_train_on_materialized_split(self):
+        """Test that a fresh row index restricts training to its split"""
+        meta = materialize.materialize(self.dataset,
+                                       {'train': 0.5, 'val': 0.5})
+        self.dataset.refresh_from_db()
+
+        with patch('classifier.training.engine.train',
+                   wraps=engine.train) as train:
+            self.client.post(MODELS_URL, {'name': 'half',
+                                          'dataset': self.dataset.id,
+                                          'epochs': 1})
+
+        self.assertEqual(len(train.call_args.args[2]), meta['rows']['train'])
+        self.assertLess(meta['rows']['train'], 200)
+        self.dataset.index.delete()
+
+    def test_train_without_images_fails(self):
+        """Test that training on an empty dataset records the error"""
+        dataset = Dataset.objects.create(user=self.user, name='empty')
+        dataset.labels.add(*self.dataset.labels.all())
+
+        res = self.client.post(MODELS_URL,
+                               {'name': 'empty', 'dataset': dataset.id})
+
+        self.assertEqual(res.data['state'], TrainedModel.FAILED)
+        self.assertIn('no images', res.data['errors'])
+
+    def test_train_on_other_user_dataset(self):
+        """Test that models cannot be trained on datasets of others"""
+        user2 = get_user_model().objects.create_user(
+            'other@me.com',
+            'testpass'
+        )
+        dataset = Dataset.objects.create(user=user2, name='private')
+
+        res = self.client.post(MODELS_URL,
+                               {'name': 'stolen', 'dataset': dataset.id})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_models_limited_to_user(self):
+        """Test that models returned are for the authenticated user"""
+        user2 = get_user_model().objects.create_user(
+            'other@me.com',
+            'testpass'
+        )
+        TrainedModel.objects.create(user=user2, name='other',
+                                    dataset=self.dataset)
+        model = TrainedModel.objects.create(user=self.user, name='mine',
+                                            dataset=self.dataset)
+
+        res = self.client.get(MODELS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['name'], model.name)
+
+
+class PredictApiTests(TestCase):
+    """Test predicting labels with a trained model"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'psswd123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.dataset = sample_dataset(self.user, count=400)
+        self.model = TrainedModel.objects.create(user=self.user,
+                                                 name='quadrants',
+                                                 dataset=self.dataset,
+                                                 learning_rate=0.5
+                                                 )
+        training.run_training_job(self.model.id)
+        self.model.refresh_from_db()
+        self.pixels, targets = sample_data(8, seed=3)
+        classes = sorted(self.dataset.labels.values_list('id', flat=True))
+        self.expected = [classes[target] for target in targets]
+        model_cache.clear()
+
+    def tearDown(self):
+        for csvfile in self.dataset.csvfiles.all():
+            csvfile.img_arrays.delete()
+            csvfile.label_array.delete()
+        self.model.weights.delete()
+
+    def test_predict_raw_bytes(self):
+        """Test predicting a batch sent as raw uint8 bytes"""
+        res = self.client.generic(
+            'POST', predict_url(self.model.id), self.pixels.tobytes(),
+            content_type='application/octet-stream'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['labels'], self.expected)
+        self.assertEqual(np.shape(res.data['probabilities']), (8, 4))
+
+    def test_predict_base64(self):
+        """Test predicting a single image sent as base64"""
+        payload = {'pixels': base64.b64encode(self.pixels[0].tobytes())
+                   .decode()}
+
+        res = self.client.post(predict_url(self.model.id), payload,
+                               format='json')
+
+        self.assertEqual(res.data['labels'], self.expected[:1])
+        self.assertEqual(res.data['version'], 1)
+
+    def test_predict_lists(self):
+        """Test predicting images sent as nested lists"""
+        payload = {'pixels': self.pixels[:3].tolist()}
+
+        res = self.client.post(predict_url(self.model.id), payload,
+                               format='json')
+
+        self.assertEqual(res.data['labels'], self.expected[:3])
+
+    def test_predict_png_upload(self):
+        """Test predicting uploaded png images"""
+        files = []
+        for pixels in self.pixels[:2]:
+            fimg = io.BytesIO()
+            Img.fromarray(pixels, 'L').save(fimg, 'png')
+            fimg.seek(0)
+            fimg.name = 'image.png'
+            files.append(fimg)
+
+        res = self.client.post(predict_url(self.model.id),
+                               {'image': files}, format='multipart')
+
+        self.assertEqual(res.data['labels'], self.expected[:2])
+
+    def test_predict_invalid_size(self):
+        """Test that images of the wrong size are rejected"""
+        res = self.client.generic(
+            'POST', predict_url(self.model.id), b'\x00' * 10,
+            content_type='application/octet-stream'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_predict_png_wrong_shape(self):
+        """Test that uploaded images must match the model image shape"""
+        fimg = io.BytesIO()
+        Img.fromarray(self.pixels[0].reshape(2, 8), 'L').save(fimg, 'png')
+        fimg.seek(0)
+        fimg.name = 'image.png'
+
+        res = self.client.post(predict_url(self.model.id),
+                               {'image': [fimg]}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+
+    def test_predict_json_list_body(self):
+        """Test that a json body that is not an object is rejected"""
+        res = self.client.post(predict_url(self.model.id),
+                               self.pixels[:1].tolist(), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', res.data)
+
+    def test_predict_untrained_model(self):
+        """Test that predicting with an untrained model fails"""
+        model = TrainedModel.objects.create(user=self.user,
+                                            name='pending',
+                                            dataset=self.dataset
+                                            )
+
+        res = self.client.post(predict_url(model.id),
+                               {'pixels': self.pixels[0].tolist()},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batching_stats(self):
+        """Test that single image predictions go through the batcher"""
+        stats_url = reverse('classifier:trainedmodel-batching-stats')
+        before = self.client.get(stats_url).data['items']
+
+        self.client.post(predict_url(self.model.id),
+                         {'pixels': self.pixels[0].tolist()}, format='json')
+
+        res = self.client.get(stats_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['items'], before + 1)
+        self.assertIn('batch_sizes', res.data)
+
+    @patch('classifier.training.load_checkpoint',
+           wraps=training.load_checkpoint)
+    def test_weights_cached(self, load_checkpoint):
+        """Test that weights are loaded once per model version"""
+        payload = {'pixels': self.pixels[0].tolist()}
+        for _ in range(3):
+            self.client.post(predict_url(self.model.id), payload,
+                             format='json')
+        TrainedModel.objects.filter(id=self.model.id).update(version=2)
+        self.client.post(predict_url(self.model.id), payload, format='json')
+
+        self.assertEqual(load_checkpoint.call_count, 2)
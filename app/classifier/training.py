@@ -0,0 +1,95 @@
+import io
+
+import numpy as np
+
+from django.core.files.base import ContentFile
+
+from core.models import TrainedModel
+
+from classifier import engine
+from dataset import materialize, store
+
+
+def save_checkpoint(model, params, classes):
+    """Write the weights and classes of a model as one .npz"""
+    fnpz = io.BytesIO()
+    np.savez(fnpz, classes=classes, **params)
+    if model.weights:
+        model.weights.delete(save=False)
+    model.weights.save('weights.npz', ContentFile(fnpz.getvalue()),
+                       save=False)
+
+
+def load_checkpoint(model):
+    """Return the weights and the classes of a trained model"""
+    with np.load(model.weights.path) as data:
+        params = {name: data[name] for name in data.files}
+
+    return params, params.pop('classes')
+
+
+def normalization(dataset, rows, n_inputs):
+    """Return the per pixel mean and scale from the dataset statistics
+
+    None when the statistics do not cover the rows trained on, e.g. for
+    csvfiles ingested before statistics were recorded.
+    """
+    stats = store.dataset_stats(dataset)
+    if stats['rows'] != rows or len(stats['mean']) != n_inputs:
+        return None
+    std = np.maximum(np.asarray(stats['std']), 1.0)
+
+    return (np.asarray(stats['mean'], dtype=np.float32),
+            (1 / std).astype(np.float32))
+
+
+def train_model(model):
+    """Train a model on its dataset and checkpoint its weights
+
+    The train split of the materialized row index is used when the index
+    is fresh, otherwise every row of the labels of the dataset.
+    """
+    view, indices, classes, targets = \
+        materialize.split_rows(model.dataset, 'train') or \
+        store.dataset_rows(model.dataset)
+    if len(classes) < 2:
+        raise ValueError('dataset needs at least two labels!')
+    if not len(indices):
+        raise ValueError('dataset has no images!')
+    n_inputs = int(np.prod(view.image_shape))
+    params = engine.init_params(
+        model.architecture,
+        n_inputs,
+        len(classes),
+        hidden_units=model.hidden_units,
+    )
+    scaling = normalization(model.dataset, len(indices), n_inputs)
+    if scaling is not None:
+        params['mean'], params['scale'] = scaling
+    models = TrainedModel.objects.filter(id=model.id)
+    metrics = engine.train(
+        params,
+        lambda batch: view.take(indices[batch]),
+        targets,
+        epochs=model.epochs,
+        batch_size=model.batch_size,
+        learning_rate=model.learning_rate,
+        on_epoch=lambda metrics: models.update(metrics=metrics),
+    )
+    save_checkpoint(model, params, classes)
+    model.metrics = metrics
+    model.version += 1
+    model.state = TrainedModel.DONE
+    model.save()
+
+
+def run_training_job(model_id):
+    """Train a model in a worker, recording failures on the model"""
+    model = TrainedModel.objects.select_related('dataset').get(id=model_id)
+    models = TrainedModel.objects.filter(id=model_id)
+    models.update(state=TrainedModel.RUNNING)
+    model.state = TrainedModel.RUNNING
+    try:
+        train_model(model)
+    except Exception as exc:
+        models.update(state=TrainedModel.FAILED, errors=str(exc))
@@ -0,0 +1,14 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+
+from classifier import views
+
+
+router = DefaultRouter()
+router.register('models', views.TrainedModelViewSet)
+
+app_name = 'classifier'
+
+urlpatterns = [
+    path('', include(router.urls))
+]
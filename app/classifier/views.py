@@ -0,0 +1,135 @@
+import base64
+import binascii
+import math
+from collections.abc import Mapping
+
+import numpy as np
+from PIL import Image as Img, UnidentifiedImageError
+
+from django.conf import settings
+
+from rest_framework import viewsets, mixins
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from core import jobs
+from core.models import TrainedModel
+
+from user.authentication import CachingTokenAuthentication
+
+from classifier import engine, serializers, training
+from classifier.batching import batcher
+from classifier.cache import model_cache
+from classifier.parsers import RawBytesParser
+
+
+PREDICT_MAX_IMAGES = 65536
+
+
+def _pixels_from_bytes(data, n_inputs):
+    """Reshape raw uint8 bytes into a batch of flat images"""
+    if not data or len(data) % n_inputs:
+        raise ValidationError(
+            {'pixels': f'expected a multiple of {n_inputs} bytes'}
+        )
+
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, n_inputs)
+
+
+def decode_pixels(request, n_inputs):
+    """Decode the images of a predict request into an N x D uint8 batch
+
+    Images come as a raw octet-stream body, as uploaded image files, or
+    as a json `pixels` field holding base64 bytes or nested lists.
+    """
+    if isinstance(request.data, bytes):
+        return _pixels_from_bytes(request.data, n_inputs)
+    files = request.FILES.getlist('image')
+    if files:
+        try:
+            images = [np.asarray(Img.open(f).convert('L')) for f in files]
+        except UnidentifiedImageError:
+            raise ValidationError({'image': 'not a valid image'})
+        side = math.isqrt(n_inputs)
+        if any(image.shape != (side, side) for image in images):
+            raise ValidationError(
+                {'image': f'images must be {side}x{side} pixels'}
+            )
+        return np.stack(images).reshape(-1, n_inputs)
+    if not isinstance(request.data, Mapping):
+        raise ValidationError({'pixels': 'expected an object with pixels'})
+    pixels = request.data.get('pixels')
+    if isinstance(pixels, str):
+        try:
+            return _pixels_from_bytes(
+                base64.b64decode(pixels, validate=True), n_inputs
+            )
+        except binascii.Error:
+            raise ValidationError({'pixels': 'not valid base64'})
+    try:
+        pixels = np.asarray(pixels, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise ValidationError({'pixels': 'expected base64 or arrays'})
+    if not pixels.size or pixels.size % n_inputs or (
+            pixels.min() < 0 or pixels.max() > 255):
+        raise ValidationError(
+            {'pixels': f'expected images of {n_inputs} values in 0-255'}
+        )
+
+    return pixels.reshape(-1, n_inputs)
+
+
+class TrainedModelViewSet(viewsets.GenericViewSet,
+                          mixins.ListModelMixin,
+                          mixins.RetrieveModelMixin,
+                          mixins.CreateModelMixin):
+    """Train classifiers on datasets and manage them"""
+    authentication_classes = (CachingTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    queryset = TrainedModel.objects.all()
+    serializer_class = serializers.TrainedModelSerializer
+
+    def get_queryset(self):
+        """Return objects for the current authenticated user only"""
+        return self.queryset.filter(user=self.request.user).order_by('-id')
+
+    def perform_create(self, serializer):
+        """Create a new model and queue its training"""
+        model = serializer.save(user=self.request.user)
+        jobs.submit(training.run_training_job, model.id,
+                    jobs=TrainedModel.objects.filter(id=model.id))
+        model.refresh_from_db()
+
+    @action(methods=['POST'], detail=True,
+            parser_classes=(JSONParser, MultiPartParser, RawBytesParser))
+    def predict(self, request, pk=None):
+        """Predict the labels of one image or a batch of images"""
+        model = self.get_object()
+        if model.state != TrainedModel.DONE or not model.weights:
+            raise ValidationError({'model': 'model is not trained'})
+        params, classes = model_cache.get(model)
+        pixels = decode_pixels(request, params['mean'].shape[0])
+        if len(pixels) > PREDICT_MAX_IMAGES:
+            raise ValidationError(
+                {'pixels': f'at most {PREDICT_MAX_IMAGES} images'}
+            )
+        if settings.PREDICT_BATCHING and len(pixels) < batcher.max_items:
+            probs = batcher.predict((model.id, model.version), params, pixels)
+        else:
+            probs = engine.predict_proba(params, pixels)
+
+        return Response({
+            'model': model.id,
+            'version': model.version,
+            'classes': classes.tolist(),
+            'labels': classes[probs.argmax(axis=1)].tolist(),
+            'probabilities': probs.round(6).tolist(),
+        })
+
+    @action(methods=['GET'], detail=False, url_path='batching-stats')
+    def batching_stats(self, request):
+        """Return the queue depth and batch sizes of the micro-batcher"""
+        return Response(batcher.stats())
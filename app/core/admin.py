@@ -30,3 +30,5 @@ admin.site.register(models.Label)
 admin.site.register(models.Csvfile)
 admin.site.register(models.Dataset)
 admin.site.register(models.Image)
+admin.site.register(models.IngestJob)
+admin.site.register(models.TrainedModel)
@@ -0,0 +1,96 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils.cache import patch_cache_control
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import ListGeneration
+
+
+def _cache():
+    return caches[settings.LIST_CACHE]
+
+
+def _generations(user_id, names):
+    return dict(
+        ListGeneration.objects.filter(user_id=user_id, model__in=names)
+        .values_list('model', 'generation')
+    )
+
+
+def get_generations(user_id, models):
+    """Return the current generation of every model for a user
+
+    The counters are read in one query. A missing counter starts at the
+    current time in nanoseconds, so the counters of a new user whose id
+    was reused never repeat the keys of cached lists.
+    """
+    names = [model._meta.label_lower for model in models]
+    found = _generations(user_id, names)
+    missing = [name for name in names if name not in found]
+    if missing:
+        ListGeneration.objects.bulk_create([
+            ListGeneration(user_id=user_id, model=name,
+                           generation=time.time_ns())
+            for name in missing
+        ], ignore_conflicts=True)
+        found.update(_generations(user_id, missing))
+
+    return [found[name] for name in names]
+
+
+def _bump(user_id, models):
+    ListGeneration.objects.filter(
+        user_id=user_id,
+        model__in=[model._meta.label_lower for model in models],
+    ).update(generation=F('generation') + 1)
+
+
+def bump(user_id, *models):
+    """Start a new generation of models for a user, making lists stale
+
+    The generation moves in one query once the current transaction
+    commits, so a concurrent reader can never cache the old rows under
+    the new key.
+    """
+    transaction.on_commit(lambda: _bump(user_id, models))
+
+
+class CachedListMixin:
+    """Serve list responses per user from the cache until a model changes
+
+    cache_models names every model whose changes can alter the list. The
+    ETag derives from the request and the generations of those models,
+    so a repeated poll costs the one query reading the generations,
+    whether the client revalidates with If-None-Match and gets a 304 or
+    the body comes from the LIST_CACHE of the process.
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        generations = get_generations(request.user.id, self.cache_models)
+        key = hashlib.sha1(repr((
+            request.user.id,
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            generations,
+        )).encode()).hexdigest()
+        etag = f'"{key}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = _cache().get(f'list:{key}')
+            if data is None:
+                data = super().list(request, *args, **kwargs).data
+                _cache().set(f'list:{key}', data, settings.LIST_CACHE_SECONDS)
+            response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+
+        return response
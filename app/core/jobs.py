@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.db import transaction
+
+from core.models import IngestJob
+
+
+_executor = None
+_executor_pid = None
+
+
+def get_executor():
+    """Return the process pool of the current process, creating it lazily"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.JOB_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+        _executor_pid = os.getpid()
+
+    return _executor
+
+
+def reset_executor():
+    """Drop the pool, e.g. once a killed worker has broken it"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+
+
+def mark_failed(jobs, future):
+    """Record a job as failed when its worker raised or died"""
+    exc = future.exception()
+    if exc is None:
+        return
+    jobs.exclude(state=IngestJob.DONE).update(
+        state=IngestJob.FAILED, errors=str(exc) or type(exc).__name__
+    )
+
+
+def _submit(func, args, jobs):
+    try:
+        future = get_executor().submit(func, *args)
+    except BrokenProcessPool:
+        reset_executor()
+        future = get_executor().submit(func, *args)
+    if jobs is not None:
+        future.add_done_callback(lambda future: mark_failed(jobs, future))
+
+    return future
+
+
+def submit(func, *args, jobs=None):
+    """Run func(*args) in the worker pool once the transaction commits
+
+    With JOB_WORKERS set to 0 the job runs inline instead, which is what
+    the tests and single process deployments use. jobs is a queryset of
+    the row tracking the job, with state and errors fields; it is marked
+    failed when the worker dies, e.g. killed for running out of memory,
+    and a pool broken that way is replaced for the next jobs.
+    """
+    if not settings.JOB_WORKERS:
+        func(*args)
+        return
+    transaction.on_commit(lambda: _submit(func, args, jobs))
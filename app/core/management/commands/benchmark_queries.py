@@ -0,0 +1,106 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Label, Csvfile, Dataset, Image
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark data"""
+
+
+class Command(BaseCommand):
+    """Django command to time the hot list queries on seeded data
+
+    The data is created in a transaction that is rolled back at the end,
+    so the command can run against any database.
+    """
+    help = 'Print query plans and timings of the list queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=1_000_000)
+        parser.add_argument('--csvfiles', type=int, default=10)
+        parser.add_argument('--labels', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        """Create a user owning the requested amount of data"""
+        user = get_user_model().objects.create_user(
+            'benchmark@me.com', 'benchmark'
+        )
+        labels = Label.objects.bulk_create(
+            Label(user=user, name=str(i)) for i in range(options['labels'])
+        )
+        csvfiles = Csvfile.objects.bulk_create(
+            Csvfile(user=user, name=f'csv_{i}', labelcol=0,
+                    imgcolstart=1, imgcolend=784)
+            for i in range(options['csvfiles'])
+        )
+        dataset = Dataset.objects.create(user=user, name='benchmark')
+        dataset.labels.add(*labels)
+        dataset.csvfiles.add(*csvfiles[:len(csvfiles) // 2 or 1])
+        per_csvfile = -(-options['images'] // len(csvfiles))
+        for csvfile in csvfiles:
+            Image.objects.bulk_create(
+                (Image(user=user,
+                       name=f'{csvfile.id}_{row}',
+                       csvfile=csvfile,
+                       row=row,
+                       label=labels[row % len(labels)])
+                 for row in range(per_csvfile)),
+                batch_size=10000
+            )
+
+        return user, csvfiles[0], labels[0]
+
+    def run(self, options):
+        started = time.monotonic()
+        user, csvfile, label = self.seed(options)
+        self.stdout.write(
+            f'Seeded {Image.objects.filter(user=user).count()} images '
+            f'in {time.monotonic() - started:.1f}s'
+        )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        images = Image.objects.filter(user=user)
+        queries = {
+            'images page': images.order_by('-id')[:100],
+            'images by csvfile': images.filter(
+                csvfile=csvfile).order_by('-id')[:100],
+            'images by csvfile row': images.filter(
+                csvfile=csvfile).order_by('row')[:100],
+            'images by label': images.filter(
+                label=label).order_by('-id')[:100],
+            'images by name': images.order_by('-name')[:100],
+            'labels list': Label.objects.filter(user=user).order_by('-name'),
+            'csvfiles list': Csvfile.objects.filter(
+                user=user).order_by('-name'),
+            'csvfiles assigned': Csvfile.objects.filter(
+                user=user, dataset__isnull=False
+            ).distinct().order_by('-name'),
+        }
+        explain = {'analyze': True} if connection.vendor == 'postgresql' \
+            else {}
+        for name, queryset in queries.items():
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: median {statistics.median(timings):.2f}ms '
+                f'max {max(timings):.2f}ms'
+            ))
+            self.stdout.write(queryset.explain(**explain))
@@ -0,0 +1,80 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_framework.renderers import JSONRenderer
+
+from core.management.commands.benchmark_queries import Rollback
+from core.models import Label, Csvfile, Image
+
+from dataset.renderers import FAST_RENDERERS
+from dataset.serializers import ImageSerializer
+from dataset.views import IMAGE_COLUMNS
+
+
+class Command(BaseCommand):
+    """Django command to time the per row cost of listing images
+
+    Compares ImageSerializer with the lean .values() path under every
+    available renderer. The data is rolled back at the end.
+    """
+    help = 'Print the per row cost of serializing and rendering images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        """Create a user owning the requested number of images"""
+        user = get_user_model().objects.create_user(
+            'benchmark@me.com', 'benchmark'
+        )
+        label = Label.objects.create(user=user, name='0')
+        csvfile = Csvfile.objects.create(user=user, name='csv', labelcol=0,
+                                         imgcolstart=1, imgcolend=784)
+        Image.objects.bulk_create(
+            (Image(user=user, name=f'{csvfile.id}_{row}', csvfile=csvfile,
+                   row=row, label=label)
+             for row in range(options['images'])),
+            batch_size=10000
+        )
+
+        return user
+
+    def run(self, options):
+        images = Image.objects.filter(user=self.seed(options)).order_by('-id')
+        paths = {
+            'ImageSerializer + JSONRenderer': lambda: JSONRenderer().render(
+                ImageSerializer(list(images), many=True).data
+            ),
+            'values + JSONRenderer': lambda: JSONRenderer().render(
+                list(images.values(*IMAGE_COLUMNS))
+            ),
+        }
+        for renderer in FAST_RENDERERS:
+            paths[f'values + {renderer.__name__}'] = \
+                lambda renderer=renderer: renderer().render(
+                    list(images.values(*IMAGE_COLUMNS))
+                )
+        rows = options['images']
+        for name, path in paths.items():
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                path()
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {statistics.median(timings) / rows * 1e6:.2f}us '
+                f'per row'
+            ))
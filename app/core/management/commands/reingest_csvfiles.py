@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.models import Csvfile
+
+from dataset import ingest
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the tensor store of csvfiles
+
+    Csvfiles ingested before the tensor store existed have images but no
+    stored pixels; they are parsed again from their uploaded file.
+    """
+    help = 'Re-ingest the csvfiles that have no stored pixels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int,
+                            help='csvfiles to re-ingest, default all '
+                                 'without stored pixels')
+
+    def handle(self, *args, **options):
+        csvfiles = Csvfile.objects.exclude(file='').exclude(file=None)
+        if options['ids']:
+            csvfiles = csvfiles.filter(id__in=options['ids'])
+        else:
+            csvfiles = csvfiles.filter(
+                Q(img_arrays='') | Q(img_arrays__isnull=True)
+            )
+        for csvfile in csvfiles.order_by('id'):
+            try:
+                summary = ingest.ingest_csvfile(csvfile)
+            except (OSError, ValueError) as exc:
+                self.stderr.write(f'{csvfile.name}: {exc}')
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'{csvfile.name}: {summary["rows"]} rows'
+            ))
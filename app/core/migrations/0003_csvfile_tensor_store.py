@@ -0,0 +1,98 @@
+# Generated by Django 4.0.10 on 2026-10-17 17:40
+
+import tempfile
+from functools import partial
+
+import numpy as np
+
+import core.models
+from django.core.files import File
+from django.db import migrations, models, transaction
+
+
+def _save_array(fieldfile, filename, array):
+    with tempfile.TemporaryFile() as tmp:
+        np.save(tmp, array)
+        tmp.seek(0)
+        fieldfile.save(filename, File(tmp), save=False)
+
+
+def _delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def _stack_arrays(storage, images):
+    """Return the uint8 pixels and label ids of the images, else None"""
+    pixels = label_ids = None
+    for row, label_id, name in images:
+        try:
+            array = np.load(storage.path(name))
+        except (OSError, ValueError):
+            return None
+        if pixels is None:
+            pixels = np.zeros((images[-1][0] + 1,) + array.shape,
+                              dtype=np.uint8)
+            label_ids = np.full(len(pixels), -1, dtype=np.int64)
+        if array.shape != pixels.shape[1:]:
+            return None
+        pixels[row] = np.clip(np.rint(array * 255), 0, 255)
+        label_ids[row] = label_id
+
+    return pixels, label_ids
+
+
+def build_tensor_store(apps, schema_editor):
+    """Stack the per image arrays of every csvfile into its store
+
+    The old arrays hold the pixels scaled to [0, 1]; row i of the new
+    arrays is the image whose row is i. Every array is written into the
+    preallocated uint8 pixels as it is loaded, and deleted once the
+    migration commits. Csvfiles with an image missing its array keep their
+    old files and can be re-ingested from their file with the
+    reingest_csvfiles command.
+    """
+    Csvfile = apps.get_model('core', 'Csvfile')
+    Image = apps.get_model('core', 'Image')
+    storage = Image._meta.get_field('img_array').storage
+    for csvfile in Csvfile.objects.filter(image__isnull=False).distinct():
+        images = list(
+            Image.objects.filter(csvfile=csvfile).order_by('row')
+            .values_list('row', 'label_id', 'img_array')
+        )
+        if not all(name for _, _, name in images):
+            continue
+        stacked = _stack_arrays(storage, images)
+        if stacked is None:
+            continue
+        _save_array(csvfile.img_arrays, 'pixels.npy', stacked[0])
+        _save_array(csvfile.label_array, 'labels.npy', stacked[1])
+        csvfile.save(update_fields=['img_arrays', 'label_array'])
+        transaction.on_commit(partial(
+            _delete_files, storage, [name for _, _, name in images]
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_ingestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvfile',
+            name='img_arrays',
+            field=models.FileField(null=True, upload_to=core.models.dataset_file_path),
+        ),
+        migrations.AddField(
+            model_name='csvfile',
+            name='label_array',
+            field=models.FileField(null=True, upload_to=core.models.dataset_file_path),
+        ),
+        migrations.RunPython(build_tensor_store, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='image',
+            name='img_array',
+        ),
+    ]
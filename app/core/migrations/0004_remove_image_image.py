@@ -0,0 +1,41 @@
+# Generated by Django 4.0.10 on 2026-10-17 17:42
+
+from functools import partial
+
+from django.db import migrations, transaction
+
+
+def _delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def delete_bitmaps(apps, schema_editor):
+    """Delete the bmp of every image whose pixels are in the store
+
+    The images are rendered from the store now. The bmps of csvfiles
+    left out of the store are kept until they are re-ingested.
+    """
+    Image = apps.get_model('core', 'Image')
+    storage = Image._meta.get_field('image').storage
+    names = list(
+        Image.objects.exclude(image='').exclude(image=None)
+        .exclude(csvfile__img_arrays='').exclude(csvfile__img_arrays=None)
+        .values_list('image', flat=True)
+    )
+    transaction.on_commit(partial(_delete_files, storage, names))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_csvfile_tensor_store'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_bitmaps, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='image',
+            name='image',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.10 on 2026-10-17 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_remove_image_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='csvfile',
+            index=models.Index(fields=['user', '-name'], name='csvfile_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['user', '-name'], name='dataset_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['user', 'csvfile', 'row'], name='image_user_csvfile_row_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['user', 'label'], name='image_user_label_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['user', '-name'], name='image_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='label',
+            index=models.Index(fields=['user', '-name'], name='label_user_name_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.10 on 2026-10-17 17:45
+
+import core.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_user_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainedModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('architecture', models.CharField(choices=[('softmax', 'Softmax regression'), ('mlp', 'Multilayer perceptron')], default='softmax', max_length=16)),
+                ('hidden_units', models.IntegerField(default=128)),
+                ('epochs', models.IntegerField(default=5)),
+                ('batch_size', models.IntegerField(default=128)),
+                ('learning_rate', models.FloatField(default=0.1)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('version', models.IntegerField(default=0)),
+                ('weights', models.FileField(null=True, upload_to=core.models.dataset_file_path)),
+                ('metrics', models.JSONField(blank=True, default=list)),
+                ('errors', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.dataset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
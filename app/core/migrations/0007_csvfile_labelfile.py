@@ -0,0 +1,19 @@
+# Generated by Django 4.0.10 on 2026-10-17 17:50
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_trainedmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvfile',
+            name='labelfile',
+            field=models.FileField(null=True, upload_to=core.models.dataset_file_path),
+        ),
+    ]
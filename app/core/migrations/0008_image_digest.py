@@ -0,0 +1,33 @@
+# Generated by Django 4.0.10 on 2026-10-17 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_csvfile_labelfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvfile',
+            name='digest',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='digest',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='duplicate_of',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='core.image'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['user', 'digest'], name='image_user_digest_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.10 on 2026-10-17 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_image_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvfile',
+            name='chunk_digests',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='ingestjob',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
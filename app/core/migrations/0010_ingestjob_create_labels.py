@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-17 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_ingest_chunk_digests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='create_labels',
+            field=models.BooleanField(default=False),
+        ),
+    ]
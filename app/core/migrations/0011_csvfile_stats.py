@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-17 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_ingestjob_create_labels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvfile',
+            name='stats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.0.10 on 2026-10-17 18:02
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_csvfile_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='index',
+            field=models.FileField(null=True, upload_to=core.models.dataset_file_path),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='index_meta',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='dataset',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-17 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_image_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='allow_empty',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.10 on 2026-10-17 19:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_ingestjob_allow_empty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('generation', models.BigIntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='listgeneration',
+            constraint=models.UniqueConstraint(fields=('user', 'model'), name='listgeneration_user_model_uniq'),
+        ),
+    ]
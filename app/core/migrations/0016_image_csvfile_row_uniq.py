@@ -0,0 +1,34 @@
+# Generated by Django 4.0.10 on 2026-10-17 19:07
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_rows(apps, schema_editor):
+    """Keep the first image of every row stored twice by racing ingests"""
+    Image = apps.get_model('core', 'Image')
+    repeated = (
+        Image.objects.values('csvfile', 'row')
+        .annotate(first=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for group in repeated:
+        Image.objects.filter(
+            csvfile=group['csvfile'], row=group['row']
+        ).exclude(id=group['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_listgeneration'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_rows,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='image',
+            constraint=models.UniqueConstraint(fields=('csvfile', 'row'), name='image_csvfile_row_uniq'),
+        ),
+    ]
@@ -57,12 +57,31 @@ class Label(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-name'], name='label_user_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class CsvfileManager(models.Manager):
+    """Manager leaving the bulky ingest summaries out of every query
+
+    chunk_digests and stats hold hundreds of kilobytes of JSON for a
+    large csvfile and are only needed by ingest and dataset statistics,
+    which read them explicitly.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer(*Csvfile.SUMMARY_FIELDS)
+
+
 class Csvfile(models.Model):
     """Csvfile to be used to populate the dataset"""
+    SUMMARY_FIELDS = ('chunk_digests', 'stats')
+
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -73,6 +92,20 @@ class Csvfile(models.Model):
     imgcolstart = models.IntegerField()
     imgcolend = models.IntegerField()
     file = models.FileField(null=True, upload_to=dataset_file_path)
+    labelfile = models.FileField(null=True, upload_to=dataset_file_path)
+    img_arrays = models.FileField(null=True, upload_to=dataset_file_path)
+    label_array = models.FileField(null=True, upload_to=dataset_file_path)
+    digest = models.CharField(max_length=64, blank=True)
+    chunk_digests = models.JSONField(default=list, blank=True)
+    stats = models.JSONField(default=dict, blank=True)
+
+    objects = CsvfileManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-name'],
+                         name='csvfile_user_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -88,6 +121,15 @@ class Dataset(models.Model):
     description = models.TextField(blank=True)
     labels = models.ManyToManyField(Label)
     csvfiles = models.ManyToManyField(Csvfile)
+    version = models.IntegerField(default=0)
+    index = models.FileField(null=True, upload_to=dataset_file_path)
+    index_meta = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-name'],
+                         name='dataset_user_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -109,8 +151,135 @@ class Image(models.Model):
         Label,
         on_delete=models.CASCADE
     )
-    image = models.ImageField(null=True, upload_to=dataset_file_path)
-    img_array = models.FileField(null=True, upload_to=dataset_file_path)
+    digest = models.CharField(max_length=32, blank=True)
+    duplicate_of = models.ForeignKey(
+        'self',
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='duplicates',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='image_user_id_idx'),
+            models.Index(fields=['user', 'csvfile', '-id'],
+                         name='image_user_csvfile_id_idx'),
+            models.Index(fields=['user', 'label', '-id'],
+                         name='image_user_label_id_idx'),
+            models.Index(fields=['user', 'csvfile', 'row'],
+                         name='image_user_csvfile_row_idx'),
+            models.Index(fields=['user', '-name'],
+                         name='image_user_name_idx'),
+            models.Index(fields=['user', 'digest'],
+                         name='image_user_digest_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['csvfile', 'row'],
+                                    name='image_csvfile_row_uniq'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class IngestJob(models.Model):
+    """Background ingest of the file uploaded to a csvfile"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    csvfile = models.ForeignKey(
+        Csvfile,
+        on_delete=models.CASCADE,
+        related_name='ingest_jobs',
+    )
+    state = models.CharField(max_length=16, choices=STATES, default=PENDING)
+    rows_processed = models.IntegerField(default=0)
+    rows_per_sec = models.FloatField(default=0)
+    create_labels = models.BooleanField(default=False)
+    allow_empty = models.BooleanField(default=False)
+    errors = models.TextField(blank=True)
+    summary = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.csvfile}: {self.state}'
+
+
+class TrainedModel(models.Model):
+    """Classifier trained on the images of a dataset"""
+    SOFTMAX = 'softmax'
+    MLP = 'mlp'
+    PENDING = IngestJob.PENDING
+    RUNNING = IngestJob.RUNNING
+    DONE = IngestJob.DONE
+    FAILED = IngestJob.FAILED
+    ARCHITECTURES = (
+        (SOFTMAX, 'Softmax regression'),
+        (MLP, 'Multilayer perceptron'),
+    )
+
+    name = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    dataset = models.ForeignKey(
+        Dataset,
+        on_delete=models.CASCADE,
+    )
+    architecture = models.CharField(
+        max_length=16, choices=ARCHITECTURES, default=SOFTMAX
+    )
+    hidden_units = models.IntegerField(default=128)
+    epochs = models.IntegerField(default=5)
+    batch_size = models.IntegerField(default=128)
+    learning_rate = models.FloatField(default=0.1)
+    state = models.CharField(
+        max_length=16, choices=IngestJob.STATES, default=IngestJob.PENDING
+    )
+    version = models.IntegerField(default=0)
+    weights = models.FileField(null=True, upload_to=dataset_file_path)
+    metrics = models.JSONField(default=list, blank=True)
+    errors = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ListGeneration(models.Model):
+    """Generation counter of the cached lists of a model for a user
+
+    Kept in the database so that the job worker processes move it with
+    one update, while the list bodies stay in a per process cache.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    model = models.CharField(max_length=100)
+    generation = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'model'],
+                                    name='listgeneration_user_model_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.model}: {self.generation}'
@@ -0,0 +1,25 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import bump
+from core.models import Csvfile, Dataset, Image, Label
+
+
+@receiver(post_save, sender=Label)
+@receiver(post_save, sender=Csvfile)
+@receiver(post_save, sender=Dataset)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Label)
+@receiver(post_delete, sender=Csvfile)
+@receiver(post_delete, sender=Dataset)
+def bump_saved_model(sender, instance, **kwargs):
+    """Make the cached lists of a changed object stale"""
+    bump(instance.user_id, sender)
+
+
+@receiver(m2m_changed, sender=Dataset.labels.through)
+@receiver(m2m_changed, sender=Dataset.csvfiles.through)
+def bump_relinked_datasets(sender, instance, action, **kwargs):
+    """Make the cached lists of relinked datasets stale"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump(instance.user_id, Dataset)
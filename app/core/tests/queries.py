@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+
+
+class QueryCountMixin:
+    """Assert that endpoints run a fixed number of queries
+
+    Mixed into API test cases to catch N+1 queries: the endpoint is
+    requested after growing the data to each of several sizes and must
+    run the same number of queries every time.
+    """
+
+    def assertConstantQueries(self, url, grow, num=None, sizes=(1, 5)):
+        """Assert GET url runs as many queries whatever the row count
+
+        grow(size) adds rows so that the endpoint returns size of them.
+        The list cache is cleared before each request so the queries are
+        always run; a first request creates the generation counters of
+        cached lists, whose read is then one of the counted queries. When
+        num is given the count must also equal it.
+        """
+        counts = []
+        self.client.get(url)
+        for size in sizes:
+            grow(size)
+            caches[settings.LIST_CACHE].clear()
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            counts.append(len(queries))
+        self.assertEqual(
+            len(set(counts)), 1,
+            f'queries grow with the rows: {dict(zip(sizes, counts))}'
+        )
+        if num is not None:
+            self.assertEqual(counts[0], num)
+
+        return counts[0]
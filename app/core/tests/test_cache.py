@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import cache
+from core.models import Csvfile, Dataset, Label
+
+from dataset import ingest
+
+
+LABELS_URL = reverse('label:label-list')
+CSVFILES_URL = reverse('dataset:csvfile-list')
+
+
+class CachedListTests(TestCase):
+    """Test serving list responses from the per user cache"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'testpass'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Label.objects.create(user=self.user, name='cat')
+        caches[settings.LIST_CACHE].clear()
+
+    def test_repeated_list_reads_generations_only(self):
+        """Test that an unchanged list is served from the cache"""
+        first = self.client.get(LABELS_URL)
+
+        with self.assertNumQueries(1):
+            second = self.client.get(LABELS_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_not_modified(self):
+        """Test that revalidating an unchanged list answers 304"""
+        etag = self.client.get(LABELS_URL)['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(LABELS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_miss_adds_one_query(self):
+        """Test that a cache miss only adds the read of the generations"""
+        self.client.get(LABELS_URL)
+        caches[settings.LIST_CACHE].clear()
+
+        with self.assertNumQueries(2):
+            res = self.client.get(LABELS_URL)
+
+        self.assertEqual([label['name'] for label in res.data], ['cat'])
+
+    def test_saved_object_makes_list_stale(self):
+        """Test that creating an object changes the cached list"""
+        etag = self.client.get(LABELS_URL)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Label.objects.create(user=self.user, name='dog')
+        res = self.client.get(LABELS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([label['name'] for label in res.data],
+                         ['dog', 'cat'])
+
+    def test_lists_are_per_user(self):
+        """Test that users never see the cached list of another user"""
+        self.client.get(LABELS_URL)
+        user2 = get_user_model().objects.create_user(
+            'other@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(LABELS_URL)
+
+        self.assertEqual(res.data, [])
+
+    def test_relinking_makes_assigned_list_stale(self):
+        """Test that linking a csvfile to a dataset refreshes the list"""
+        csvfile = Csvfile.objects.create(user=self.user, name='train',
+                                         labelcol=0, imgcolstart=1,
+                                         imgcolend=4)
+        dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        url = f'{CSVFILES_URL}?assigned_only=1'
+        self.assertEqual(self.client.get(url).data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dataset.csvfiles.add(csvfile)
+
+        self.assertEqual(len(self.client.get(url).data), 1)
+
+    def test_bulk_created_labels_make_list_stale(self):
+        """Test that labels created in bulk by an ingest are listed"""
+        self.client.get(LABELS_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest.resolve_labels(self.user, ['cat', 'dog'], create=True)
+
+        self.assertEqual(len(self.client.get(LABELS_URL).data), 2)
+
+    def test_bump_changes_generation(self):
+        """Test that bumping starts a new generation"""
+        before = cache.get_generations(self.user.id, [Label, Dataset])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.bump(self.user.id, Label)
+
+        after = cache.get_generations(self.user.id, [Label, Dataset])
+        self.assertNotEqual(after[0], before[0])
+        self.assertEqual(after[1], before[1])
+
+    def test_bump_waits_for_commit(self):
+        """Test that the generation stays until the transaction commits"""
+        before = cache.get_generations(self.user.id, [Label])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            cache.bump(self.user.id, Label)
+            during = cache.get_generations(self.user.id, [Label])
+
+        self.assertEqual(during, before)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_bump_is_one_query(self):
+        """Test that a job worker moves the generations in one query"""
+        cache.get_generations(self.user.id, [Label, Dataset])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            cache.bump(self.user.id, Label, Dataset)
+        with self.assertNumQueries(1):
+            callbacks[0]()
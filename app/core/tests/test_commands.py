@@ -1,9 +1,16 @@
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.management import call_command
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.models import Csvfile, Image, Label
+
+from dataset import store
+
 
 class CommandTests(TestCase):
 
@@ -21,3 +28,48 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+    def test_benchmark_queries(self):
+        """Test benchmarking the list queries leaves no data behind"""
+        out = StringIO()
+        call_command('benchmark_queries', images=40, csvfiles=2, labels=3,
+                     repeat=1, stdout=out)
+
+        self.assertIn('Seeded 40 images', out.getvalue())
+        self.assertIn('images by csvfile', out.getvalue())
+        self.assertFalse(Image.objects.exists())
+
+    def test_benchmark_serializers(self):
+        """Test benchmarking the image serializers leaves no data behind"""
+        out = StringIO()
+        call_command('benchmark_serializers', images=20, repeat=1,
+                     stdout=out)
+
+        self.assertIn('ImageSerializer + JSONRenderer', out.getvalue())
+        self.assertIn('values + JSONRenderer', out.getvalue())
+        self.assertFalse(Image.objects.exists())
+
+    def test_reingest_csvfiles(self):
+        """Test rebuilding the store of a csvfile ingested before it"""
+        user = get_user_model().objects.create_user('test@me.com', 'pass')
+        label = Label.objects.create(user=user, name='cat')
+        csvfile = Csvfile.objects.create(
+            user=user, name='legacy', labelcol=0, imgcolstart=1,
+            imgcolend=4,
+            file=SimpleUploadedFile('legacy.csv',
+                                    b'label,1x1,1x2,2x1,2x2\ncat,1,2,3,4\n'),
+        )
+        Image.objects.create(user=user, name=f'{csvfile.id}_0',
+                             csvfile=csvfile, row=0, label=label)
+        out = StringIO()
+
+        call_command('reingest_csvfiles', stdout=out)
+
+        csvfile.refresh_from_db()
+        self.addCleanup(csvfile.file.delete)
+        self.addCleanup(csvfile.img_arrays.delete)
+        self.addCleanup(csvfile.label_array.delete)
+        self.assertIn('legacy: 1 rows', out.getvalue())
+        self.assertEqual(store.load_pixels(csvfile).tolist(),
+                         [[[1, 2], [3, 4]]])
+        self.assertEqual(Image.objects.get(csvfile=csvfile).label, label)
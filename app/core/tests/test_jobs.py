@@ -0,0 +1,81 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch, Mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core import jobs
+from core.models import Csvfile, IngestJob
+
+
+class JobsTests(TestCase):
+
+    @override_settings(JOB_WORKERS=0)
+    def test_submit_inline(self):
+        """Test that jobs run inline without worker processes"""
+        func = Mock()
+        jobs.submit(func, 1, 2)
+
+        func.assert_called_once_with(1, 2)
+
+    @override_settings(JOB_WORKERS=2)
+    @patch('core.jobs.get_executor')
+    def test_submit_after_commit(self, get_executor):
+        """Test that jobs reach the pool once the transaction commits"""
+        func = Mock()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            jobs.submit(func, 1)
+            get_executor.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        get_executor.return_value.submit.assert_called_once_with(func, 1)
+        func.assert_not_called()
+
+    @override_settings(JOB_WORKERS=2)
+    @patch('core.jobs.reset_executor')
+    @patch('core.jobs.get_executor')
+    def test_submit_to_broken_pool(self, get_executor, reset_executor):
+        """Test that a broken pool is replaced instead of failing"""
+        func = Mock()
+        get_executor.return_value.submit.side_effect = [
+            BrokenProcessPool('worker died'), Future()
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.submit(func, 1)
+
+        reset_executor.assert_called_once_with()
+        self.assertEqual(get_executor.return_value.submit.call_count, 2)
+
+    def test_crashed_worker_fails_job(self):
+        """Test that a job whose worker died is marked failed"""
+        user = get_user_model().objects.create_user('test@me.com', 'pass')
+        csvfile = Csvfile.objects.create(user=user, name='train',
+                                         labelcol=0, imgcolstart=1,
+                                         imgcolend=4)
+        job = IngestJob.objects.create(user=user, csvfile=csvfile,
+                                       state=IngestJob.RUNNING)
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+
+        jobs.mark_failed(IngestJob.objects.filter(id=job.id), future)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, IngestJob.FAILED)
+        self.assertEqual(job.errors, 'worker died')
+
+    def test_finished_job_not_failed(self):
+        """Test that a job which finished keeps its state on a crash"""
+        user = get_user_model().objects.create_user('test@me.com', 'pass')
+        csvfile = Csvfile.objects.create(user=user, name='train',
+                                         labelcol=0, imgcolstart=1,
+                                         imgcolend=4)
+        job = IngestJob.objects.create(user=user, csvfile=csvfile,
+                                       state=IngestJob.DONE)
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+
+        jobs.mark_failed(IngestJob.objects.filter(id=job.id), future)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, IngestJob.DONE)
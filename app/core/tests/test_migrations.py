@@ -0,0 +1,84 @@
+import io
+import os
+
+import numpy as np
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class TensorStoreMigrationTests(TransactionTestCase):
+    """Test moving per image arrays into the csvfile tensor store"""
+    migrate_from = [('core', '0002_ingestjob')]
+    migrate_to = [('core', '0003_csvfile_tensor_store')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def legacy_images(self, pixels):
+        """Create a csvfile whose images have an array and a bmp each"""
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('core', 'User')
+        Label = apps.get_model('core', 'Label')
+        Csvfile = apps.get_model('core', 'Csvfile')
+        Image = apps.get_model('core', 'Image')
+        user = User.objects.create(email='test@me.com', password='x')
+        labels = [Label.objects.create(user=user, name=name)
+                  for name in ('cat', 'dog')]
+        csvfile = Csvfile.objects.create(user=user, name='legacy',
+                                         labelcol=0, imgcolstart=1,
+                                         imgcolend=4)
+        images = []
+        for row, label in enumerate(labels):
+            data = io.BytesIO()
+            np.save(data, pixels[row].astype(float) / 255)
+            image = Image(user=user, name=f'{csvfile.id}_{row}',
+                          csvfile=csvfile, row=row, label=label)
+            image.image.save('image.bmp', ContentFile(b'BM'), save=False)
+            image.img_array.save('image.npy', ContentFile(data.getvalue()))
+            images.append(image)
+
+        return labels, images
+
+    def test_per_image_arrays_are_stacked(self):
+        """Test that the old arrays become the pixels and labels files"""
+        pixels = np.array([[[0, 51], [102, 255]], [[1, 2], [3, 4]]])
+        (cat, dog), images = self.legacy_images(pixels)
+        for image in images:
+            self.addCleanup(image.image.storage.delete, image.image.name)
+
+        apps = self.migrate(self.migrate_to)
+
+        csvfile = apps.get_model('core', 'Csvfile').objects.get()
+        self.addCleanup(csvfile.img_arrays.delete, save=False)
+        self.addCleanup(csvfile.label_array.delete, save=False)
+        stored = np.load(csvfile.img_arrays.path)
+        self.assertEqual(stored.dtype, np.uint8)
+        np.testing.assert_array_equal(stored, pixels)
+        self.assertEqual(np.load(csvfile.label_array.path).tolist(),
+                         [cat.id, dog.id])
+        for image in images:
+            self.assertFalse(os.path.exists(image.img_array.path))
+
+    def test_bitmaps_are_deleted(self):
+        """Test that the bmps of images in the store are deleted"""
+        pixels = np.array([[[0, 51], [102, 255]], [[1, 2], [3, 4]]])
+        _, images = self.legacy_images(pixels)
+
+        apps = self.migrate([('core', '0004_remove_image_image')])
+
+        csvfile = apps.get_model('core', 'Csvfile').objects.get()
+        self.addCleanup(csvfile.img_arrays.delete, save=False)
+        self.addCleanup(csvfile.label_array.delete, save=False)
+        for image in images:
+            self.assertFalse(os.path.exists(image.image.path))
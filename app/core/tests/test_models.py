@@ -65,6 +65,31 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(csvfile), csvfile.name)
 
+    def test_csvfile_summaries_deferred(self):
+        """Test that csvfile queries leave out the ingest summaries"""
+        created = models.Csvfile.objects.create(
+            user=sample_user(),
+            name='mnist_train.csv',
+            labelcol=0,
+            imgcolstart=1,
+            imgcolend=16,
+            stats={'rows': 1},
+        )
+
+        csvfile = models.Csvfile.objects.get(id=created.id)
+
+        self.assertEqual(csvfile.get_deferred_fields(),
+                         {'chunk_digests', 'stats'})
+        self.assertEqual(csvfile.stats, {'rows': 1})
+
+    def test_image_keyset_indexes(self):
+        """Test that every image list filter has an index ending in -id"""
+        indexes = {tuple(index.fields) for index in models.Image._meta.indexes}
+
+        for fields in (('user', '-id'), ('user', 'csvfile', '-id'),
+                       ('user', 'label', '-id')):
+            self.assertIn(fields, indexes)
+
     def test_dataset_str(self):
         """Test the dataset string representation"""
         dataset = models.Dataset.objects.create(
@@ -0,0 +1,89 @@
+import struct
+
+import numpy as np
+
+
+FRAME_MAGIC = b'MNB1'
+FRAME_HEADER = struct.Struct('<4sIIHH')
+LABEL_DTYPE = np.dtype('<u2')
+
+
+def encode_frame(index, pixels, targets):
+    """Return one binary frame holding a batch of images and targets
+
+    The header holds the magic, the batch index, the image count and
+    the image height and width; the uint8 pixels and the little endian
+    uint16 class indices follow.
+    """
+    count, height, width = pixels.shape
+
+    return b''.join((
+        FRAME_HEADER.pack(FRAME_MAGIC, index, count, height, width),
+        np.ascontiguousarray(pixels, dtype=np.uint8).tobytes(),
+        np.asarray(targets).astype(LABEL_DTYPE).tobytes(),
+    ))
+
+
+def read_frame(stream):
+    """Read the next frame of a stream, None at its end
+
+    Return the batch index, the N x H x W uint8 pixels and the int64
+    class indices.
+    """
+    header = stream.read(FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        raise ValueError('frame is not valid!')
+    magic, index, count, height, width = FRAME_HEADER.unpack(header)
+    if magic != FRAME_MAGIC:
+        raise ValueError('frame is not valid!')
+    size = count * height * width
+    body = _read_exact(stream, size + count * LABEL_DTYPE.itemsize)
+    pixels = np.frombuffer(body, dtype=np.uint8, count=size).reshape(
+        count, height, width
+    )
+    targets = np.frombuffer(body, dtype=LABEL_DTYPE, offset=size)
+
+    return index, pixels, targets.astype(np.int64)
+
+
+def _read_exact(stream, size):
+    """Read size bytes from a stream that may return short reads"""
+    parts = []
+    while size:
+        data = stream.read(size)
+        if not data:
+            raise ValueError('frame is not valid!')
+        parts.append(data)
+        size -= len(data)
+
+    return b''.join(parts)
+
+
+class BatchPlan:
+    """Shuffled mini-batches over the rows of a dataset
+
+    The order only depends on seed and epoch, so a client resuming at a
+    batch gets the very batches it would have received.
+    """
+
+    def __init__(self, view, indices, targets, batch_size, seed=0, epoch=0):
+        if len(indices) and int(np.max(targets)) > np.iinfo(LABEL_DTYPE).max:
+            raise ValueError('batches need at most 65536 labels!')
+        order = np.random.default_rng([seed, epoch]).permutation(len(indices))
+        self.view = view
+        self.indices = np.asarray(indices)[order]
+        self.targets = np.asarray(targets)[order]
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return -(-len(self.indices) // self.batch_size)
+
+    def frames(self, start=0):
+        """Yield the frames of the batches from start on"""
+        for index in range(start, len(self)):
+            rows = slice(index * self.batch_size,
+                         (index + 1) * self.batch_size)
+            yield encode_frame(index, self.view.take(self.indices[rows]),
+                               self.targets[rows])
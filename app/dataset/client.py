@@ -0,0 +1,80 @@
+import queue
+import threading
+import urllib.parse
+import urllib.request
+
+from dataset.batches import read_frame
+
+
+def open_batches(url, token, params, start=0, opener=None):
+    """Open the batch stream of a dataset, resuming at batch start"""
+    request = urllib.request.Request(
+        f'{url}?{urllib.parse.urlencode(params)}',
+        headers={'Authorization': f'Token {token}'},
+    )
+    if start:
+        request.add_header('Range', f'batches={start}-')
+
+    return (opener or urllib.request.urlopen)(request)
+
+
+def _produce(url, token, params, out, stop, retries, opener):
+    """Read frames into the queue, reconnecting after a broken stream"""
+    expected = 0
+    failures = 0
+    try:
+        while not stop.is_set():
+            try:
+                with open_batches(url, token, params, expected,
+                                  opener) as stream:
+                    while not stop.is_set():
+                        frame = read_frame(stream)
+                        if frame is None:
+                            out.put(None)
+                            return
+                        expected = frame[0] + 1
+                        failures = 0
+                        out.put(frame[1:])
+            except (OSError, ValueError):
+                failures += 1
+                if failures > retries:
+                    raise
+    except Exception as exc:
+        out.put(exc)
+
+
+def iter_batches(url, token, batch_size=128, seed=0, epoch=0, split=None,
+                 prefetch=2, retries=3, opener=None):
+    """Yield the pixels and class indices of every batch of an epoch
+
+    url is the batches endpoint of a dataset. A background thread keeps
+    up to prefetch batches ready while the caller trains on the current
+    one. A dropped connection is resumed at the next missing batch. Only
+    numpy and the standard library are needed on the client.
+    """
+    params = {'batch_size': batch_size, 'seed': seed, 'epoch': epoch}
+    if split is not None:
+        params['split'] = split
+    out = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=_produce, args=(url, token, params, out, stop, retries,
+                               opener),
+        name='batch-prefetch', daemon=True
+    )
+    thread.start()
+    try:
+        while True:
+            item = out.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive():
+            try:
+                out.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
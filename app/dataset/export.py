@@ -0,0 +1,216 @@
+import io
+import struct
+import zipfile
+
+import numpy as np
+
+from dataset import materialize, store
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+
+EXPORT_CHUNK_ROWS = 4096
+IDX_IMAGES = 0x00000803
+IDX_LABELS = 0x00000801
+
+
+class _Sink:
+    """Write only file object holding the bytes written until drained
+
+    It has no tell(), so zipfile writes archives to it as a stream.
+    """
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Return and forget the bytes written so far"""
+        data = b''.join(self._parts)
+        self._parts.clear()
+
+        return data
+
+
+class _TellingSink(_Sink):
+    """Sink also reporting its position, as the parquet writer needs"""
+
+    def __init__(self):
+        super().__init__()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._position += len(data)
+
+        return super().write(data)
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        self.closed = True
+
+
+class DatasetExport:
+    """Rows of a dataset read chunk by chunk from the tensor store
+
+    Only the rows whose label belongs to the dataset are exported, in
+    the order of the tensor view, or the rows of a split of its
+    materialized index. Labels are exported as class indices into
+    classes, the sorted label names.
+    """
+
+    def __init__(self, dataset, split=None):
+        rows = store.dataset_rows(dataset) if split is None else \
+            materialize.split_rows(dataset, split)
+        if rows is None:
+            raise ValueError(f'split {split} is not valid!')
+        self.view, self.indices, label_ids, self.targets = rows
+        names = dict(dataset.labels.values_list('id', 'name'))
+        self.classes = np.array([names[i] for i in label_ids.tolist()],
+                                dtype=str)
+        self.image_shape = tuple(self.view.image_shape)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def chunks(self):
+        """Yield the pixels and targets of EXPORT_CHUNK_ROWS rows at once"""
+        for start in range(0, len(self), EXPORT_CHUNK_ROWS):
+            stop = start + EXPORT_CHUNK_ROWS
+            yield (self.view.take(self.indices[start:stop]),
+                   self.targets[start:stop])
+
+
+def _buffer(array):
+    """Return the bytes of an array as a flat buffer, without copying"""
+    return memoryview(np.ascontiguousarray(array)).cast('B')
+
+
+def _npy_header(dtype, shape):
+    """Return the .npy header of an array of the given dtype and shape"""
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False,
+        'shape': shape,
+    })
+
+    return header.getvalue()
+
+
+def _zip_stream(members):
+    """Yield a stored zip archive of (name, byte chunks) members"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for name, chunks in members:
+            with archive.open(name, 'w', force_zip64=True) as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    yield sink.drain()
+    yield sink.drain()
+
+
+def stream_npz(export):
+    """Yield a .npz holding images, labels and classes"""
+    def images():
+        yield _npy_header(np.uint8, (len(export),) + export.image_shape)
+        for pixels, _ in export.chunks():
+            yield _buffer(pixels)
+
+    def labels():
+        targets = export.targets.astype(np.int64)
+        yield _npy_header(targets.dtype, targets.shape)
+        yield _buffer(targets)
+
+    def classes():
+        yield _npy_header(export.classes.dtype, export.classes.shape)
+        yield _buffer(export.classes)
+
+    return _zip_stream([('images.npy', images()), ('labels.npy', labels()),
+                        ('classes.npy', classes())])
+
+
+def stream_npy(export):
+    """Yield one .npy of records holding the label name and the image"""
+    dtype = np.dtype([('label', export.classes.dtype),
+                      ('image', np.uint8, export.image_shape)])
+    yield _npy_header(dtype, (len(export),))
+    for pixels, targets in export.chunks():
+        records = np.empty(len(pixels), dtype=dtype)
+        records['label'] = export.classes[targets]
+        records['image'] = pixels
+        yield _buffer(records)
+
+
+def stream_idx(export):
+    """Yield a zip of MNIST style idx files and the class names"""
+    if len(export.classes) > 256:
+        raise ValueError('idx export needs at most 256 labels!')
+
+    def images():
+        yield struct.pack('>II', IDX_IMAGES, len(export))
+        yield struct.pack(f'>{len(export.image_shape)}I', *export.image_shape)
+        for pixels, _ in export.chunks():
+            yield _buffer(pixels)
+
+    def labels():
+        yield struct.pack('>II', IDX_LABELS, len(export))
+        yield _buffer(export.targets.astype(np.uint8))
+
+    def classes():
+        yield ''.join(f'{name}\n' for name in export.classes).encode()
+
+    return _zip_stream([('images-idx3-ubyte', images()),
+                        ('labels-idx1-ubyte', labels()),
+                        ('classes.txt', classes())])
+
+
+def stream_parquet(export):
+    """Return the chunks of a parquet file with a row group per chunk"""
+    if pyarrow is None:
+        raise ValueError('parquet export needs pyarrow!')
+
+    return _parquet_stream(export)
+
+
+def _parquet_stream(export):
+    size = int(np.prod(export.image_shape))
+    schema = pyarrow.schema(
+        [('label', pyarrow.string()),
+         ('image', pyarrow.binary(size))],
+        metadata={'image_shape': repr(export.image_shape)},
+    )
+    sink = _TellingSink()
+    with pyarrow.parquet.ParquetWriter(sink, schema) as writer:
+        for pixels, targets in export.chunks():
+            writer.write_table(pyarrow.table({
+                'label': pyarrow.array(export.classes[targets].tolist()),
+                'image': pyarrow.FixedSizeBinaryArray.from_buffers(
+                    pyarrow.binary(size), len(pixels),
+                    [None, pyarrow.py_buffer(pixels.tobytes())]
+                ),
+            }, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+FORMATS = {
+    'npz': stream_npz,
+    'npy': stream_npy,
+    'idx': stream_idx,
+    'parquet': stream_parquet,
+}
@@ -0,0 +1,625 @@
+import bz2
+import gzip
+import math
+import multiprocessing
+import os
+import posixpath
+import struct
+import tempfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+import numpy as np
+
+from django.conf import settings
+from django.core.files import File
+
+from core import cache
+from core.models import Csvfile, Dataset, Label, Image, IngestJob
+
+from dataset import materialize, parsing, store
+from dataset.parsing import parse_lines
+
+
+CHUNK_ROWS = 4096
+CHUNK_BYTES = 1 << 20
+GZIP_MAGIC = b'\x1f\x8b'
+BZ2_MAGIC = b'BZh'
+ZIP_MAGIC = b'PK\x03\x04'
+IDX_UBYTE = 0x08
+SHARD_MIN_BYTES = 8 << 20
+BULK_BATCH_SIZE = 2000
+DIGEST_BATCH_SIZE = 5000
+DIFF_CHUNK_ROWS = 1024
+STORE_FIELDS = ('img_arrays', 'label_array', 'digest', 'chunk_digests')
+
+
+def image_size(csvfile):
+    """Return the side length of the square images in a csvfile"""
+    ncols = csvfile.imgcolend + 1 - csvfile.imgcolstart
+    size = int(math.sqrt(ncols))
+    if ncols <= 0 or size**2 != ncols:
+        raise ValueError('size is not valid!')
+
+    return size
+
+
+class CsvStreamConverter:
+    """Convert csv bytes into label names and pixels as they arrive
+
+    Complete lines are parsed CHUNK_ROWS at a time and their pixels are
+    appended to an unnamed temporary file, so memory stays bounded by
+    the chunk size whatever the size of the csv. When raw is given, the
+    incoming bytes are also copied to it, e.g. to keep a compressed copy
+    of the upload.
+    """
+
+    def __init__(self, csvfile, raw=None, progress=None):
+        self.size = image_size(csvfile)
+        self.labelcol = csvfile.labelcol
+        self.start = csvfile.imgcolstart
+        self.end = csvfile.imgcolend + 1
+        self.raw = raw
+        self.progress = progress
+        self.rows = 0
+        self._names = []
+        self._lines = []
+        self._tail = b''
+        self._header = True
+        self._pixels = tempfile.TemporaryFile()
+
+    def feed(self, data):
+        """Consume the next bytes of the csv"""
+        if self.raw is not None:
+            self.raw.write(data)
+        lines = (self._tail + data).split(b'\n')
+        self._tail = lines.pop()
+        if self._header and lines:
+            lines.pop(0)  # skip the headers
+            self._header = False
+        self._lines.extend(
+            line for line in b'\n'.join(lines).decode().splitlines()
+            if line.strip()
+        )
+        while len(self._lines) >= CHUNK_ROWS:
+            self._parse(self._lines[:CHUNK_ROWS])
+            del self._lines[:CHUNK_ROWS]
+
+    def _parse(self, lines):
+        names, pixels = parse_lines(
+            lines, self.labelcol, self.start, self.end, self.size
+        )
+        self._names.append(names)
+        pixels.tofile(self._pixels)
+        self.rows += len(names)
+        if self.progress is not None:
+            self.progress(self.rows)
+
+    def finish(self):
+        """Parse the remaining bytes, return the names and the pixels
+
+        The pixels are a read only memory map of the temporary file.
+        """
+        if not self._header and self._tail.strip():
+            self._lines.append(self._tail.decode())
+        self._tail = b''
+        if self._lines:
+            self._parse(self._lines)
+            self._lines = []
+        shape = (self.rows, self.size, self.size)
+        if not self.rows:
+            return np.empty(0, dtype=str), np.empty(shape, dtype=np.uint8)
+        self._pixels.flush()
+
+        return (np.concatenate(self._names),
+                np.memmap(self._pixels, dtype=np.uint8, mode='r',
+                          shape=shape))
+
+
+def _is_idx(head):
+    """Return whether the first bytes of a stream are an IDX header"""
+    return len(head) == 4 and head[:2] == b'\x00\x00' and head[3] in (1, 3)
+
+
+def _read_exact(stream, size):
+    """Read exactly size bytes from a stream into a new bytearray"""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        read = stream.readinto(view[pos:pos + CHUNK_BYTES])
+        if not read:
+            raise ValueError('file is truncated!')
+        pos += read
+
+    return buf
+
+
+def read_idx(head, stream):
+    """Parse an IDX array of unsigned bytes following its first bytes
+
+    The data is read straight into one buffer and wrapped without a copy.
+    """
+    if head[2] != IDX_UBYTE:
+        raise ValueError('idx data type is not valid!')
+    ndim = head[3]
+    dims = struct.unpack(f'>{ndim}I', _read_exact(stream, 4 * ndim))
+    buf = _read_exact(stream, int(np.prod(dims)))
+
+    return np.frombuffer(buf, dtype=np.uint8).reshape(dims)
+
+
+def _is_hidden(name):
+    """Return whether a zip member is a dotfile or macOS metadata"""
+    return name.startswith('__MACOSX/') or \
+        posixpath.basename(name).startswith('.')
+
+
+def open_streams(fieldfile, stack):
+    """Return the decompressed binary streams of an uploaded file
+
+    gzip and bz2 files hold one stream, zip archives one per member,
+    leaving out directories, dotfiles and __MACOSX metadata. Every
+    opened file is registered on the given ExitStack.
+    """
+    raw = stack.enter_context(fieldfile.open(mode='rb'))
+    magic = raw.read(4)
+    raw.seek(0)
+    if magic[:2] == GZIP_MAGIC:
+        return [stack.enter_context(gzip.GzipFile(fileobj=raw))]
+    if magic[:3] == BZ2_MAGIC:
+        return [stack.enter_context(bz2.BZ2File(raw))]
+    if magic == ZIP_MAGIC:
+        archive = stack.enter_context(zipfile.ZipFile(raw))
+        return [
+            stack.enter_context(archive.open(info))
+            for info in sorted(archive.infolist(), key=lambda i: i.filename)
+            if not info.is_dir() and not _is_hidden(info.filename)
+        ]
+
+    return [raw]
+
+
+def _shardable_path(fieldfile):
+    """Return the local path of a plain csv worth sharding, else None"""
+    try:
+        path = fieldfile.path
+    except NotImplementedError:
+        return None
+    if os.path.getsize(path) < SHARD_MIN_BYTES:
+        return None
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    if head[:2] == GZIP_MAGIC or head[:3] == BZ2_MAGIC or \
+            head == ZIP_MAGIC or _is_idx(head):
+        return None
+
+    return path
+
+
+def read_csv_sharded(csvfile, path, workers, progress=None):
+    """Parse a plain csv in newline aligned shards on several processes
+
+    A first pass counts the rows of every shard, then each shard writes
+    its pixels straight into its slice of one memory mapped array and
+    returns its label names, which are merged in shard order.
+    """
+    size = image_size(csvfile)
+    columns = (csvfile.labelcol, csvfile.imgcolstart,
+               csvfile.imgcolend + 1, size)
+    ranges = parsing.shard_ranges(path, workers)
+    with ExitStack() as stack:
+        run = map
+        if workers > 1:
+            run = stack.enter_context(ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )).map
+        counts = list(run(parsing.count_rows, *zip(*[
+            (path, start, end) for start, end in ranges
+        ])))
+        if not sum(counts):
+            return (np.empty(0, dtype=str),
+                    np.empty((0, size, size), dtype=np.uint8))
+        out_path = os.path.join(
+            stack.enter_context(tempfile.TemporaryDirectory()), 'pixels.npy'
+        )
+        np.lib.format.open_memmap(
+            out_path, mode='w+', dtype=np.uint8,
+            shape=(sum(counts), size, size)
+        ).flush()
+        offsets = np.cumsum([0] + counts[:-1]).tolist()
+        names = []
+        for shard_names in run(parsing.parse_shard, *zip(*[
+            (path, start, end, columns, out_path, offset, CHUNK_ROWS)
+            for (start, end), offset in zip(ranges, offsets)
+        ])):
+            names.append(shard_names)
+            if progress is not None:
+                progress(sum(len(n) for n in names))
+        # the map outlives the removal of the temporary directory
+        pixels = np.load(out_path, mmap_mode='r')
+
+    return np.concatenate(names), pixels
+
+
+def read_upload(csvfile, progress=None):
+    """Decode the uploaded files of a csvfile into label names and pixels
+
+    The file may be a plain, gzip, bz2 or zip compressed csv, or IDX
+    images whose IDX labels come from labelfile or the same archive.
+    An upload holding several csvs, or csvs and IDX files, is rejected.
+    Large plain csvs are parsed in shards on INGEST_PARSE_WORKERS
+    processes.
+    """
+    workers = settings.INGEST_PARSE_WORKERS
+    path = _shardable_path(csvfile.file) if workers > 1 else None
+    if path is not None:
+        return read_csv_sharded(csvfile, path, workers, progress=progress)
+    images = labels = csv = None
+    with ExitStack() as stack:
+        streams = open_streams(csvfile.file, stack)
+        if csvfile.labelfile:
+            streams += open_streams(csvfile.labelfile, stack)
+        for stream in streams:
+            head = stream.read(4)
+            if not _is_idx(head):
+                if csv is not None:
+                    raise ValueError('upload holds more than one csv!')
+                csv = (head, stream)
+                continue
+            array = read_idx(head, stream)
+            if array.ndim == 1:
+                labels = array
+            else:
+                images = array
+        if csv is not None:
+            if images is not None or labels is not None:
+                raise ValueError('upload mixes csv and idx files!')
+            head, stream = csv
+            converter = CsvStreamConverter(csvfile, progress=progress)
+            converter.feed(head)
+            for data in iter(lambda: stream.read(CHUNK_BYTES), b''):
+                converter.feed(data)
+            return converter.finish()
+    if images is None or labels is None:
+        raise ValueError('idx upload needs both images and labels!')
+    if len(images) != len(labels):
+        raise ValueError('idx images and labels differ in length!')
+    if progress is not None:
+        progress(len(labels))
+
+    return labels.astype(str), images
+
+
+def resolve_labels(user, names, create=False):
+    """Map every distinct label name to a label id of the user
+
+    The labels of the user are looked up in one query. Missing names
+    are created in one bulk insert when create is set and rejected
+    otherwise. Return the mapping and the sorted names created.
+    """
+    distinct = set(names)
+    labels = dict(
+        Label.objects.filter(user=user, name__in=distinct)
+        .values_list('name', 'id')
+    )
+    missing = sorted(distinct - labels.keys())
+    if missing and not create:
+        raise ValueError(f'label is not valid! {missing}')
+    if missing:
+        Label.objects.bulk_create(
+            Label(user=user, name=name) for name in missing
+        )
+        labels.update(
+            Label.objects.filter(user=user, name__in=missing)
+            .values_list('name', 'id')
+        )
+        cache.bump(user.id, Label)
+
+    return labels, missing
+
+
+def known_digests(csvfile, digests):
+    """Map digests already stored by the user elsewhere to an image id"""
+    known = {}
+    distinct = list(set(digests))
+    for start in range(0, len(distinct), DIGEST_BATCH_SIZE):
+        known.update(
+            Image.objects.filter(
+                user_id=csvfile.user_id,
+                digest__in=distinct[start:start + DIGEST_BATCH_SIZE],
+                duplicate_of__isnull=True,
+            ).exclude(csvfile=csvfile).values_list('digest', 'id')
+        )
+
+    return known
+
+
+def changed_spans(previous, digests, rows):
+    """Return the [start, stop) row ranges of the chunks that changed"""
+    spans = []
+    for i, digest in enumerate(digests):
+        if i < len(previous) and previous[i] == digest:
+            continue
+        start = i * DIFF_CHUNK_ROWS
+        stop = min(start + DIFF_CHUNK_ROWS, rows)
+        if spans and spans[-1][1] == start:
+            spans[-1][1] = stop
+        else:
+            spans.append([start, stop])
+
+    return spans
+
+
+def diff_images(csvfile, label_ids, pixels, start, stop):
+    """Return the images to insert and to update in a range of rows"""
+    digests = store.row_digests(pixels[start:stop])
+    known = known_digests(csvfile, digests)
+    existing = {
+        image.row: image
+        for image in Image.objects.filter(
+            csvfile=csvfile, row__gte=start, row__lt=stop
+        ).only('id', 'row', 'label', 'digest', 'duplicate_of')
+    }
+    inserts, updates = [], []
+    for row, label_id, digest in zip(
+            range(start, stop), label_ids[start:stop].tolist(), digests):
+        duplicate_of_id = known.get(digest)
+        image = existing.get(row)
+        if image is None:
+            inserts.append(Image(
+                user_id=csvfile.user_id,
+                name=f'{csvfile.id}_{row}',
+                csvfile_id=csvfile.id,
+                row=row,
+                label_id=label_id,
+                digest=digest,
+                duplicate_of_id=duplicate_of_id,
+            ))
+        elif (image.label_id, image.digest, image.duplicate_of_id) != \
+                (label_id, digest, duplicate_of_id):
+            image.label_id = label_id
+            image.digest = digest
+            image.duplicate_of_id = duplicate_of_id
+            updates.append(image)
+
+    return inserts, updates
+
+
+def duplicate_counts(csvfile, pixels, label_ids):
+    """Count per label the rows whose pixels repeat other images
+
+    A row counts when it repeats an earlier row of the csvfile or is
+    linked to an image stored by another csvfile of the user. The rows
+    are hashed DIGEST_BATCH_SIZE at a time.
+    """
+    rows = len(label_ids)
+    if not rows:
+        return {}
+    digests = np.array([
+        digest
+        for start in range(0, rows, DIGEST_BATCH_SIZE)
+        for digest in store.row_digests(
+            pixels[start:start + DIGEST_BATCH_SIZE]
+        )
+    ])
+    repeated = np.ones(rows, dtype=bool)
+    repeated[np.unique(digests, return_index=True)[1]] = False
+    linked = np.fromiter(
+        Image.objects.filter(
+            csvfile=csvfile, duplicate_of__isnull=False, row__lt=rows
+        ).values_list('row', flat=True),
+        dtype=np.int64
+    )
+    repeated[linked] = True
+    ids, counts = np.unique(np.asarray(label_ids)[repeated],
+                            return_counts=True)
+
+    return dict(zip(map(str, ids.tolist()), counts.tolist()))
+
+
+def refresh_duplicates(csvfile_ids):
+    """Recount the duplicates of csvfiles whose links were cleared"""
+    for csvfile in Csvfile.objects.filter(id__in=csvfile_ids).defer(None):
+        if not csvfile.img_arrays:
+            continue
+        csvfile.stats = dict(csvfile.stats, duplicates=duplicate_counts(
+            csvfile, store.load_pixels(csvfile, mmap_mode='r'),
+            store.load_label_ids(csvfile, mmap_mode='r')
+        ))
+        csvfile.save(update_fields=['stats'])
+
+
+def create_images(csvfile, names, pixels, create_labels=False,
+                  allow_empty=False):
+    """Bring the images of a csvfile in line with the parsed rows
+
+    Rows are compared DIFF_CHUNK_ROWS at a time with the chunk digests
+    of the previous ingest. Only the rows of changed chunks are hashed
+    and looked up, and the rows that differ are inserted, updated or
+    deleted in a single transaction, which holds the csvfile row so that
+    ingests of the same csvfile run one after the other. An empty parse
+    only replaces the images of a csvfile when allow_empty is set.
+    Return a summary of the changes with the number of rows of every
+    label.
+    """
+    if not len(names) and not allow_empty and \
+            Image.objects.filter(csvfile=csvfile).exists():
+        raise ValueError('csv has no rows!')
+    distinct, inverse, counts = np.unique(
+        names, return_inverse=True, return_counts=True
+    )
+    labels, created = resolve_labels(
+        csvfile.user, distinct.tolist(), create=create_labels
+    )
+    label_ids = np.array(
+        [labels[name] for name in distinct.tolist()], dtype=np.int64
+    )[inverse.reshape(-1)]
+    rows = len(label_ids)
+    digests = store.chunk_digests(pixels, label_ids, DIFF_CHUNK_ROWS)
+    stats = store.pixel_stats(pixels, label_ids)
+    with store.store_transaction() as written:
+        # wait for a concurrent ingest and diff against what it stored
+        list(Csvfile.objects.select_for_update().filter(id=csvfile.id)
+             .values_list('id'))
+        csvfile.refresh_from_db(fields=STORE_FIELDS)
+        spans = changed_spans(csvfile.chunk_digests, digests, rows)
+        written += store.write_store(csvfile, pixels, label_ids)
+        inserts, updates = [], []
+        for start, stop in spans:
+            span_inserts, span_updates = diff_images(
+                csvfile, label_ids, pixels, start, stop
+            )
+            inserts += span_inserts
+            updates += span_updates
+        linking = set(
+            Image.objects.filter(duplicate_of__csvfile=csvfile)
+            .exclude(csvfile=csvfile).values_list('csvfile_id', flat=True)
+        )
+        deleted, _ = Image.objects.filter(
+            csvfile=csvfile, row__gte=rows
+        ).delete()
+        changed = [image.id for image in updates]
+        for start in range(0, len(changed), DIGEST_BATCH_SIZE):
+            Image.objects.filter(
+                duplicate_of_id__in=changed[start:start + DIGEST_BATCH_SIZE]
+            ).exclude(csvfile=csvfile).update(duplicate_of=None)
+        Image.objects.bulk_update(
+            updates, ['label', 'digest', 'duplicate_of'],
+            batch_size=BULK_BATCH_SIZE
+        )
+        Image.objects.bulk_create(inserts, batch_size=BULK_BATCH_SIZE)
+        stats['duplicates'] = duplicate_counts(csvfile, pixels, label_ids)
+        if updates or deleted:
+            refresh_duplicates(linking)
+        csvfile.chunk_digests = digests
+        csvfile.stats = stats
+        csvfile.save(update_fields=['chunk_digests', 'stats'])
+        materialize.invalidate(Dataset.objects.filter(csvfiles=csvfile))
+    cache.bump(csvfile.user_id, Image)
+
+    return {
+        'rows': rows,
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'deleted': deleted,
+        'unchanged': rows - len(inserts) - len(updates),
+        'labels': dict(zip(distinct.tolist(), counts.tolist())),
+        'labels_created': created,
+    }
+
+
+def relabel_store(rows, label_id):
+    """Write a label id into the stored rows of csvfiles
+
+    rows maps a csvfile id to the rows to relabel; deleted images get
+    store.DELETED_LABEL, which no dataset selects. The chunk digests and
+    statistics are recomputed, so the next upload of a csvfile is diffed
+    against what its images now hold.
+    """
+    for csvfile in Csvfile.objects.filter(id__in=rows):
+        if not csvfile.label_array:
+            continue
+        label_ids = store.load_label_ids(csvfile, mmap_mode='r+')
+        selected = np.asarray(rows[csvfile.id], dtype=np.int64)
+        label_ids[selected[selected < len(label_ids)]] = label_id
+        label_ids.flush()
+        pixels = store.load_pixels(csvfile, mmap_mode='r')
+        csvfile.chunk_digests = store.chunk_digests(
+            pixels, label_ids, DIFF_CHUNK_ROWS
+        )
+        csvfile.stats = dict(
+            store.pixel_stats(pixels, label_ids),
+            duplicates=duplicate_counts(csvfile, pixels, label_ids)
+        )
+        csvfile.save(update_fields=['chunk_digests', 'stats'])
+    materialize.invalidate(Dataset.objects.filter(csvfiles__in=list(rows)))
+
+
+def ingest_csvfile(csvfile, progress=None, create_labels=False,
+                   allow_empty=False):
+    """Parse the file of a csvfile and bring its images up to date"""
+    names, pixels = read_upload(csvfile, progress=progress)
+
+    return create_images(csvfile, names, pixels, create_labels=create_labels,
+                         allow_empty=allow_empty)
+
+
+def _run_job(job, ingest):
+    """Run ingest(progress) for a job, recording its progress on the job"""
+    jobs = IngestJob.objects.filter(id=job.id)
+    jobs.update(state=IngestJob.RUNNING)
+    started = time.monotonic()
+
+    def progress(rows):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        jobs.update(rows_processed=rows, rows_per_sec=rows/elapsed)
+
+    try:
+        result = ingest(progress)
+    except Exception as exc:
+        jobs.update(state=IngestJob.FAILED, errors=str(exc))
+        return None
+    progress(result['rows'])
+    jobs.update(state=IngestJob.DONE, summary=result)
+
+    return result
+
+
+def run_ingest_job(job_id):
+    """Run an ingest job of the uploaded file of a csvfile"""
+    job = IngestJob.objects.select_related('csvfile').get(id=job_id)
+
+    return _run_job(
+        job, lambda progress: ingest_csvfile(
+            job.csvfile, progress=progress, create_labels=job.create_labels,
+            allow_empty=job.allow_empty
+        )
+    )
+
+
+def ingest_stream(job, chunks, keep_raw=False):
+    """Ingest a csv arriving as byte chunks, converting while it arrives
+
+    A gzip compressed body is decompressed on the fly. Only the compact
+    arrays are written; with keep_raw the csv is also kept gzip
+    compressed as the file of the csvfile. Missing labels are created
+    and existing images replaced by an empty csv when the job allows it.
+    """
+    csvfile = job.csvfile
+
+    def ingest(progress):
+        raw = tempfile.TemporaryFile() if keep_raw else None
+        try:
+            gz = gzip.GzipFile(fileobj=raw, mode='wb') if keep_raw else None
+            converter = CsvStreamConverter(csvfile, raw=gz, progress=progress)
+            decompress = None
+            for data in chunks:
+                if decompress is None:
+                    gzipped = data[:2] == GZIP_MAGIC
+                    decompress = zlib.decompressobj(wbits=31) \
+                        if gzipped else False
+                converter.feed(decompress.decompress(data)
+                               if decompress else data)
+            names, pixels = converter.finish()
+            result = create_images(csvfile, names, pixels,
+                                   create_labels=job.create_labels,
+                                   allow_empty=job.allow_empty)
+            if keep_raw:
+                gz.close()
+                raw.seek(0)
+                if csvfile.file:
+                    csvfile.file.delete(save=False)
+                csvfile.file.save('upload.csv.gz', File(raw), save=False)
+                csvfile.save(update_fields=['file'])
+        finally:
+            if raw is not None:
+                raw.close()
+
+        return result
+
+    return _run_job(job, ingest)
@@ -0,0 +1,102 @@
+import io
+
+import numpy as np
+
+from django.core.files.base import ContentFile
+from django.db.models import F
+
+from core.models import Dataset
+
+from dataset import store
+
+
+SPLITS = ('train', 'val', 'test')
+
+
+def invalidate(datasets):
+    """Bump the version of datasets, making their row index stale"""
+    datasets.update(version=F('version') + 1)
+
+
+def stratified_split(indices, targets, fractions, seed=0, shuffle=True):
+    """Split rows into parts keeping the share of every class
+
+    fractions maps a split name to its share of the rows of each class.
+    With shuffle the rows of each split are shuffled with the seed,
+    otherwise they keep the order of the tensor view.
+    """
+    rng = np.random.default_rng(seed)
+    names = list(fractions)
+    shares = np.cumsum([fractions[name] for name in names])
+    parts = {name: [np.empty(0, dtype=np.int64)] for name in names}
+    for target in np.unique(targets).tolist():
+        rows = indices[targets == target]
+        if shuffle:
+            rows = rng.permutation(rows)
+        bounds = np.round(shares[:-1] * len(rows)).astype(np.int64)
+        for name, part in zip(names, np.split(rows, bounds)):
+            parts[name].append(part)
+    splits = {}
+    for name in names:
+        rows = np.concatenate(parts[name])
+        splits[name] = rng.permutation(rows) if shuffle else np.sort(rows)
+
+    return splits
+
+
+def materialize(dataset, fractions, seed=0, shuffle=True):
+    """Build and store the row index of a dataset, return its metadata
+
+    The index holds the global rows of the tensor view for every split
+    and the classes. It is tagged with the version of the dataset read
+    before building, so a concurrent change leaves it stale.
+    """
+    version = Dataset.objects.values_list('version', flat=True).get(
+        id=dataset.id
+    )
+    _, indices, classes, targets = store.dataset_rows(dataset)
+    splits = stratified_split(indices, targets, fractions, seed, shuffle)
+    findex = io.BytesIO()
+    np.savez(findex, classes=classes, **splits)
+    if dataset.index:
+        dataset.index.delete(save=False)
+    dataset.index.save('index.npz', ContentFile(findex.getvalue()),
+                       save=False)
+    dataset.index_meta = {
+        'version': version,
+        'seed': seed,
+        'shuffle': shuffle,
+        'fractions': fractions,
+        'rows': {name: len(rows) for name, rows in splits.items()},
+    }
+    dataset.save(update_fields=['index', 'index_meta'])
+
+    return dataset.index_meta
+
+
+def is_fresh(dataset):
+    """Return whether the stored index matches the current dataset"""
+    version = Dataset.objects.values_list('version', flat=True).get(
+        id=dataset.id
+    )
+
+    return bool(dataset.index) and \
+        dataset.index_meta.get('version') == version
+
+
+def split_rows(dataset, split):
+    """Return the tensor view, rows, classes and targets of a split
+
+    None when the dataset has no fresh index or no such split.
+    """
+    if not is_fresh(dataset):
+        return None
+    with np.load(dataset.index.path) as index:
+        if split not in index.files:
+            return None
+        indices = index[split]
+        classes = index['classes']
+    view = store.DatasetTensorView(dataset)
+    targets = np.searchsorted(classes, view.label_ids[indices])
+
+    return view, indices, classes, targets
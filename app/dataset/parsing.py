@@ -0,0 +1,76 @@
+"""Csv parsing helpers free of Django imports
+
+They run in the shard parsing worker processes, which do not set up
+Django.
+"""
+import os
+
+import numpy as np
+
+
+def parse_lines(lines, labelcol, start, end, size):
+    """Parse csv lines into label names and uint8 pixels
+
+    Double quoted fields are unquoted like csv.reader does.
+    """
+    names = np.loadtxt(
+        lines, delimiter=',', usecols=labelcol, dtype=str, ndmin=1,
+        quotechar='"'
+    )
+    pixels = np.loadtxt(
+        lines, delimiter=',', usecols=range(start, end), dtype=np.uint8,
+        ndmin=2, quotechar='"'
+    )
+
+    return names, pixels.reshape(-1, size, size)
+
+
+def shard_ranges(path, shards):
+    """Split a csv after its header into byte ranges aligned to lines"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()  # skip the headers
+        start = f.tell()
+        bounds = [start]
+        for shard in range(1, shards):
+            f.seek(max(start + (size - start) * shard // shards, bounds[-1]))
+            f.readline()
+            bounds.append(f.tell())
+    bounds.append(size)
+
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _shard_lines(path, start, end):
+    """Return the non blank lines of a byte range of a csv"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    return [line for line in data.splitlines() if line.strip()]
+
+
+def count_rows(path, start, end):
+    """Return the number of rows in a byte range of a csv"""
+    return len(_shard_lines(path, start, end))
+
+
+def parse_shard(path, start, end, columns, out_path, offset, chunk_rows):
+    """Parse a byte range of a csv into its slice of a shared .npy
+
+    columns holds the label column, the first and the past the end image
+    columns and the image size. Returns the label names of the rows.
+    """
+    labelcol, colstart, colend, size = columns
+    lines = [line.decode() for line in _shard_lines(path, start, end)]
+    out = np.load(out_path, mmap_mode='r+')
+    names = [np.empty(0, dtype=str)]
+    for i in range(0, len(lines), chunk_rows):
+        chunk_names, pixels = parse_lines(
+            lines[i:i + chunk_rows], labelcol, colstart, colend, size
+        )
+        out[offset + i:offset + i + len(chunk_names)] = pixels
+        names.append(chunk_names)
+    out.flush()
+
+    return np.concatenate(names)
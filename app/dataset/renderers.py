@@ -0,0 +1,121 @@
+import io
+
+from PIL import Image as Img
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+class ImageRenderer(renderers.BaseRenderer):
+    """Encode a uint8 pixel array as an image"""
+    charset = None
+    render_style = 'binary'
+    pil_format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            return renderers.JSONRenderer().render(data)
+        fimg = io.BytesIO()
+        Img.fromarray(data, 'L').save(fimg, self.pil_format)
+
+        return fimg.getvalue()
+
+
+class PNGRenderer(ImageRenderer):
+    media_type = 'image/png'
+    format = 'png'
+    pil_format = 'png'
+
+
+class BMPRenderer(ImageRenderer):
+    media_type = 'image/bmp'
+    format = 'bmp'
+    pil_format = 'bmp'
+
+
+class ExportRenderer(renderers.BaseRenderer):
+    """Content type of a streamed dataset export; errors render as json"""
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        return renderers.JSONRenderer().render(data)
+
+
+class NPZRenderer(ExportRenderer):
+    media_type = 'application/x-npz'
+    format = 'npz'
+    extension = 'npz'
+
+
+class NPYRenderer(ExportRenderer):
+    media_type = 'application/x-npy'
+    format = 'npy'
+    extension = 'npy'
+
+
+class IDXRenderer(ExportRenderer):
+    media_type = 'application/zip'
+    format = 'idx'
+    extension = 'zip'
+
+
+class ParquetRenderer(ExportRenderer):
+    media_type = 'application/vnd.apache.parquet'
+    format = 'parquet'
+    extension = 'parquet'
+
+
+class BatchRenderer(ExportRenderer):
+    media_type = 'application/x-mnist-batches'
+    format = 'batches'
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """JSON renderer encoding with orjson, several times faster"""
+    available = orjson is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not self.get_indent(accepted_media_type, renderer_context or {}):
+            return orjson.dumps(data, default=encoders.JSONEncoder().default,
+                                option=orjson.OPT_NON_STR_KEYS)
+
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """Binary MessagePack renderer, chosen with Accept: application/msgpack"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    available = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        return msgpack.packb(data, default=encoders.JSONEncoder().default)
+
+
+JSON_RENDERERS = (ORJSONRenderer,) if ORJSONRenderer.available else ()
+BINARY_RENDERERS = (MessagePackRenderer,) \
+    if MessagePackRenderer.available else ()
+FAST_RENDERERS = JSON_RENDERERS + BINARY_RENDERERS
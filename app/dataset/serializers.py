@@ -1,9 +1,13 @@
 from rest_framework import serializers
 
-from core.models import Label, Dataset, Csvfile, Image
+from core.models import Label, Dataset, Csvfile, Image, IngestJob
+from dataset import materialize, store
 from label.serializers import LabelSerializer
 
 
+BULK_MAX_IDS = 10000
+
+
 class CsvfileSerializer(serializers.ModelSerializer):
     """Serializer for csvfile objects"""
 
@@ -25,7 +29,14 @@ class CsvfileFileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Csvfile
-        fields = ('id', 'name', 'file', 'labelcol', 'imgcolstart', 'imgcolend')
+        fields = ('id',
+                  'name',
+                  'file',
+                  'labelfile',
+                  'labelcol',
+                  'imgcolstart',
+                  'imgcolend'
+                  )
         read_only_fields = ('id',
                             'name',
                             'labelcol',
@@ -33,6 +44,34 @@ class CsvfileFileSerializer(serializers.ModelSerializer):
                             'imgcolend'
                             )
 
+    def update(self, instance, validated_data):
+        """Drop the labelfile of an earlier upload when a file comes alone"""
+        if 'file' in validated_data and \
+                'labelfile' not in validated_data and instance.labelfile:
+            instance.labelfile.delete(save=False)
+
+        return super().update(instance, validated_data)
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    """Serializer for the ingest jobs of a csvfile"""
+
+    class Meta:
+        model = IngestJob
+        fields = ('id',
+                  'csvfile',
+                  'state',
+                  'create_labels',
+                  'allow_empty',
+                  'rows_processed',
+                  'rows_per_sec',
+                  'errors',
+                  'summary',
+                  'created_at',
+                  'updated_at'
+                  )
+        read_only_fields = fields
+
 
 class DatasetSerializer(serializers.ModelSerializer):
     """Serializer for dataset objects"""
@@ -53,27 +92,143 @@ class DatasetSerializer(serializers.ModelSerializer):
 
 class DatasetDetailSerializer(DatasetSerializer):
     """Serialize a dataset detail"""
-    csvfiles = CsvfileSerializer(read_only=True)
-    labels = LabelSerializer(read_only=True)
+    csvfiles = CsvfileSerializer(many=True, read_only=True)
+    labels = LabelSerializer(many=True, read_only=True)
+    duplicates = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
+    materialized = serializers.SerializerMethodField()
+
+    class Meta(DatasetSerializer.Meta):
+        fields = DatasetSerializer.Meta.fields + (
+            'duplicates', 'stats', 'materialized'
+        )
+
+    def get_duplicates(self, obj):
+        """Count the images repeating the pixels of another one"""
+        return self.get_stats(obj)['duplicates']
+
+    def get_stats(self, obj):
+        """Return the label histogram and pixel statistics"""
+        if not hasattr(obj, '_stats'):
+            obj._stats = store.dataset_stats(obj)
+
+        return obj._stats
+
+    def get_materialized(self, obj):
+        """Return the metadata of the row index unless it is stale"""
+        return obj.index_meta if materialize.is_fresh(obj) else None
+
+
+class MaterializeSerializer(serializers.Serializer):
+    """Validate the splits of a dataset row index"""
+    train = serializers.FloatField(default=1, min_value=0)
+    val = serializers.FloatField(default=0, min_value=0)
+    test = serializers.FloatField(default=0, min_value=0)
+    seed = serializers.IntegerField(default=0, min_value=0)
+    shuffle = serializers.BooleanField(default=True)
+
+    def validate(self, attrs):
+        """Turn the split weights into fractions summing up to one"""
+        weights = {name: attrs.pop(name) for name in materialize.SPLITS}
+        total = sum(weights.values())
+        if total <= 0:
+            raise serializers.ValidationError('splits are not valid!')
+        attrs['fractions'] = {
+            name: weight / total
+            for name, weight in weights.items() if weight > 0
+        }
+
+        return attrs
+
+
+def _id_list():
+    """Return a field holding a bounded list of object ids"""
+    return serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=BULK_MAX_IDS,
+    )
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class DatasetMembersSerializer(serializers.Serializer):
+    """Validate the labels and csvfiles added to or removed from a dataset"""
+    add_labels = _id_list()
+    remove_labels = _id_list()
+    add_csvfiles = _id_list()
+    remove_csvfiles = _id_list()
+
+    def validate(self, attrs):
+        """Only allow labels and csvfiles of the authenticated user"""
+        user = self.context['request'].user
+        for name, model in (('labels', Label), ('csvfiles', Csvfile)):
+            ids = set(attrs.get(f'add_{name}', [])) | set(
+                attrs.get(f'remove_{name}', [])
+            )
+            found = set(
+                model.objects.filter(user=user, id__in=ids)
+                .values_list('id', flat=True)
+            )
+            if ids - found:
+                raise serializers.ValidationError(
+                    {name: f'not found {sorted(ids - found)}'}
+                )
+
+        return attrs
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """Model serializer restricted to the fields passed as `fields`"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise serializers.ValidationError(
+                    {'fields': f'unknown fields {sorted(unknown)}'}
+                )
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ImageSerializer(DynamicFieldsModelSerializer):
     """Serialize an image"""
     class Meta:
         model = Image
         fields = (
-            'id', 'name', 'csvfile', 'row', 'label', 'image', 'img_array'
+            'id', 'name', 'csvfile', 'row', 'label'
         )
         read_only_fields = ('id',
                             'name',
                             'csvfile',
                             'row',
-                            'label',
-                            'image',
-                            'img_array')
+                            'label')
 
 
 class ImageDetailSerializer(ImageSerializer):
     """Serialize an image detail"""
     csvfile = CsvfileSerializer(read_only=True)
     label = LabelSerializer(read_only=True)
+
+
+class ImageBulkSerializer(serializers.Serializer):
+    """Validate the ids of images changed in bulk"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=BULK_MAX_IDS,
+    )
+
+
+class ImageRelabelSerializer(ImageBulkSerializer):
+    """Validate the new label of images relabeled in bulk"""
+    label = serializers.PrimaryKeyRelatedField(queryset=Label.objects.all())
+
+    def validate_label(self, label):
+        """Only allow labels of the authenticated user"""
+        if label.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError('label not found')
+
+        return label
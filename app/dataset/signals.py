@@ -0,0 +1,22 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from core.models import Dataset
+
+from dataset import materialize
+
+
+@receiver(m2m_changed, sender=Dataset.labels.through)
+@receiver(m2m_changed, sender=Dataset.csvfiles.through)
+def invalidate_dataset_index(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Make the row index stale when labels or csvfiles are relinked"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        ids = [instance.pk]
+    elif action == 'pre_clear':
+        ids = list(instance.dataset_set.values_list('id', flat=True))
+    else:
+        ids = pk_set
+    materialize.invalidate(Dataset.objects.filter(id__in=ids))
@@ -0,0 +1,361 @@
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+from django.core.files import File
+from django.db import transaction
+
+from core.models import Csvfile, Image
+
+
+DIGEST_CHUNK_ROWS = 4096
+STATS_CHUNK_ROWS = 4096
+DELETED_LABEL = -1
+STORE_FILES = ('img_arrays', 'label_array')
+
+
+def row_digests(pixels):
+    """Return the hex blake2b digest of the bytes of every image"""
+    pixels = np.asarray(pixels)
+    flat = pixels.reshape(len(pixels), int(np.prod(pixels.shape[1:])))
+
+    return [
+        hashlib.blake2b(row.tobytes(), digest_size=16).hexdigest()
+        for row in flat
+    ]
+
+
+def array_digest(pixels):
+    """Return the hex blake2b digest of a whole pixel array"""
+    digest = hashlib.blake2b(repr(pixels.shape).encode(), digest_size=32)
+    for start in range(0, len(pixels), DIGEST_CHUNK_ROWS):
+        digest.update(
+            np.ascontiguousarray(pixels[start:start + DIGEST_CHUNK_ROWS])
+        )
+
+    return digest.hexdigest()
+
+
+def chunk_digests(pixels, label_ids, chunk_rows):
+    """Return the digest of the pixels and labels of every chunk of rows"""
+    shape = repr(pixels.shape[1:]).encode()
+    digests = []
+    for start in range(0, len(pixels), chunk_rows):
+        digest = hashlib.blake2b(shape, digest_size=16)
+        digest.update(np.ascontiguousarray(pixels[start:start + chunk_rows]))
+        digest.update(
+            np.ascontiguousarray(label_ids[start:start + chunk_rows])
+        )
+        digests.append(digest.hexdigest())
+
+    return digests
+
+
+def release_files(files):
+    """Delete the (field name, file name) files no csvfile uses any more"""
+    for field_name, name in files:
+        if name and not Csvfile.objects.filter(**{field_name: name}).exists():
+            Csvfile._meta.get_field(field_name).storage.delete(name)
+
+
+@contextmanager
+def store_transaction():
+    """Run a transaction, deleting the store files it wrote on rollback
+
+    Yield a list to extend with the files returned by write_store.
+    """
+    written = []
+    try:
+        with transaction.atomic():
+            yield written
+    except BaseException:
+        release_files(written)
+        raise
+
+
+def _save_array(fieldfile, filename, array):
+    """Save an array as .npy under a new name without saving the model"""
+    with tempfile.TemporaryFile() as tmp:
+        np.save(tmp, array)
+        tmp.seek(0)
+        fieldfile.save(filename, File(tmp), save=False)
+
+
+def write_store(csvfile, pixels, label_ids):
+    """Write the uint8 pixels and the label ids of a csvfile
+
+    Row i of both arrays is the image whose row is i. Pixels identical
+    to the stored ones or to another csvfile of the user are not written
+    again; the existing array file is shared instead. New arrays get new
+    files and the replaced ones are only deleted once the transaction
+    commits, so a rollback leaves the previous store intact. Return the
+    files written, see store_transaction.
+    """
+    previous = [(field_name, getattr(csvfile, field_name).name)
+                for field_name in STORE_FILES]
+    written = []
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    digest = array_digest(pixels)
+    if csvfile.digest != digest or not csvfile.img_arrays:
+        same = Csvfile.objects.filter(
+            user_id=csvfile.user_id, digest=digest
+        ).exclude(id=csvfile.id).exclude(img_arrays='').exclude(
+            img_arrays=None
+        ).first()
+        if same is None:
+            _save_array(csvfile.img_arrays, 'pixels.npy',
+                        np.ascontiguousarray(pixels))
+            written.append(('img_arrays', csvfile.img_arrays.name))
+        else:
+            csvfile.img_arrays = same.img_arrays.name
+    _save_array(csvfile.label_array, 'labels.npy',
+                np.asarray(label_ids, dtype=np.int64))
+    written.append(('label_array', csvfile.label_array.name))
+    csvfile.digest = digest
+    csvfile.save(update_fields=['img_arrays', 'label_array', 'digest'])
+    transaction.on_commit(lambda: release_files(previous))
+
+    return written
+
+
+def load_pixels(csvfile, mmap_mode=None):
+    """Load the uint8 pixels of a csvfile, shaped N x H x W"""
+    return np.load(csvfile.img_arrays.path, mmap_mode=mmap_mode)
+
+
+def load_label_ids(csvfile, mmap_mode=None):
+    """Load the label id of every row of a csvfile"""
+    return np.load(csvfile.label_array.path, mmap_mode=mmap_mode)
+
+
+def image_pixels(image):
+    """Return the uint8 pixels of a single image"""
+    return load_pixels(image.csvfile, mmap_mode='r')[image.row]
+
+
+def _moments(pixels):
+    """Return the row count, per pixel mean and squared deviations"""
+    values = pixels.reshape(len(pixels), -1).astype(np.float64)
+    mean = values.mean(axis=0)
+
+    return {
+        'rows': len(values),
+        'mean': mean,
+        'm2': ((values - mean) ** 2).sum(axis=0),
+        'min': int(values.min()),
+        'max': int(values.max()),
+    }
+
+
+def merge_moments(a, b):
+    """Combine the moments of two groups of rows by parallel variance"""
+    rows = a['rows'] + b['rows']
+    delta = b['mean'] - a['mean']
+
+    return {
+        'rows': rows,
+        'mean': a['mean'] + delta * (b['rows'] / rows),
+        'm2': a['m2'] + b['m2'] + delta ** 2 * (a['rows'] * b['rows'] / rows),
+        'min': min(a['min'], b['min']),
+        'max': max(a['max'], b['max']),
+    }
+
+
+def pixel_stats(pixels, label_ids, chunk_rows=STATS_CHUNK_ROWS):
+    """Return the JSON ready moments of the pixels of every label
+
+    The rows are read chunk_rows at a time, so memory does not grow
+    with the csvfile.
+    """
+    groups = {}
+    for start in range(0, len(pixels), chunk_rows):
+        chunk = np.asarray(pixels[start:start + chunk_rows])
+        ids = np.asarray(label_ids[start:start + chunk_rows])
+        for label_id in np.unique(ids).tolist():
+            part = _moments(chunk[ids == label_id])
+            groups[label_id] = merge_moments(groups[label_id], part) \
+                if label_id in groups else part
+
+    return {
+        'rows': len(pixels),
+        'labels': {
+            str(label_id): dict(group, mean=group['mean'].tolist(),
+                                m2=group['m2'].tolist())
+            for label_id, group in groups.items()
+        },
+    }
+
+
+def dataset_stats(dataset):
+    """Merge the stored statistics of the csvfiles of a dataset
+
+    Only the rows of the labels of the dataset are counted, matching
+    the rows a model is trained on; duplicates sums the rows repeating
+    other pixels, counted at ingest. No pixels are read, prefetched
+    labels are reused and the stats of every csvfile are read in one
+    query of that column alone.
+    """
+    names = {label.id: label.name for label in dataset.labels.all()}
+    counts = dict.fromkeys(names.values(), 0)
+    duplicates = 0
+    total = None
+    for stats in Csvfile.objects.filter(dataset=dataset).values_list(
+            'stats', flat=True):
+        duplicates += sum(
+            count for label_id, count in stats.get('duplicates', {}).items()
+            if int(label_id) in names
+        )
+        for label_id, group in stats.get('labels', {}).items():
+            if int(label_id) not in names:
+                continue
+            counts[names[int(label_id)]] += group['rows']
+            group = dict(group, mean=np.asarray(group['mean']),
+                         m2=np.asarray(group['m2']))
+            total = group if total is None else merge_moments(total, group)
+    if total is None:
+        return {'rows': 0, 'labels': counts, 'duplicates': duplicates,
+                'mean': [], 'std': [], 'min': None, 'max': None}
+
+    return {
+        'rows': total['rows'],
+        'labels': counts,
+        'duplicates': duplicates,
+        'mean': total['mean'].tolist(),
+        'std': np.sqrt(total['m2'] / total['rows']).tolist(),
+        'min': total['min'],
+        'max': total['max'],
+    }
+
+
+class DatasetTensorView:
+    """Read only view over the pixels of every csvfile of a dataset
+
+    The arrays of each csvfile are memory mapped, so memory use does not
+    grow with the dataset and worker processes share pages through the
+    page cache. Rows are addressed by a global index running over the
+    csvfiles ordered by id; nothing is concatenated. Csvfiles with images
+    but no stored pixels, e.g. ingested before the store existed, raise
+    ValueError instead of being left out.
+    """
+
+    def __init__(self, dataset):
+        csvfiles = list(dataset.csvfiles.order_by('id'))
+        self.csvfiles = [c for c in csvfiles if c.img_arrays]
+        missing = [c for c in csvfiles if not c.img_arrays]
+        if missing and Image.objects.filter(csvfile__in=missing).exists():
+            raise ValueError(
+                f'csvfiles {sorted(c.name for c in missing)} are not in '
+                'the tensor store, re-ingest them!'
+            )
+        self.parts = [load_pixels(c, mmap_mode='r') for c in self.csvfiles]
+        self.label_parts = [
+            load_label_ids(c, mmap_mode='r') for c in self.csvfiles
+        ]
+        shapes = {part.shape[1:] for part in self.parts}
+        if len(shapes) > 1:
+            raise ValueError('csvfiles have different image sizes!')
+        self.image_shape = shapes.pop() if shapes else (0, 0)
+        self.offsets = np.cumsum([0] + [len(part) for part in self.parts])
+        self._label_ids = None
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def shape(self):
+        return (len(self),) + tuple(self.image_shape)
+
+    @property
+    def label_ids(self):
+        """Label id of every row, the only array held in memory"""
+        if self._label_ids is None:
+            self._label_ids = np.concatenate(
+                [np.empty(0, dtype=np.int64)] + self.label_parts
+            )
+
+        return self._label_ids
+
+    def locate(self, index):
+        """Return the csvfile position and the row of a global index"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('row index out of range')
+        part = int(np.searchsorted(self.offsets, index, side='right')) - 1
+
+        return part, int(index - self.offsets[part])
+
+    def csvfile_rows(self, csvfile):
+        """Return the zero-copy pixels of a single csvfile"""
+        return self.parts[self.csvfiles.index(csvfile)]
+
+    def take(self, indices):
+        """Gather the given rows, copying only the rows selected"""
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        if indices.size and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError('row index out of range')
+        out = np.empty((len(indices),) + tuple(self.image_shape),
+                       dtype=np.uint8)
+        parts = np.searchsorted(self.offsets, indices, side='right') - 1
+        for part in np.unique(parts):
+            mask = parts == part
+            out[mask] = self.parts[part][indices[mask] - self.offsets[part]]
+
+        return out
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            part, row = self.locate(key)
+            return self.parts[part][row]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1 and stop > start:
+                part, row = self.locate(start)
+                if stop <= self.offsets[part + 1]:
+                    return self.parts[part][row:row + stop - start]
+            return self.take(np.arange(start, stop, step))
+
+        return self.take(key)
+
+    def label_indices(self, label):
+        """Return the global indices of the rows of a label"""
+        label_id = getattr(label, 'id', label)
+
+        return np.flatnonzero(self.label_ids == label_id)
+
+    def by_label(self, label):
+        """Return the pixels of every row of a label"""
+        return self.take(self.label_indices(label))
+
+
+def dataset_rows(dataset):
+    """Return the tensor view, rows, classes and targets of a dataset
+
+    Only the rows whose label is one of the labels of the dataset are
+    kept; classes holds the sorted label ids and targets the class index
+    of every kept row.
+    """
+    view = DatasetTensorView(dataset)
+    classes = np.array(
+        sorted(dataset.labels.values_list('id', flat=True)), dtype=np.int64
+    )
+    indices = np.flatnonzero(np.isin(view.label_ids, classes))
+    targets = np.searchsorted(classes, view.label_ids[indices])
+
+    return view, indices, classes, targets
+
+
+def sprite_sheet(pixels, cols):
+    """Tile N x H x W pixels into one image holding cols images per line"""
+    count, height, width = pixels.shape
+    cols = max(min(cols, count), 1)
+    rows = -(-count // cols)
+    sheet = np.zeros((rows * cols, height, width), dtype=np.uint8)
+    sheet[:count] = pixels
+
+    return sheet.reshape(rows, cols, height, width).swapaxes(1, 2).reshape(
+        rows * height, cols * width
+    )
@@ -0,0 +1,173 @@
+import io
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Dataset, Label
+
+from dataset import batches, client
+from dataset.tests.test_store import sample_csvfile
+
+
+def batches_url(dataset_id):
+    """Return URL for streaming the batches of a dataset"""
+    return reverse('dataset:dataset-batches', args=[dataset_id])
+
+
+def read_frames(body):
+    """Return every frame of a batch stream"""
+    stream = io.BytesIO(body)
+    frames = []
+    while (frame := batches.read_frame(stream)) is not None:
+        frames.append(frame)
+
+    return frames
+
+
+class BatchesTestCase(TestCase):
+    """Dataset of ten rows whose pixels all equal the row number"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.cat = Label.objects.create(user=self.user, name='cat')
+        self.dog = Label.objects.create(user=self.user, name='dog')
+        pixels = np.arange(10, dtype=np.uint8).repeat(4).reshape(10, 2, 2)
+        self.csvfile = sample_csvfile(self.user, 'train', pixels,
+                                      [self.cat.id, self.dog.id] * 5)
+        self.dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        self.dataset.csvfiles.add(self.csvfile)
+        self.dataset.labels.add(self.cat, self.dog)
+
+    def tearDown(self):
+        self.csvfile.img_arrays.delete()
+        self.csvfile.label_array.delete()
+
+    def fetch(self, query='', **headers):
+        res = self.client.get(batches_url(self.dataset.id) + query,
+                              **headers)
+        body = b''.join(res.streaming_content) if res.streaming else b''
+
+        return res, body
+
+
+class BatchesApiTests(BatchesTestCase):
+    """Test streaming shuffled mini-batches of a dataset"""
+
+    def test_batches_cover_every_row(self):
+        """Test that an epoch yields every row once with its label"""
+        res, body = self.fetch('?batch_size=4&seed=1')
+
+        frames = read_frames(body)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Batch-Count'], '3')
+        self.assertEqual([index for index, _, _ in frames], [0, 1, 2])
+        self.assertEqual([len(p) for _, p, _ in frames], [4, 4, 2])
+        values = np.concatenate([p[:, 0, 0] for _, p, _ in frames])
+        targets = np.concatenate([t for _, _, t in frames])
+        self.assertEqual(sorted(values.tolist()), list(range(10)))
+        self.assertEqual(targets.tolist(), (values % 2).tolist())
+
+    def test_batches_order_depends_on_seed_and_epoch(self):
+        """Test that the shuffle is reproducible and changes per epoch"""
+        _, first = self.fetch('?batch_size=10&seed=1&epoch=0')
+        _, again = self.fetch('?batch_size=10&seed=1&epoch=0')
+        _, other = self.fetch('?batch_size=10&seed=1&epoch=1')
+
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, other)
+
+    def test_batches_resume_with_range(self):
+        """Test that a range request resumes at a batch"""
+        _, full = self.fetch('?batch_size=3&seed=2')
+
+        res, tail = self.fetch('?batch_size=3&seed=2',
+                               HTTP_RANGE='batches=2-')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(res['Content-Range'], 'batches 2-3/4')
+        self.assertTrue(full.endswith(tail))
+        self.assertEqual(read_frames(tail)[0][0], 2)
+
+    def test_batches_range_not_satisfiable(self):
+        """Test that resuming past the last batch is rejected"""
+        res, _ = self.fetch('?batch_size=5', HTTP_RANGE='batches=2-')
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(res['Content-Range'], 'batches */2')
+
+    def test_batches_invalid_batch_size(self):
+        """Test that an invalid batch size is rejected"""
+        res, _ = self.fetch('?batch_size=0')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchClientTests(BatchesTestCase):
+    """Test the prefetching client against the API"""
+
+    def opener(self, query, fail_after=None):
+        """Return an opener answering with bodies fetched up front
+
+        The client reads on a background thread, which cannot share the
+        test database, so both possible responses are fetched first.
+        """
+        _, full = self.fetch(query)
+        _, tail = self.fetch(query, HTTP_RANGE='batches=1-')
+        calls = []
+
+        def urlopen(request):
+            self.assertIn(query[1:], request.full_url)
+            calls.append(request.get_header('Range'))
+            body = tail if calls[-1] else full
+            if fail_after is not None and len(calls) == 1:
+                body = body[:fail_after]
+            return io.BytesIO(body)
+
+        return urlopen, calls
+
+    @property
+    def url(self):
+        return 'http://testserver' + batches_url(self.dataset.id)
+
+    def test_client_yields_batches(self):
+        """Test that the client generator yields every batch"""
+        urlopen, calls = self.opener('?batch_size=4&seed=1&epoch=0')
+
+        result = list(client.iter_batches(self.url,
+                                          'token', batch_size=4, seed=1,
+                                          opener=urlopen))
+
+        self.assertEqual([len(pixels) for pixels, _ in result], [4, 4, 2])
+        self.assertEqual(calls, [None])
+
+    def test_client_resumes_broken_stream(self):
+        """Test that a truncated stream is resumed at the missing batch"""
+        urlopen, calls = self.opener(
+            '?batch_size=4&seed=1&epoch=0',
+            fail_after=batches.FRAME_HEADER.size + 4 * 4 + 4 * 2 + 3
+        )
+        _, body = self.fetch('?batch_size=4&seed=1')
+
+        result = list(client.iter_batches(self.url,
+                                          'token', batch_size=4, seed=1,
+                                          opener=urlopen))
+
+        self.assertEqual(calls, [None, 'batches=1-'])
+        expected = read_frames(body)
+        self.assertEqual(len(result), len(expected))
+        for (pixels, targets), (_, want, want_targets) in zip(result,
+                                                              expected):
+            np.testing.assert_array_equal(pixels, want)
+            np.testing.assert_array_equal(targets, want_targets)
@@ -1,15 +1,27 @@
+import bz2
+import gzip
+import io
+import struct
 import tempfile
 import os
+import zipfile
+from unittest import mock
+
+import numpy as np
 
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Csvfile, Dataset
+from core.models import Csvfile, Dataset, Image, IngestJob, Label
+from core.tests.queries import QueryCountMixin
 
+from dataset import ingest, store
 from dataset.serializers import CsvfileSerializer
 
 
@@ -21,6 +33,16 @@ def file_upload_url(csvfile_id):
     return reverse('dataset:csvfile-upload-csvfile', args=[csvfile_id])
 
 
+def stream_url(csvfile_id):
+    """Return URL for streaming a csv into a csvfile"""
+    return reverse('dataset:csvfile-stream', args=[csvfile_id])
+
+
+def ingest_status_url(csvfile_id):
+    """Return URL for the ingest status of a csvfile"""
+    return reverse('dataset:csvfile-ingest-status', args=[csvfile_id])
+
+
 class PublicCsvfilesApiTests(TestCase):
     """Test the publicly available csvfiles API"""
 
@@ -34,7 +56,7 @@ class PublicCsvfilesApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateCsvfilesApiTests(TestCase):
+class PrivateCsvfilesApiTests(QueryCountMixin, TestCase):
     """Test the private csvfiles API"""
 
     def setUp(self):
@@ -166,7 +188,22 @@ class PrivateCsvfilesApiTests(TestCase):
 
         self.assertEqual(len(res.data), 1)
 
+    def test_list_assigned_csvfiles_constant_queries(self):
+        """Test that assigned csvfiles are listed in one uncached query"""
+        dataset = Dataset.objects.create(user=self.user, name='MNIST')
+
+        def grow(size):
+            while dataset.csvfiles.count() < size:
+                dataset.csvfiles.add(Csvfile.objects.create(
+                    user=self.user, name='train', labelcol=0,
+                    imgcolstart=1, imgcolend=4
+                ))
 
+        self.assertConstantQueries(f'{CSVFILES_URL}?assigned_only=1', grow,
+                                   num=2)
+
+
+@override_settings(JOB_WORKERS=0)
 class CsvfileUploadTests(TestCase):
 
     def setUp(self):
@@ -197,8 +234,9 @@ class CsvfileUploadTests(TestCase):
             ntf.seek(0)
             res = self.client.post(url, {'file': ntf}, format='multipart')
         self.csvfile.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('file', res.data)
+        self.assertEqual(res.data['job']['state'], IngestJob.DONE)
         self.assertTrue(os.path.exists(self.csvfile.file.path))
 
     def test_upload_file_bad_request(self):
@@ -207,3 +245,635 @@ class CsvfileUploadTests(TestCase):
         res = self.client.post(url, {'file': 'notfile'}, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_file_creates_images(self):
+        """Test uploading a csv populates the images of the csvfile"""
+        csvfile = Csvfile.objects.create(user=self.user,
+                                         name='MNIST_tiny',
+                                         labelcol=0,
+                                         imgcolstart=1,
+                                         imgcolend=4
+                                         )
+        cat = Label.objects.create(user=self.user, name='cat')
+        dog = Label.objects.create(user=self.user, name='dog')
+        url = file_upload_url(csvfile.id)
+        with tempfile.NamedTemporaryFile(suffix='.csv') as ntf:
+            ntf.write(b"label,p0,p1,p2,p3\n")
+            ntf.write(b"cat,0,34,154,29\n")
+            ntf.write(b"dog,0,83,204,93\n")
+            ntf.flush()
+            ntf.seek(0)
+            res = self.client.post(url, {'file': ntf}, format='multipart')
+        csvfile.refresh_from_db()
+        pixels = np.load(csvfile.img_arrays.path)
+        label_ids = np.load(csvfile.label_array.path)
+        csvfile.file.delete()
+        csvfile.img_arrays.delete()
+        csvfile.label_array.delete()
+
+        images = Image.objects.filter(csvfile=csvfile).order_by('row')
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(images.count(), 2)
+        self.assertEqual(images[0].label, cat)
+        self.assertEqual(images[1].label, dog)
+        self.assertEqual(images[1].name, f'{csvfile.id}_1')
+        self.assertEqual(pixels.dtype, np.uint8)
+        self.assertEqual(pixels[images[1].row].tolist(), [[0, 83], [204, 93]])
+        self.assertEqual(label_ids.tolist(), [cat.id, dog.id])
+
+    def test_upload_file_unknown_label(self):
+        """Test uploading a csv with an unknown label fails"""
+        csvfile = Csvfile.objects.create(user=self.user,
+                                         name='MNIST_tiny',
+                                         labelcol=0,
+                                         imgcolstart=1,
+                                         imgcolend=4
+                                         )
+        url = file_upload_url(csvfile.id)
+        with tempfile.NamedTemporaryFile(suffix='.csv') as ntf:
+            ntf.write(b"label,p0,p1,p2,p3\n")
+            ntf.write(b"bird,0,34,154,29\n")
+            ntf.flush()
+            ntf.seek(0)
+            res = self.client.post(url, {'file': ntf}, format='multipart')
+        csvfile.refresh_from_db()
+        csvfile.file.delete()
+
+        job = IngestJob.objects.get(csvfile=csvfile)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(job.state, IngestJob.FAILED)
+        self.assertIn('bird', job.errors)
+        self.assertFalse(Image.objects.filter(csvfile=csvfile).exists())
+
+    def test_ingest_status(self):
+        """Test retrieving the progress of the latest ingest job"""
+        IngestJob.objects.create(user=self.user, csvfile=self.csvfile)
+        job = IngestJob.objects.create(user=self.user,
+                                       csvfile=self.csvfile,
+                                       state=IngestJob.RUNNING,
+                                       rows_processed=4096
+                                       )
+
+        res = self.client.get(ingest_status_url(self.csvfile.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], job.id)
+        self.assertEqual(res.data['rows_processed'], 4096)
+
+    def test_upload_while_ingesting(self):
+        """Test that a csvfile with an unfinished job refuses uploads"""
+        IngestJob.objects.create(user=self.user, csvfile=self.csvfile,
+                                 state=IngestJob.RUNNING)
+        url = file_upload_url(self.csvfile.id)
+
+        res = self.client.post(
+            url, {'file': SimpleUploadedFile('a.csv', b"label,p0\n")},
+            format='multipart'
+        )
+
+        self.csvfile.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(self.csvfile.file)
+        self.assertEqual(IngestJob.objects.count(), 1)
+
+    def test_stream_while_ingesting(self):
+        """Test that a csvfile with a pending job refuses streams"""
+        IngestJob.objects.create(user=self.user, csvfile=self.csvfile)
+
+        res = self.client.generic('PUT', stream_url(self.csvfile.id),
+                                  b"label,p0\n", content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+    def test_ingest_status_without_job(self):
+        """Test the ingest status of a csvfile never uploaded is 404"""
+        res = self.client.get(ingest_status_url(self.csvfile.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(JOB_WORKERS=0)
+class CsvfileStreamTests(TestCase):
+    """Test streaming a csv body into a csvfile"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.csvfile = Csvfile.objects.create(user=self.user,
+                                              name='MNIST_tiny',
+                                              labelcol=0,
+                                              imgcolstart=1,
+                                              imgcolend=4
+                                              )
+        self.cat = Label.objects.create(user=self.user, name='cat')
+        self.dog = Label.objects.create(user=self.user, name='dog')
+        self.body = b"label,p0,p1,p2,p3\r\ncat,0,34,154,29\r\n" \
+                    b"dog,0,83,204,93\r\n\r\ncat,1,2,3,4"
+
+    def tearDown(self):
+        self.csvfile.refresh_from_db()
+        for fieldfile in (self.csvfile.file, self.csvfile.img_arrays,
+                          self.csvfile.label_array):
+            if fieldfile:
+                fieldfile.delete()
+
+    def test_stream_csv(self):
+        """Test that a streamed csv is converted into the tensor store"""
+        res = self.client.generic('PUT', stream_url(self.csvfile.id),
+                                  self.body, content_type='text/csv')
+
+        self.csvfile.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['state'], IngestJob.DONE)
+        self.assertEqual(res.data['rows_processed'], 3)
+        self.assertFalse(self.csvfile.file)
+        self.assertEqual(
+            np.load(self.csvfile.img_arrays.path)[2].tolist(),
+            [[1, 2], [3, 4]]
+        )
+        self.assertEqual(Image.objects.filter(csvfile=self.csvfile,
+                                              label=self.cat).count(), 2)
+        self.assertEqual(self.csvfile.stats['rows'], 3)
+        self.assertEqual(
+            self.csvfile.stats['labels'][str(self.dog.id)]['mean'],
+            [0, 83, 204, 93]
+        )
+
+    def test_stream_csv_keep_raw(self):
+        """Test keeping a gzip copy of the streamed csv"""
+        url = stream_url(self.csvfile.id) + '?keep_raw=1'
+
+        self.client.generic('PUT', url, self.body, content_type='text/csv')
+
+        self.csvfile.refresh_from_db()
+        with gzip.open(self.csvfile.file.path) as raw:
+            self.assertEqual(raw.read(), self.body)
+
+    def test_stream_converter_chunks(self):
+        """Test that lines split across chunks are parsed once"""
+        converter = ingest.CsvStreamConverter(self.csvfile)
+        for i in range(0, len(self.body), 3):
+            converter.feed(self.body[i:i + 3])
+
+        names, pixels = converter.finish()
+
+        self.assertEqual(names.tolist(), ['cat', 'dog', 'cat'])
+        self.assertEqual(pixels[1].tolist(), [[0, 83], [204, 93]])
+
+    def test_stream_reports_label_counts(self):
+        """Test that the job summary counts the rows of every label"""
+        res = self.client.generic('PUT', stream_url(self.csvfile.id),
+                                  self.body, content_type='text/csv')
+
+        self.assertEqual(res.data['summary']['labels'], {'cat': 2, 'dog': 1})
+        self.assertEqual(res.data['summary']['labels_created'], [])
+
+    def test_stream_unknown_label(self):
+        """Test that an unknown label fails the job"""
+        res = self.client.generic('PUT', stream_url(self.csvfile.id),
+                                  self.body + b"\nbird,1,2,3,4",
+                                  content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('bird', res.data['errors'])
+
+    def test_stream_create_labels(self):
+        """Test that missing labels are created when asked to"""
+        url = stream_url(self.csvfile.id) + '?create_labels=1'
+
+        res = self.client.generic('PUT', url, self.body + b"\nbird,1,2,3,4",
+                                  content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['create_labels'])
+        self.assertEqual(res.data['summary']['labels_created'], ['bird'])
+        bird = Label.objects.get(user=self.user, name='bird')
+        self.assertEqual(Image.objects.get(csvfile=self.csvfile,
+                                           row=3).label, bird)
+
+    def test_resolve_labels_single_query(self):
+        """Test that labels are resolved and created in bulk"""
+        names = ['cat', 'dog', 'bird', 'fish']
+
+        with self.assertNumQueries(3):
+            labels, created = ingest.resolve_labels(self.user, names,
+                                                    create=True)
+
+        self.assertEqual(created, ['bird', 'fish'])
+        self.assertEqual(labels['cat'], self.cat.id)
+        self.assertEqual(set(labels), set(names))
+
+    def test_stream_invalid_csv(self):
+        """Test that a malformed stream reports a failed job"""
+        res = self.client.generic('PUT', stream_url(self.csvfile.id),
+                                  b"label,p0\ncat,notanumber,1,2,3\n",
+                                  content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['state'], IngestJob.FAILED)
+
+
+def idx_bytes(array):
+    """Encode a uint8 array in the IDX format"""
+    header = struct.pack(f'>BBBB{array.ndim}I', 0, 0, 0x08, array.ndim,
+                         *array.shape)
+
+    return header + array.astype(np.uint8).tobytes()
+
+
+def zip_bytes(members):
+    """Return a zip archive holding the given members"""
+    fzip = io.BytesIO()
+    with zipfile.ZipFile(fzip, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+    return fzip.getvalue()
+
+
+@override_settings(JOB_WORKERS=0)
+class CompressedUploadTests(TestCase):
+    """Test uploading compressed csvs and IDX files"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.csvfile = Csvfile.objects.create(user=self.user,
+                                              name='MNIST_tiny',
+                                              labelcol=0,
+                                              imgcolstart=1,
+                                              imgcolend=4
+                                              )
+        self.labels = {
+            name: Label.objects.create(user=self.user, name=name)
+            for name in ('cat', 'dog', '3', '7')
+        }
+        self.csv = b"label,p0,p1,p2,p3\ncat,0,34,154,29\ndog,0,83,204,93\n"
+        self.pixels = np.arange(8, dtype=np.uint8).reshape(2, 2, 2)
+
+    def tearDown(self):
+        self.csvfile.refresh_from_db()
+        for fieldfile in (self.csvfile.file, self.csvfile.labelfile,
+                          self.csvfile.img_arrays, self.csvfile.label_array):
+            if fieldfile:
+                fieldfile.delete()
+
+    def upload(self, **files):
+        payload = {
+            field: SimpleUploadedFile(name, data)
+            for field, (name, data) in files.items()
+        }
+        res = self.client.post(file_upload_url(self.csvfile.id), payload,
+                               format='multipart')
+        self.csvfile.refresh_from_db()
+
+        return res
+
+    def assert_images(self, names, pixels=None):
+        images = Image.objects.filter(csvfile=self.csvfile).order_by('row')
+        self.assertEqual([image.label.name for image in images], names)
+        if pixels is not None:
+            np.testing.assert_array_equal(
+                np.load(self.csvfile.img_arrays.path), pixels
+            )
+
+    def test_upload_gzip_csv(self):
+        """Test uploading a gzip compressed csv"""
+        res = self.upload(file=('train.csv.gz', gzip.compress(self.csv)))
+
+        self.assertEqual(res.data['job']['state'], IngestJob.DONE)
+        self.assert_images(['cat', 'dog'])
+
+    def test_upload_bz2_csv(self):
+        """Test uploading a bz2 compressed csv"""
+        self.upload(file=('train.csv.bz2', bz2.compress(self.csv)))
+
+        self.assert_images(['cat', 'dog'])
+
+    def test_upload_zip_csv(self):
+        """Test uploading a zipped csv"""
+        self.upload(file=('train.zip', zip_bytes({'train.csv': self.csv})))
+
+        self.assert_images(['cat', 'dog'])
+
+    def test_upload_idx_pair(self):
+        """Test uploading gzipped IDX images with their labels"""
+        self.upload(
+            file=('images-idx3-ubyte.gz',
+                  gzip.compress(idx_bytes(self.pixels))),
+            labelfile=('labels-idx1-ubyte.gz',
+                       gzip.compress(idx_bytes(np.array([7, 3])))),
+        )
+
+        self.assert_images(['7', '3'], self.pixels)
+
+    def test_upload_idx_zip(self):
+        """Test uploading IDX images and labels in one zip"""
+        self.upload(file=('mnist.zip', zip_bytes({
+            'labels-idx1-ubyte': idx_bytes(np.array([3, 3])),
+            'images-idx3-ubyte': idx_bytes(self.pixels),
+        })))
+
+        self.assert_images(['3', '3'], self.pixels)
+
+    def test_upload_zip_skips_metadata(self):
+        """Test that macOS metadata and dotfiles of a zip are skipped"""
+        self.upload(file=('train.zip', zip_bytes({
+            '__MACOSX/._train.csv': b'\x00\x05\x16\x07\x00\x02',
+            '.hidden.csv': b'label,p0,p1,p2,p3\nbird,1,2,3,4\n',
+            'train.csv': self.csv,
+        })))
+
+        self.assert_images(['cat', 'dog'])
+
+    def test_upload_zip_several_csvs(self):
+        """Test that a zip holding several csvs fails the job"""
+        res = self.upload(file=('train.zip', zip_bytes({
+            'train.csv': self.csv,
+            'val.csv': self.csv,
+        })))
+
+        self.assertEqual(res.data['job']['state'], IngestJob.FAILED)
+        self.assertIn('more than one csv', res.data['job']['errors'])
+
+    def test_new_file_clears_labelfile(self):
+        """Test that a file uploaded alone drops the earlier labelfile"""
+        self.upload(
+            file=('images-idx3-ubyte', idx_bytes(self.pixels)),
+            labelfile=('labels-idx1-ubyte', idx_bytes(np.array([7, 3]))),
+        )
+        labelfile = self.csvfile.labelfile.path
+
+        self.upload(file=('mnist.zip', zip_bytes({
+            'labels-idx1-ubyte': idx_bytes(np.array([3, 3])),
+            'images-idx3-ubyte': idx_bytes(self.pixels),
+        })))
+
+        self.assertFalse(self.csvfile.labelfile)
+        self.assertFalse(os.path.exists(labelfile))
+        self.assert_images(['3', '3'], self.pixels)
+
+    def test_upload_idx_without_labels(self):
+        """Test that IDX images without labels fail the job"""
+        res = self.upload(file=('images-idx3-ubyte', idx_bytes(self.pixels)))
+
+        self.assertEqual(res.data['job']['state'], IngestJob.FAILED)
+        self.assertIn('labels', res.data['job']['errors'])
+
+    def test_stream_gzip_csv(self):
+        """Test streaming a gzip compressed csv body"""
+        res = self.client.generic('PUT', stream_url(self.csvfile.id),
+                                  gzip.compress(self.csv),
+                                  content_type='application/gzip')
+
+        self.assertEqual(res.data['state'], IngestJob.DONE)
+        self.assert_images(['cat', 'dog'])
+
+
+class DuplicateImagesTests(TestCase):
+    """Test the content hash index of ingested images"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        Label.objects.create(user=self.user, name='cat')
+        Label.objects.create(user=self.user, name='dog')
+        self.body = b"label,p0,p1,p2,p3\ncat,0,34,154,29\ndog,0,83,204,93\n"
+        self.csvfiles = [
+            Csvfile.objects.create(user=self.user, name=f'copy_{i}',
+                                   labelcol=0, imgcolstart=1, imgcolend=4)
+            for i in range(2)
+        ]
+
+    def tearDown(self):
+        for csvfile in self.csvfiles:
+            csvfile.refresh_from_db()
+            for fieldfile in (csvfile.img_arrays, csvfile.label_array):
+                if fieldfile and os.path.exists(fieldfile.path):
+                    fieldfile.delete()
+
+    def stream(self, csvfile, body):
+        return self.client.generic('PUT', stream_url(csvfile.id), body,
+                                   content_type='text/csv')
+
+    def test_identical_upload_shares_store(self):
+        """Test that identical pixels are stored once and linked"""
+        first, second = self.csvfiles
+        self.stream(first, self.body)
+        self.stream(second, self.body)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.digest, second.digest)
+        self.assertEqual(first.img_arrays.name, second.img_arrays.name)
+        originals = dict(
+            Image.objects.filter(csvfile=first).values_list('row', 'id')
+        )
+        for image in Image.objects.filter(csvfile=second):
+            self.assertEqual(image.duplicate_of_id, originals[image.row])
+        self.assertFalse(
+            Image.objects.filter(csvfile=first,
+                                 duplicate_of__isnull=False).exists()
+        )
+
+    def test_reingest_keeps_shared_store(self):
+        """Test that replacing shared pixels keeps the other copy"""
+        first, second = self.csvfiles
+        self.stream(first, self.body)
+        self.stream(second, self.body)
+
+        self.stream(second, self.body + b"cat,1,2,3,4\n")
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertNotEqual(first.img_arrays.name, second.img_arrays.name)
+        self.assertEqual(len(np.load(first.img_arrays.path)), 2)
+        self.assertEqual(len(np.load(second.img_arrays.path)), 3)
+
+    def test_row_digests(self):
+        """Test that equal images get equal digests"""
+        pixels = np.array([[[1, 2]], [[3, 4]], [[1, 2]]], dtype=np.uint8)
+
+        digests = store.row_digests(pixels)
+
+        self.assertEqual(digests[0], digests[2])
+        self.assertNotEqual(digests[0], digests[1])
+        self.assertEqual(len(digests[0]), 32)
+
+
+class IncrementalIngestTests(TestCase):
+    """Test re-ingesting a csvfile only touches the changed rows"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.cat = Label.objects.create(user=self.user, name='cat')
+        self.dog = Label.objects.create(user=self.user, name='dog')
+        self.csvfile = Csvfile.objects.create(user=self.user,
+                                              name='MNIST_tiny',
+                                              labelcol=0,
+                                              imgcolstart=1,
+                                              imgcolend=4
+                                              )
+        self.rows = [b"cat,0,34,154,29", b"dog,0,83,204,93", b"cat,1,2,3,4"]
+
+    def tearDown(self):
+        self.csvfile.refresh_from_db()
+        for fieldfile in (self.csvfile.img_arrays, self.csvfile.label_array):
+            if fieldfile:
+                fieldfile.delete()
+
+    def stream(self, rows):
+        body = b"\n".join([b"label,p0,p1,p2,p3"] + rows)
+        res = self.client.generic('PUT', stream_url(self.csvfile.id), body,
+                                  content_type='text/csv')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return res.data['summary']
+
+    def test_first_ingest_inserts_every_row(self):
+        """Test that the first ingest reports every row as inserted"""
+        summary = self.stream(self.rows)
+
+        self.assertEqual(summary['inserted'], 3)
+        self.assertEqual(summary['unchanged'], 0)
+        self.csvfile.refresh_from_db()
+        self.assertEqual(len(self.csvfile.chunk_digests), 1)
+
+    def test_identical_reingest_changes_nothing(self):
+        """Test that re-ingesting the same rows keeps the images"""
+        self.stream(self.rows)
+        ids = list(Image.objects.values_list('id', flat=True))
+
+        summary = self.stream(self.rows)
+
+        self.assertEqual(
+            {key: summary[key] for key in
+             ('rows', 'inserted', 'updated', 'deleted', 'unchanged')},
+            {'rows': 3, 'inserted': 0, 'updated': 0, 'deleted': 0,
+             'unchanged': 3}
+        )
+        self.assertEqual(list(Image.objects.values_list('id', flat=True)),
+                         ids)
+
+    def test_reingest_updates_changed_rows(self):
+        """Test that a relabelled and an appended row are applied"""
+        self.stream(self.rows)
+        fixed = Image.objects.get(csvfile=self.csvfile, row=2)
+
+        summary = self.stream(
+            self.rows[:2] + [b"dog,1,2,3,4", b"cat,9,9,9,9"]
+        )
+
+        self.assertEqual(summary['updated'], 1)
+        self.assertEqual(summary['inserted'], 1)
+        self.assertEqual(summary['unchanged'], 2)
+        fixed.refresh_from_db()
+        self.assertEqual(fixed.label, self.dog)
+        self.assertEqual(Image.objects.filter(csvfile=self.csvfile).count(),
+                         4)
+
+    def test_reingest_deletes_removed_rows(self):
+        """Test that rows missing from the new upload are deleted"""
+        self.stream(self.rows)
+
+        summary = self.stream(self.rows[:1])
+
+        self.assertEqual(summary['deleted'], 2)
+        self.assertEqual(
+            list(Image.objects.filter(csvfile=self.csvfile)
+                 .values_list('row', flat=True)),
+            [0]
+        )
+
+    def test_empty_body_rejected(self):
+        """Test that a body without a length leaves the images alone"""
+        self.stream(self.rows)
+        jobs = IngestJob.objects.count()
+
+        res = self.client.generic('PUT', stream_url(self.csvfile.id), b'',
+                                  content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_411_LENGTH_REQUIRED)
+        self.assertEqual(IngestJob.objects.count(), jobs)
+        self.assertEqual(Image.objects.filter(csvfile=self.csvfile).count(),
+                         3)
+
+    def test_empty_csv_keeps_images(self):
+        """Test that a csv without rows does not replace the images"""
+        self.stream(self.rows)
+
+        res = self.client.generic('PUT', stream_url(self.csvfile.id),
+                                  b"label,p0,p1,p2,p3\n",
+                                  content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('no rows', res.data['errors'])
+        self.assertEqual(Image.objects.filter(csvfile=self.csvfile).count(),
+                         3)
+
+    def test_empty_csv_allowed(self):
+        """Test that an empty csv clears the images when asked to"""
+        self.stream(self.rows)
+        url = stream_url(self.csvfile.id) + '?allow_empty=1'
+
+        res = self.client.generic('PUT', url, b"label,p0,p1,p2,p3\n",
+                                  content_type='text/csv')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['summary']['deleted'], 3)
+        self.assertFalse(Image.objects.filter(csvfile=self.csvfile).exists())
+
+    def test_rows_are_unique(self):
+        """Test that a csvfile row is stored as one image only"""
+        self.stream(self.rows)
+        image = Image.objects.get(csvfile=self.csvfile, row=0)
+        image.pk = None
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            image.save()
+
+    def test_ingest_reads_digests_of_concurrent_ingest(self):
+        """Test that the diff starts from what the last ingest stored"""
+        stale = Csvfile.objects.defer(None).get(id=self.csvfile.id)
+        self.stream(self.rows)
+        self.csvfile.refresh_from_db()
+
+        with mock.patch('dataset.ingest.diff_images') as diff:
+            summary = ingest.create_images(
+                stale, np.array(['cat', 'dog', 'cat']),
+                np.array([[[0, 34], [154, 29]], [[0, 83], [204, 93]],
+                          [[1, 2], [3, 4]]], dtype=np.uint8)
+            )
+
+        diff.assert_not_called()
+        self.assertEqual(summary['unchanged'], 3)
+        self.assertEqual(stale.img_arrays.name, self.csvfile.img_arrays.name)
+
+    @mock.patch('dataset.ingest.DIFF_CHUNK_ROWS', 2)
+    def test_unchanged_chunks_are_skipped(self):
+        """Test that rows of unchanged chunks are not looked up"""
+        self.stream(self.rows)
+
+        with mock.patch('dataset.ingest.diff_images',
+                        wraps=ingest.diff_images) as diff:
+            self.stream(self.rows[:2] + [b"dog,1,2,3,4"])
+
+        diff.assert_called_once()
+        self.assertEqual(diff.call_args.args[3:], (2, 3))
@@ -1,3 +1,5 @@
+import numpy as np
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
@@ -5,7 +7,10 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Dataset
+from core.models import Csvfile, Dataset, Label
+from core.tests.queries import QueryCountMixin
+
+from dataset import ingest
 
 from dataset.serializers import DatasetSerializer
 
@@ -13,6 +18,16 @@ from dataset.serializers import DatasetSerializer
 DATASETS_URL = reverse('dataset:dataset-list')
 
 
+def members_url(dataset_id):
+    """Return dataset members URL"""
+    return reverse('dataset:dataset-members', args=[dataset_id])
+
+
+def detail_url(dataset_id):
+    """Return dataset detail URL"""
+    return reverse('dataset:dataset-detail', args=[dataset_id])
+
+
 class PublicDatasetsApiTests(TestCase):
     """Test the publicly available datasets API"""
 
@@ -26,7 +41,7 @@ class PublicDatasetsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateDatasetsApiTests(TestCase):
+class PrivateDatasetsApiTests(QueryCountMixin, TestCase):
     """Test the authorized user datasets API"""
 
     def setUp(self):
@@ -81,3 +96,126 @@ class PrivateDatasetsApiTests(TestCase):
         res = self.client.post(DATASETS_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_dataset_detail(self):
+        """Test retrieving a dataset with its nested objects"""
+        label = Label.objects.create(user=self.user, name='cat')
+        csvfile = Csvfile.objects.create(user=self.user, name='train',
+                                         labelcol=0, imgcolstart=1,
+                                         imgcolend=4)
+        dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        dataset.labels.add(label)
+        dataset.csvfiles.add(csvfile)
+        Label.objects.create(user=self.user, name='dog')
+        pixels = np.array([1, 2, 1, 3, 3], dtype=np.uint8).reshape(5, 1, 1)
+        ingest.create_images(csvfile, ['cat', 'cat', 'cat', 'dog', 'dog'],
+                             pixels)
+        self.addCleanup(csvfile.img_arrays.delete)
+        self.addCleanup(csvfile.label_array.delete)
+
+        res = self.client.get(detail_url(dataset.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['labels'][0]['name'], 'cat')
+        self.assertEqual(res.data['csvfiles'][0]['name'], 'train')
+        self.assertEqual(res.data['duplicates'], 1)
+        self.assertEqual(res.data['stats']['rows'], 3)
+
+    def test_dataset_duplicates_across_csvfiles(self):
+        """Test counting images repeating those of another csvfile"""
+        label = Label.objects.create(user=self.user, name='cat')
+        dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        dataset.labels.add(label)
+        pixels = np.array([1, 2], dtype=np.uint8).reshape(2, 1, 1)
+        for name in ('train', 'test'):
+            csvfile = Csvfile.objects.create(user=self.user, name=name,
+                                             labelcol=0, imgcolstart=1,
+                                             imgcolend=1)
+            ingest.create_images(csvfile, ['cat', 'cat'], pixels)
+            self.addCleanup(csvfile.img_arrays.delete)
+            self.addCleanup(csvfile.label_array.delete)
+            dataset.csvfiles.add(csvfile)
+
+        res = self.client.get(detail_url(dataset.id))
+        self.assertEqual(res.data['duplicates'], 2)
+
+        train = Csvfile.objects.get(name='train')
+        ingest.create_images(train, ['cat', 'cat'], pixels + 10)
+
+        res = self.client.get(detail_url(dataset.id))
+        self.assertEqual(res.data['duplicates'], 0)
+
+    def test_list_datasets_constant_queries(self):
+        """Test that listing datasets does not query per dataset"""
+        def grow(size):
+            while Dataset.objects.filter(user=self.user).count() < size:
+                dataset = Dataset.objects.create(user=self.user, name='ds')
+                dataset.labels.add(
+                    Label.objects.create(user=self.user, name='cat')
+                )
+                dataset.csvfiles.add(Csvfile.objects.create(
+                    user=self.user, name='train', labelcol=0,
+                    imgcolstart=1, imgcolend=4
+                ))
+
+        self.assertConstantQueries(DATASETS_URL, grow, num=4)
+
+    def test_retrieve_dataset_constant_queries(self):
+        """Test that dataset detail does not query per related object"""
+        dataset = Dataset.objects.create(user=self.user, name='MNIST')
+
+        def grow(size):
+            while dataset.labels.count() < size:
+                dataset.labels.add(
+                    Label.objects.create(user=self.user, name='cat')
+                )
+                dataset.csvfiles.add(Csvfile.objects.create(
+                    user=self.user, name='train', labelcol=0,
+                    imgcolstart=1, imgcolend=4
+                ))
+
+        self.assertConstantQueries(detail_url(dataset.id), grow)
+
+    def test_dataset_members(self):
+        """Test adding and removing labels and csvfiles in bulk"""
+        dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        labels = [
+            Label.objects.create(user=self.user, name=str(i))
+            for i in range(3)
+        ]
+        csvfile = Csvfile.objects.create(user=self.user, name='train',
+                                         labelcol=0, imgcolstart=1,
+                                         imgcolend=4)
+        dataset.labels.add(labels[0])
+        payload = {
+            'add_labels': [labels[1].id, labels[2].id],
+            'remove_labels': [labels[0].id],
+            'add_csvfiles': [csvfile.id],
+        }
+        res = self.client.post(members_url(dataset.id), payload,
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'labels': {'added': 2, 'removed': 1, 'total': 2},
+            'csvfiles': {'added': 1, 'removed': 0, 'total': 1},
+        })
+        self.assertEqual(
+            set(dataset.labels.values_list('id', flat=True)),
+            {labels[1].id, labels[2].id}
+        )
+        self.assertEqual(list(dataset.csvfiles.all()), [csvfile])
+
+    def test_dataset_members_other_user(self):
+        """Test that labels of another user cannot be added"""
+        user2 = get_user_model().objects.create_user(
+            'other@me.com',
+            'testpass'
+        )
+        label = Label.objects.create(user=user2, name='bird')
+        dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        res = self.client.post(members_url(dataset.id),
+                               {'add_labels': [label.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(dataset.labels.exists())
@@ -0,0 +1,161 @@
+import io
+import struct
+import unittest
+import zipfile
+from unittest import mock
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Dataset, Label
+
+from dataset import export, materialize
+from dataset.tests.test_store import sample_csvfile
+
+
+def export_url(dataset_id, fmt=None):
+    """Return URL for exporting a dataset"""
+    url = reverse('dataset:dataset-export', args=[dataset_id])
+
+    return f'{url}?format={fmt}' if fmt else url
+
+
+@mock.patch('dataset.export.EXPORT_CHUNK_ROWS', 2)
+class DatasetExportApiTests(TestCase):
+    """Test streaming a whole dataset in one request"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.cat = Label.objects.create(user=self.user, name='cat')
+        self.dog = Label.objects.create(user=self.user, name='dog')
+        bird = Label.objects.create(user=self.user, name='bird')
+        self.csvfiles = [
+            sample_csvfile(self.user, 'train',
+                           np.arange(12, dtype=np.uint8).reshape(3, 2, 2),
+                           [self.cat.id, bird.id, self.dog.id]),
+            sample_csvfile(self.user, 'val',
+                           np.arange(100, 112, dtype=np.uint8).reshape(
+                               3, 2, 2),
+                           [self.dog.id, self.dog.id, self.cat.id]),
+        ]
+        self.dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        self.dataset.csvfiles.add(*self.csvfiles)
+        self.dataset.labels.add(self.cat, self.dog)
+        self.pixels = np.concatenate([
+            np.arange(12, dtype=np.uint8).reshape(3, 2, 2)[[0, 2]],
+            np.arange(100, 112, dtype=np.uint8).reshape(3, 2, 2),
+        ])
+        self.targets = [0, 1, 1, 1, 0]
+
+    def tearDown(self):
+        for csvfile in self.csvfiles:
+            csvfile.img_arrays.delete()
+            csvfile.label_array.delete()
+
+    def download(self, fmt=None):
+        res = self.client.get(export_url(self.dataset.id, fmt))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+
+        return res, b''.join(res.streaming_content)
+
+    def test_export_npz(self):
+        """Test that the default export is a loadable npz"""
+        res, body = self.download()
+
+        self.assertEqual(res['Content-Type'], 'application/x-npz')
+        self.assertIn('mnist.npz', res['Content-Disposition'])
+        with np.load(io.BytesIO(body)) as data:
+            np.testing.assert_array_equal(data['images'], self.pixels)
+            self.assertEqual(data['labels'].tolist(), self.targets)
+            self.assertEqual(data['classes'].tolist(), ['cat', 'dog'])
+
+    def test_export_npy(self):
+        """Test exporting one structured array of records"""
+        _, body = self.download('npy')
+
+        records = np.load(io.BytesIO(body))
+        np.testing.assert_array_equal(records['image'], self.pixels)
+        self.assertEqual(records['label'].tolist(),
+                         ['cat', 'dog', 'dog', 'dog', 'cat'])
+
+    def test_export_idx(self):
+        """Test exporting MNIST style idx files in a zip"""
+        res, body = self.download('idx')
+
+        self.assertEqual(res['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            images = archive.read('images-idx3-ubyte')
+            labels = archive.read('labels-idx1-ubyte')
+            classes = archive.read('classes.txt').decode().split()
+        self.assertEqual(struct.unpack('>IIII', images[:16]),
+                         (export.IDX_IMAGES, 5, 2, 2))
+        np.testing.assert_array_equal(
+            np.frombuffer(images[16:], dtype=np.uint8).reshape(5, 2, 2),
+            self.pixels
+        )
+        self.assertEqual(list(labels[8:]), self.targets)
+        self.assertEqual(classes, ['cat', 'dog'])
+
+    @unittest.skipIf(export.pyarrow is None, 'pyarrow is not installed')
+    def test_export_parquet(self):
+        """Test exporting a parquet file"""
+        _, body = self.download('parquet')
+
+        table = export.pyarrow.parquet.read_table(
+            export.pyarrow.BufferReader(body)
+        )
+        self.assertEqual(table.column('label').to_pylist(),
+                         ['cat', 'dog', 'dog', 'dog', 'cat'])
+        self.assertEqual(table.column('image').to_pylist()[0],
+                         self.pixels[0].tobytes())
+
+    @unittest.skipIf(export.pyarrow is not None, 'pyarrow is installed')
+    def test_export_parquet_unavailable(self):
+        """Test that parquet export reports the missing dependency"""
+        res = self.client.get(export_url(self.dataset.id, 'parquet'))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_split(self):
+        """Test exporting one split of the materialized index"""
+        materialize.materialize(self.dataset, {'train': 0.6, 'test': 0.4},
+                                shuffle=False)
+
+        res, body = self.download('npz&split=test')
+
+        self.assertIn('mnist-test.npz', res['Content-Disposition'])
+        with np.load(io.BytesIO(body)) as data:
+            self.assertEqual(data['labels'].tolist(), [1, 0])
+        self.dataset.refresh_from_db()
+        self.dataset.index.delete()
+
+    def test_export_unknown_split(self):
+        """Test that a split missing from the index is rejected"""
+        res = self.client.get(export_url(self.dataset.id, 'npz') +
+                              '&split=val')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_other_user_dataset(self):
+        """Test that datasets of other users cannot be exported"""
+        user2 = get_user_model().objects.create_user(
+            'other@me.com',
+            'testpass'
+        )
+        dataset = Dataset.objects.create(user=user2, name='private')
+
+        res = self.client.get(export_url(dataset.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,16 +1,49 @@
+import io
+import json
+import unittest
+
+import numpy as np
+from PIL import Image as Img
+
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from core.models import Image, Label, Csvfile
+from core.models import Image, Label, Csvfile, Dataset
+from core.tests.queries import QueryCountMixin
 
+from dataset import store
+from dataset.renderers import (
+    MessagePackRenderer, ORJSONRenderer, msgpack
+)
 from dataset.serializers import ImageSerializer
 
 
 IMAGES_URL = reverse('dataset:image-list')
+RENDER_BATCH_URL = reverse('dataset:image-render-batch')
+RELABEL_URL = reverse('dataset:image-relabel')
+DELETE_URL = reverse('dataset:image-delete')
+
+
+def render_url(image_id):
+    """Return URL for rendering an image"""
+    return reverse('dataset:image-render', args=[image_id])
+
+
+def detail_url(image_id):
+    """Return URL for image detail"""
+    return reverse('dataset:image-detail', args=[image_id])
+
+
+def decode(res):
+    """Decode a rendered image response into pixels"""
+    return np.asarray(Img.open(io.BytesIO(res.content)))
 
 
 class PublicImagesApiTests(TestCase):
@@ -26,7 +59,7 @@ class PublicImagesApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateImagesApiTests(TestCase):
+class PrivateImagesApiTests(QueryCountMixin, TestCase):
     """Test the authorized user images API"""
 
     def setUp(self):
@@ -61,10 +94,10 @@ class PrivateImagesApiTests(TestCase):
 
         res = self.client.get(IMAGES_URL)
 
-        images = Image.objects.all().order_by('-name')
+        images = Image.objects.all().order_by('-id')
         serializer = ImageSerializer(images, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_images_limited_to_user(self):
         """Test that images returned are for the authenticated user"""
@@ -88,5 +121,423 @@ class PrivateImagesApiTests(TestCase):
         res = self.client.get(IMAGES_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], image.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], image.name)
+
+    def sample_images(self, count, csvfile=None, label=None):
+        """Create images for the authenticated user after the last row"""
+        csvfile = csvfile or self.csvfile
+        first = Image.objects.filter(csvfile=csvfile).count()
+        return [
+            Image.objects.create(user=self.user,
+                                 name=f'image_{i}',
+                                 csvfile=csvfile,
+                                 row=first + i,
+                                 label=label or self.label
+                                 )
+            for i in range(count)
+        ]
+
+    def test_images_cursor_pagination(self):
+        """Test paging through images with a cursor"""
+        images = self.sample_images(5)
+
+        res1 = self.client.get(IMAGES_URL, {'page_size': 3})
+        res2 = self.client.get(res1.data['next'])
+
+        ids = [img['id'] for img in res1.data['results']]
+        ids += [img['id'] for img in res2.data['results']]
+        self.assertEqual(ids, sorted((img.id for img in images), reverse=True))
+        self.assertIsNone(res2.data['next'])
+
+    def test_images_fields_projection(self):
+        """Test returning only the requested fields"""
+        self.sample_images(2)
+
+        res = self.client.get(IMAGES_URL, {'fields': 'id,row'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data['results'][0]), {'id', 'row'})
+
+    def test_images_unknown_field(self):
+        """Test that projecting an unknown field fails"""
+        res = self.client.get(IMAGES_URL, {'fields': 'id,pixels'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_images(self):
+        """Test filtering images by csvfile, label and dataset"""
+        dog = Label.objects.create(user=self.user, name='dog')
+        csvfile2 = Csvfile.objects.create(user=self.user,
+                                          name='MNIST_val',
+                                          labelcol=0,
+                                          imgcolstart=1,
+                                          imgcolend=16
+                                          )
+        cats = self.sample_images(2)
+        dogs = self.sample_images(1, label=dog)
+        others = self.sample_images(1, csvfile=csvfile2)
+        dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        dataset.csvfiles.add(self.csvfile)
+        dataset.labels.add(self.label)
+
+        def ids(params):
+            res = self.client.get(IMAGES_URL, params)
+            return {img['id'] for img in res.data['results']}
+
+        self.assertEqual(ids({'label': dog.id}), {dogs[0].id})
+        self.assertEqual(ids({'csvfile': csvfile2.id}), {others[0].id})
+        self.assertEqual(ids({'dataset': dataset.id}),
+                         {img.id for img in cats})
+
+    def test_lean_images_match_serializer(self):
+        """Test that lean listing returns the serializer output"""
+        self.sample_images(5)
+
+        full = self.client.get(IMAGES_URL, {'page_size': 3})
+        lean = self.client.get(IMAGES_URL, {'page_size': 3, 'lean': 1})
+
+        self.assertEqual(lean.status_code, status.HTTP_200_OK)
+        self.assertEqual(lean.data['results'], full.data['results'])
+        self.assertIn(full.data['next'].split('?')[1].split('&')[0],
+                      lean.data['next'])
+
+    def test_lean_images_projection(self):
+        """Test lean listing of fields without the id"""
+        self.sample_images(3)
+
+        res = self.client.get(IMAGES_URL, {'lean': 1, 'fields': 'row',
+                                           'page_size': 2})
+        rest = self.client.get(res.data['next'])
+
+        self.assertEqual(res.data['results'], [{'row': 2}, {'row': 1}])
+        self.assertEqual(rest.data['results'], [{'row': 0}])
+
+    def test_lean_images_unknown_field(self):
+        """Test that lean listing rejects unknown fields"""
+        res = self.client.get(IMAGES_URL, {'lean': 1, 'fields': 'pixels'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @unittest.skipUnless(ORJSONRenderer.available, 'orjson is not installed')
+    def test_images_rendered_with_orjson(self):
+        """Test that json responses are encoded with orjson"""
+        self.sample_images(2)
+
+        res = self.client.get(IMAGES_URL, {'lean': 1})
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertIsInstance(res.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(json.loads(res.content)['results'],
+                         res.data['results'])
+
+    def test_images_rendered_with_drf_json(self):
+        """Test that orjson is only used by the lean listing"""
+        self.sample_images(2)
+
+        res = self.client.get(IMAGES_URL)
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertIs(type(res.accepted_renderer), JSONRenderer)
+
+    @unittest.skipUnless(MessagePackRenderer.available,
+                         'msgpack is not installed')
+    def test_images_rendered_with_msgpack(self):
+        """Test that msgpack is chosen by the Accept header"""
+        self.sample_images(2)
+
+        res = self.client.get(IMAGES_URL, {'lean': 1},
+                              HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content)['results'],
+                         res.data['results'])
+
+    def grow_images(self, size):
+        """Add images with their own csvfile and label up to size"""
+        while Image.objects.filter(user=self.user).count() < size:
+            row = Image.objects.count()
+            Image.objects.create(
+                user=self.user, name=f'image_{row}', row=row,
+                csvfile=Csvfile.objects.create(
+                    user=self.user, name=f'csv_{row}', labelcol=0,
+                    imgcolstart=1, imgcolend=16
+                ),
+                label=Label.objects.create(user=self.user, name=f'{row}')
+            )
+
+    def test_list_images_constant_queries(self):
+        """Test that listing images does not query per image"""
+        self.assertConstantQueries(IMAGES_URL, self.grow_images, num=1)
+
+    def test_retrieve_image_detail(self):
+        """Test retrieving an image with its csvfile and label"""
+        self.grow_images(1)
+        image = Image.objects.get(user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(detail_url(image.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['csvfile']['name'], image.csvfile.name)
+        self.assertEqual(res.data['label']['name'], image.label.name)
+        self.assertNotIn('"stats"', queries[-1]['sql'])
+        self.assertConstantQueries(detail_url(image.id), self.grow_images,
+                                   num=1)
+
+
+class RenderImagesApiTests(TestCase):
+    """Test rendering images from the tensor store"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'psswd123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.label = Label.objects.create(user=self.user, name='cat')
+        self.csvfile = Csvfile.objects.create(user=self.user,
+                                              name='MNIST_train',
+                                              labelcol=0,
+                                              imgcolstart=1,
+                                              imgcolend=4
+                                              )
+        self.pixels = np.arange(12, dtype=np.uint8).reshape(3, 2, 2)
+        store.write_store(self.csvfile, self.pixels, [self.label.id] * 3)
+        self.images = [
+            Image.objects.create(user=self.user,
+                                 name=f'{self.csvfile.id}_{i}',
+                                 csvfile=self.csvfile,
+                                 row=i,
+                                 label=self.label
+                                 )
+            for i in range(3)
+        ]
+
+    def tearDown(self):
+        self.csvfile.img_arrays.delete()
+        self.csvfile.label_array.delete()
+
+    def test_render_png(self):
+        """Test rendering an image as png with caching headers"""
+        res = self.client.get(render_url(self.images[1].id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertIn('ETag', res)
+        self.assertIn('no-cache', res['Cache-Control'])
+        self.assertNotIn('max-age', res['Cache-Control'])
+        np.testing.assert_array_equal(decode(res), self.pixels[1])
+
+    def test_render_bmp_scaled(self):
+        """Test rendering a scaled bmp"""
+        res = self.client.get(
+            render_url(self.images[2].id), {'format': 'bmp', 'scale': 2}
+        )
+
+        self.assertEqual(res['Content-Type'], 'image/bmp')
+        pixels = decode(res)
+        self.assertEqual(pixels.shape, (4, 4))
+        self.assertEqual(pixels[3, 3], self.pixels[2, 1, 1])
+
+    def test_render_not_modified(self):
+        """Test that a matching If-None-Match answers 304"""
+        url = render_url(self.images[0].id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_render_after_reingest(self):
+        """Test that new pixels of a kept image change its ETag"""
+        url = render_url(self.images[0].id)
+        etag = self.client.get(url)['ETag']
+        previous = self.csvfile.img_arrays.name
+        store.write_store(self.csvfile, self.pixels + 1,
+                          [self.label.id] * 3)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        np.testing.assert_array_equal(decode(res), self.pixels[0] + 1)
+        self.csvfile.img_arrays.storage.delete(previous)
+
+    def test_render_batch_sprite(self):
+        """Test rendering several images as one sprite sheet"""
+        ids = [self.images[2].id, self.images[0].id, self.images[1].id]
+
+        res = self.client.get(
+            RENDER_BATCH_URL, {'ids': ','.join(map(str, ids)), 'cols': 2}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        sheet = decode(res)
+        self.assertEqual(sheet.shape, (4, 4))
+        np.testing.assert_array_equal(sheet[:2, :2], self.pixels[2])
+        np.testing.assert_array_equal(sheet[:2, 2:], self.pixels[0])
+        np.testing.assert_array_equal(sheet[2:, :2], self.pixels[1])
+        np.testing.assert_array_equal(sheet[2:, 2:], 0)
+
+    def test_render_without_store(self):
+        """Test rendering images whose csvfile has no stored pixels"""
+        legacy = Csvfile.objects.create(user=self.user, name='legacy',
+                                        labelcol=0, imgcolstart=1,
+                                        imgcolend=4)
+        image = Image.objects.create(user=self.user, name='legacy_0',
+                                     csvfile=legacy, row=0,
+                                     label=self.label)
+
+        res = self.client.get(render_url(image.id))
+        batch = self.client.get(
+            RENDER_BATCH_URL, {'ids': f'{self.images[0].id},{image.id}'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(batch.status_code, status.HTTP_409_CONFLICT)
+
+    def test_render_batch_other_user(self):
+        """Test that images of other users are not rendered"""
+        user2 = get_user_model().objects.create_user(
+            'other@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(user2)
+
+        res = self.client.get(
+            RENDER_BATCH_URL, {'ids': str(self.images[0].id)}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkImagesApiTests(TestCase):
+    """Test relabeling and deleting images in bulk"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'psswd123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.cat = Label.objects.create(user=self.user, name='cat')
+        self.dog = Label.objects.create(user=self.user, name='dog')
+        self.csvfile = Csvfile.objects.create(user=self.user,
+                                              name='MNIST_train',
+                                              labelcol=0,
+                                              imgcolstart=1,
+                                              imgcolend=4
+                                              )
+        pixels = np.arange(16, dtype=np.uint8).reshape(4, 2, 2)
+        store.write_store(self.csvfile, pixels, [self.cat.id] * 4)
+        self.images = [
+            Image.objects.create(user=self.user,
+                                 name=f'{self.csvfile.id}_{i}',
+                                 csvfile=self.csvfile,
+                                 row=i,
+                                 label=self.cat
+                                 )
+            for i in range(4)
+        ]
+        self.dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        self.dataset.labels.add(self.cat, self.dog)
+        self.dataset.csvfiles.add(self.csvfile)
+
+    def tearDown(self):
+        self.csvfile.img_arrays.delete()
+        self.csvfile.label_array.delete()
+
+    def stored_labels(self):
+        self.csvfile.refresh_from_db()
+        return store.load_label_ids(self.csvfile).tolist()
+
+    def test_relabel_images_by_id(self):
+        """Test relabeling images by id updates rows and store"""
+        version = Dataset.objects.get(id=self.dataset.id).version
+        ids = [self.images[1].id, self.images[3].id]
+        with self.assertNumQueries(10):
+            res = self.client.post(
+                RELABEL_URL, {'ids': ids, 'label': self.dog.id},
+                format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'selected': 2, 'relabeled': 2})
+        self.assertEqual(
+            Image.objects.filter(label=self.dog).count(), 2
+        )
+        self.assertEqual(
+            self.stored_labels(),
+            [self.cat.id, self.dog.id, self.cat.id, self.dog.id]
+        )
+        self.assertEqual(self.csvfile.stats['labels'][str(self.dog.id)]
+                         ['rows'], 2)
+        self.assertEqual(Dataset.objects.get(id=self.dataset.id).version,
+                         version + 1)
+
+    def test_relabel_images_by_filter(self):
+        """Test relabeling every image matching the query filters"""
+        res = self.client.post(
+            f'{RELABEL_URL}?csvfile={self.csvfile.id}',
+            {'label': self.dog.id}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'selected': 4, 'relabeled': 4})
+        self.assertEqual(self.stored_labels(), [self.dog.id] * 4)
+
+    def test_relabel_needs_ids_or_filter(self):
+        """Test that relabeling every image needs an explicit filter"""
+        res = self.client.post(RELABEL_URL, {'label': self.dog.id},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Image.objects.filter(label=self.dog).count(), 0)
+
+    def test_relabel_other_users_label(self):
+        """Test that images cannot get the label of another user"""
+        user2 = get_user_model().objects.create_user(
+            'other@me.com',
+            'testpass'
+        )
+        label = Label.objects.create(user=user2, name='bird')
+        res = self.client.post(
+            RELABEL_URL, {'ids': [self.images[0].id], 'label': label.id},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delete_images(self):
+        """Test deleting images keeps the store rows aligned"""
+        ids = [self.images[0].id, self.images[2].id]
+        res = self.client.post(DELETE_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'deleted': 2})
+        self.assertFalse(Image.objects.filter(id__in=ids).exists())
+        self.assertEqual(
+            self.stored_labels(),
+            [store.DELETED_LABEL, self.cat.id, store.DELETED_LABEL,
+             self.cat.id]
+        )
+        _, indices, _, _ = store.dataset_rows(self.dataset)
+        self.assertEqual(indices.tolist(), [1, 3])
+
+    def test_delete_images_limited_to_user(self):
+        """Test that images of another user are not deleted"""
+        user2 = get_user_model().objects.create_user(
+            'other@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(user2)
+        res = self.client.post(
+            DELETE_URL, {'ids': [self.images[0].id]}, format='json'
+        )
+
+        self.assertEqual(res.data, {'deleted': 0})
+        self.assertTrue(Image.objects.filter(id=self.images[0].id).exists())
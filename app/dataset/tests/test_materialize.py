@@ -0,0 +1,142 @@
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Dataset, Label
+
+from dataset import materialize
+from dataset.tests.test_store import sample_csvfile
+
+
+def materialize_url(dataset_id):
+    """Return URL for materializing a dataset"""
+    return reverse('dataset:dataset-materialize', args=[dataset_id])
+
+
+class StratifiedSplitTests(TestCase):
+
+    def test_split_keeps_class_shares(self):
+        """Test that every split holds the share of every class"""
+        indices = np.arange(100)
+        targets = np.repeat([0, 1], [80, 20])
+
+        splits = materialize.stratified_split(
+            indices, targets, {'train': 0.5, 'val': 0.25, 'test': 0.25},
+            seed=3
+        )
+
+        self.assertEqual(np.bincount(targets[splits['train']]).tolist(),
+                         [40, 10])
+        self.assertEqual(np.bincount(targets[splits['test']]).tolist(),
+                         [20, 5])
+        self.assertEqual(
+            sorted(np.concatenate(list(splits.values())).tolist()),
+            indices.tolist()
+        )
+
+    def test_split_is_reproducible(self):
+        """Test that a seed always gives the same splits"""
+        indices = np.arange(50)
+        targets = indices % 3
+        fractions = {'train': 0.8, 'val': 0.2}
+
+        first = materialize.stratified_split(indices, targets, fractions, 7)
+        second = materialize.stratified_split(indices, targets, fractions, 7)
+
+        for name in fractions:
+            np.testing.assert_array_equal(first[name], second[name])
+
+    def test_split_without_shuffle(self):
+        """Test that unshuffled splits keep the order of the rows"""
+        splits = materialize.stratified_split(
+            np.arange(10), np.zeros(10, dtype=int), {'train': 1},
+            shuffle=False
+        )
+
+        self.assertEqual(splits['train'].tolist(), list(range(10)))
+
+
+class MaterializeApiTests(TestCase):
+    """Test building and invalidating the row index of a dataset"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.cat = Label.objects.create(user=self.user, name='cat')
+        self.dog = Label.objects.create(user=self.user, name='dog')
+        self.csvfile = sample_csvfile(
+            self.user, 'train', np.zeros((10, 2, 2), dtype=np.uint8),
+            [self.cat.id, self.dog.id] * 5
+        )
+        self.dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        self.dataset.csvfiles.add(self.csvfile)
+        self.dataset.labels.add(self.cat, self.dog)
+
+    def tearDown(self):
+        self.csvfile.img_arrays.delete()
+        self.csvfile.label_array.delete()
+        self.dataset.refresh_from_db()
+        if self.dataset.index:
+            self.dataset.index.delete()
+
+    def test_materialize_splits(self):
+        """Test materializing a dataset into weighted splits"""
+        res = self.client.post(materialize_url(self.dataset.id),
+                               {'train': 3, 'val': 1, 'test': 1, 'seed': 1})
+
+        self.dataset.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['rows'], {'train': 6, 'val': 2, 'test': 2})
+        self.assertTrue(materialize.is_fresh(self.dataset))
+        view, rows, classes, targets = materialize.split_rows(self.dataset,
+                                                              'val')
+        self.assertEqual(sorted(targets.tolist()), [0, 1])
+        self.assertEqual(classes.tolist(), [self.cat.id, self.dog.id])
+
+    def test_materialize_invalid_splits(self):
+        """Test that splits without any weight are rejected"""
+        res = self.client.post(materialize_url(self.dataset.id),
+                               {'train': 0})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_relinking_makes_index_stale(self):
+        """Test that changing labels or csvfiles invalidates the index"""
+        self.client.post(materialize_url(self.dataset.id), {})
+        self.dataset.refresh_from_db()
+
+        self.dataset.labels.remove(self.dog)
+
+        self.assertFalse(materialize.is_fresh(self.dataset))
+        self.assertIsNone(materialize.split_rows(self.dataset, 'train'))
+
+    def test_reverse_relinking_makes_index_stale(self):
+        """Test that unlinking from the csvfile side invalidates it"""
+        self.client.post(materialize_url(self.dataset.id), {})
+        self.dataset.refresh_from_db()
+
+        self.csvfile.dataset_set.clear()
+
+        self.assertFalse(materialize.is_fresh(self.dataset))
+
+    def test_detail_reports_materialized(self):
+        """Test that dataset detail shows the fresh index only"""
+        url = reverse('dataset:dataset-detail', args=[self.dataset.id])
+        self.client.post(materialize_url(self.dataset.id), {'seed': 5})
+
+        res = self.client.get(url)
+        self.assertEqual(res.data['materialized']['seed'], 5)
+
+        self.dataset.labels.add(Label.objects.create(user=self.user,
+                                                     name='bird'))
+        res = self.client.get(url)
+        self.assertIsNone(res.data['materialized'])
@@ -0,0 +1,75 @@
+import os
+import tempfile
+
+import numpy as np
+
+from django.test import SimpleTestCase
+
+from core.models import Csvfile
+
+from dataset import ingest, parsing
+
+
+class ShardedParsingTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 256, (50, 2, 2)).astype(np.uint8)
+        self.names = [f'label{i % 3}' for i in range(50)]
+        lines = ['label,p0,p1,p2,p3']
+        for name, pixels in zip(self.names, self.pixels):
+            lines.append(','.join([name] + [str(p) for p in pixels.ravel()]))
+            if len(lines) % 7 == 0:
+                lines.append('')
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write('\r\n'.join(lines))
+        self.csvfile = Csvfile(labelcol=0, imgcolstart=1, imgcolend=4)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_shard_ranges_aligned_to_lines(self):
+        """Test that shards cover the rows once and start on lines"""
+        ranges = parsing.shard_ranges(self.path, 4)
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(data[start - 1:start], b'\n')
+        self.assertEqual(
+            sum(parsing.count_rows(self.path, *r) for r in ranges), 50
+        )
+
+    def check_sharded(self, workers):
+        rows = []
+        names, pixels = ingest.read_csv_sharded(
+            self.csvfile, self.path, workers, progress=rows.append
+        )
+
+        self.assertEqual(names.tolist(), self.names)
+        np.testing.assert_array_equal(pixels, self.pixels)
+        self.assertEqual(rows[-1], 50)
+
+    def test_read_sharded_inline(self):
+        """Test parsing shards in the current process"""
+        self.check_sharded(1)
+
+    def test_read_sharded_processes(self):
+        """Test parsing shards on a process pool"""
+        self.check_sharded(3)
+
+
+class ParseLinesTests(SimpleTestCase):
+
+    def test_quoted_fields(self):
+        """Test that quoted labels and pixels are unquoted"""
+        lines = ['"cat","0","34","1","5"', 'dog,255,2,"3",4']
+        names, pixels = parsing.parse_lines(lines, 0, 1, 5, 2)
+        self.assertEqual(names.tolist(), ['cat', 'dog'])
+        self.assertEqual(
+            pixels.tolist(), [[[0, 34], [1, 5]], [[255, 2], [3, 4]]]
+        )
@@ -0,0 +1,220 @@
+from unittest import mock
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.test import TestCase
+
+from core.models import Csvfile, Dataset, Image, Label
+
+from dataset import ingest, store
+
+
+def sample_csvfile(user, name, pixels, label_ids):
+    """Create a csvfile with a tensor store"""
+    csvfile = Csvfile.objects.create(user=user,
+                                     name=name,
+                                     labelcol=0,
+                                     imgcolstart=1,
+                                     imgcolend=4
+                                     )
+    store.write_store(csvfile, pixels, label_ids)
+
+    return csvfile
+
+
+class DatasetTensorViewTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'testpass'
+        )
+        self.cat = Label.objects.create(user=self.user, name='cat')
+        self.dog = Label.objects.create(user=self.user, name='dog')
+        self.pixels1 = np.arange(12, dtype=np.uint8).reshape(3, 2, 2)
+        self.pixels2 = np.arange(100, 108, dtype=np.uint8).reshape(2, 2, 2)
+        self.csvfile1 = sample_csvfile(
+            self.user, 'train', self.pixels1,
+            [self.cat.id, self.dog.id, self.cat.id]
+        )
+        self.csvfile2 = sample_csvfile(
+            self.user, 'val', self.pixels2, [self.dog.id, self.dog.id]
+        )
+        self.dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        self.dataset.csvfiles.add(self.csvfile1, self.csvfile2)
+
+    def tearDown(self):
+        for csvfile in (self.csvfile1, self.csvfile2):
+            csvfile.img_arrays.delete()
+            csvfile.label_array.delete()
+
+    def test_rows_are_memory_mapped(self):
+        """Test that single rows are views into the memory map"""
+        view = store.DatasetTensorView(self.dataset)
+
+        self.assertEqual(view.shape, (5, 2, 2))
+        self.assertIsInstance(view.parts[0], np.memmap)
+        self.assertTrue(np.shares_memory(view[4], view.parts[1]))
+        np.testing.assert_array_equal(view[3], self.pixels2[0])
+
+    def test_slice_within_csvfile_is_zero_copy(self):
+        """Test that a slice inside one csvfile is not copied"""
+        view = store.DatasetTensorView(self.dataset)
+
+        rows = view[0:2]
+
+        self.assertTrue(np.shares_memory(rows, view.parts[0]))
+        np.testing.assert_array_equal(rows, self.pixels1[:2])
+
+    def test_take_across_csvfiles(self):
+        """Test gathering rows spanning several csvfiles"""
+        view = store.DatasetTensorView(self.dataset)
+
+        rows = view[[4, 0, -3]]
+
+        expected = np.stack(
+            [self.pixels2[1], self.pixels1[0], self.pixels1[2]]
+        )
+        np.testing.assert_array_equal(rows, expected)
+        np.testing.assert_array_equal(view[1:5], np.concatenate(
+            [self.pixels1[1:], self.pixels2]
+        ))
+
+    def test_by_label(self):
+        """Test selecting the rows of a label"""
+        view = store.DatasetTensorView(self.dataset)
+
+        self.assertEqual(view.label_indices(self.dog).tolist(), [1, 3, 4])
+        np.testing.assert_array_equal(
+            view.by_label(self.cat), self.pixels1[[0, 2]]
+        )
+
+    def test_csvfile_without_store(self):
+        """Test that images missing from the store are not left out"""
+        legacy = Csvfile.objects.create(user=self.user, name='legacy',
+                                        labelcol=0, imgcolstart=1,
+                                        imgcolend=4)
+        self.dataset.csvfiles.add(legacy)
+        self.assertEqual(len(store.DatasetTensorView(self.dataset)), 5)
+
+        Image.objects.create(user=self.user, name='legacy_0',
+                             csvfile=legacy, row=0, label=self.cat)
+
+        with self.assertRaisesMessage(ValueError, "['legacy']"):
+            store.DatasetTensorView(self.dataset)
+
+
+class DatasetStatsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'testpass'
+        )
+        self.cat = Label.objects.create(user=self.user, name='cat')
+        self.dog = Label.objects.create(user=self.user, name='dog')
+        self.bird = Label.objects.create(user=self.user, name='bird')
+        rng = np.random.default_rng(0)
+        self.pixels = [
+            rng.integers(0, 256, size=(7, 2, 2), dtype=np.uint8),
+            rng.integers(0, 256, size=(5, 2, 2), dtype=np.uint8),
+        ]
+        self.label_ids = [
+            np.array([self.cat.id, self.dog.id, self.bird.id] * 2 +
+                     [self.cat.id]),
+            np.array([self.dog.id] * 4 + [self.bird.id]),
+        ]
+        self.dataset = Dataset.objects.create(user=self.user, name='MNIST')
+        self.dataset.labels.add(self.cat, self.dog)
+        for i, (pixels, label_ids) in enumerate(
+                zip(self.pixels, self.label_ids)):
+            csvfile = Csvfile.objects.create(
+                user=self.user, name=f'part_{i}', labelcol=0,
+                imgcolstart=1, imgcolend=4,
+                stats=store.pixel_stats(pixels, label_ids, chunk_rows=2)
+            )
+            self.dataset.csvfiles.add(csvfile)
+
+    def test_dataset_stats_merge_csvfiles(self):
+        """Test that merged statistics match a single pass over the rows"""
+        pixels = np.concatenate(self.pixels).reshape(12, -1)
+        label_ids = np.concatenate(self.label_ids)
+        kept = pixels[np.isin(label_ids, [self.cat.id, self.dog.id])]
+
+        stats = store.dataset_stats(self.dataset)
+
+        self.assertEqual(stats['rows'], len(kept))
+        self.assertEqual(stats['labels'], {'cat': 3, 'dog': 6})
+        np.testing.assert_allclose(stats['mean'], kept.mean(axis=0))
+        np.testing.assert_allclose(stats['std'], kept.std(axis=0))
+        self.assertEqual(stats['min'], kept.min())
+        self.assertEqual(stats['max'], kept.max())
+
+    def test_dataset_stats_empty(self):
+        """Test the statistics of a dataset without rows"""
+        dataset = Dataset.objects.create(user=self.user, name='empty')
+
+        stats = store.dataset_stats(dataset)
+
+        self.assertEqual(stats['rows'], 0)
+        self.assertEqual(stats['mean'], [])
+
+
+class StoreReplaceTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'testpass'
+        )
+        Label.objects.create(user=self.user, name='cat')
+        self.csvfile = Csvfile.objects.create(user=self.user,
+                                              name='train',
+                                              labelcol=0,
+                                              imgcolstart=1,
+                                              imgcolend=4
+                                              )
+        self.pixels = np.arange(8, dtype=np.uint8).reshape(2, 2, 2)
+        ingest.create_images(self.csvfile, np.array(['cat', 'cat']),
+                             self.pixels)
+        self.previous = (self.csvfile.img_arrays.name,
+                         self.csvfile.label_array.name)
+
+    def tearDown(self):
+        self.csvfile.refresh_from_db()
+        for name in self.previous + (self.csvfile.img_arrays.name,
+                                     self.csvfile.label_array.name):
+            default_storage.delete(name)
+
+    def test_replaced_files_deleted_on_commit(self):
+        """Test that the previous arrays outlive the transaction"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            ingest.create_images(self.csvfile, np.array(['cat']),
+                                 self.pixels[:1] + 1)
+
+        self.assertNotIn(self.csvfile.img_arrays.name, self.previous)
+        self.assertTrue(all(map(default_storage.exists, self.previous)))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(any(map(default_storage.exists, self.previous)))
+
+    def test_failed_ingest_keeps_store(self):
+        """Test that a rolled back ingest keeps the previous arrays"""
+        with mock.patch('dataset.ingest.duplicate_counts',
+                        side_effect=RuntimeError), \
+                mock.patch('dataset.store.release_files',
+                           wraps=store.release_files) as release, \
+                self.assertRaises(RuntimeError):
+            ingest.create_images(self.csvfile, np.array(['cat']),
+                                 self.pixels[:1] + 1)
+
+        self.csvfile.refresh_from_db()
+        self.assertEqual((self.csvfile.img_arrays.name,
+                          self.csvfile.label_array.name), self.previous)
+        np.testing.assert_array_equal(store.load_pixels(self.csvfile),
+                                      self.pixels)
+        written = [name for _, name in release.call_args.args[0]]
+        self.assertEqual(len(written), 2)
+        self.assertFalse(any(map(default_storage.exists, written)))
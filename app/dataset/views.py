@@ -1,25 +1,91 @@
-import csv
-import math
-import io
+import hashlib
+import re
+
 import numpy as np
-from PIL import Image as Img
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.text import slugify
 
 from rest_framework.decorators import action
+from rest_framework.exceptions import (
+    APIException, NotFound, ValidationError
+)
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
+
+from core import cache, jobs
+from core.cache import CachedListMixin
+from core.models import Csvfile, Dataset, Image, IngestJob, Label
+
+from user.authentication import CachingTokenAuthentication
+
+from dataset import (
+    batches, export, ingest, materialize, serializers, store
+)
+from dataset.pagination import ImageCursorPagination
+from dataset.renderers import (
+    PNGRenderer, BMPRenderer, NPZRenderer, NPYRenderer, IDXRenderer,
+    ParquetRenderer, BatchRenderer, BINARY_RENDERERS, JSON_RENDERERS
+)
+
+
+RENDER_MAX_SCALE = 16
+RENDER_MAX_IDS = 1024
+IMAGE_FILTERS = ('csvfile', 'label')
+IMAGE_COLUMNS = ('id', 'name', 'csvfile', 'row', 'label')
+BATCH_MAX_SIZE = 8192
+BATCH_RANGE = re.compile(r'^batches=(\d+)-$')
+CSVFILE_SUMMARIES = tuple(
+    f'csvfile__{name}' for name in Csvfile.SUMMARY_FIELDS
+)
+
+
+class PixelsMissing(APIException):
+    """The csvfile of an image has images but no stored pixels"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'csvfile is not in the tensor store, re-ingest it'
+    default_code = 'pixels_missing'
+
+
+class IngestRunning(APIException):
+    """The csvfile already has an ingest job pending or running"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'csvfile is being ingested, wait for its job to end'
+    default_code = 'ingest_running'
 
-from core.models import Label, Csvfile, Dataset, Image
 
-from dataset import serializers
+class LengthRequired(APIException):
+    """A streamed body came without a Content-Length"""
+    status_code = status.HTTP_411_LENGTH_REQUIRED
+    default_detail = 'the csv must be sent with a Content-Length'
+    default_code = 'length_required'
 
 
-class BaseDatasetAttrViewSet(viewsets.GenericViewSet,
+def _int_param(request, name, default, minimum, maximum):
+    """Return a bounded integer query parameter"""
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: 'must be an integer'})
+    if not minimum <= value <= maximum:
+        raise ValidationError(
+            {name: f'must be between {minimum} and {maximum}'}
+        )
+
+    return value
+
+
+class BaseDatasetAttrViewSet(CachedListMixin,
+                             viewsets.GenericViewSet,
                              mixins.ListModelMixin,
                              mixins.CreateModelMixin):
     """Base viewset for user owned dataset attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachingTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
@@ -27,13 +93,11 @@ class BaseDatasetAttrViewSet(viewsets.GenericViewSet,
         assigned_only = bool(
             int(self.request.query_params.get('assigned_only', 0))
         )
-        queryset = self.queryset
+        queryset = self.queryset.filter(user=self.request.user)
         if assigned_only:
-            queryset = queryset.filter(dataset__isnull=False)
+            queryset = queryset.filter(dataset__isnull=False).distinct()
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-name').distinct()
+        return queryset.order_by('-name')
 
     def perform_create(self, serializer):
         """Create a new object"""
@@ -44,6 +108,7 @@ class CsvfileViewSet(BaseDatasetAttrViewSet):
     """Manage csvfiles in the database"""
     queryset = Csvfile.objects.all()
     serializer_class = serializers.CsvfileSerializer
+    cache_models = (Csvfile, Dataset)
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -52,99 +117,484 @@ class CsvfileViewSet(BaseDatasetAttrViewSet):
 
         return self.serializer_class
 
+    def get_idle_csvfile(self):
+        """Return the csvfile unless one of its ingest jobs is unfinished"""
+        csvfile = self.get_object()
+        if csvfile.ingest_jobs.filter(
+                state__in=(IngestJob.PENDING, IngestJob.RUNNING)).exists():
+            raise IngestRunning()
+
+        return csvfile
+
     @action(methods=['POST'], detail=True, url_path='upload-csvfile')
     def upload_csvfile(self, request, pk=None):
         """Upload a csvfile to populate a dataset"""
-        csvfilefile = self.get_object()
+        csvfilefile = self.get_idle_csvfile()
+        create_labels = bool(
+            int(request.query_params.get('create_labels', 0))
+        )
+        allow_empty = bool(int(request.query_params.get('allow_empty', 0)))
         serializer = self.get_serializer(
             csvfilefile,
             data=request.data
         )
         if serializer.is_valid():
             serializer.save()
-            csvid = csvfilefile.id
-            csvfile = Csvfile.objects.filter(id=csvid)
-            user = csvfile[0].user
-            file = csvfilefile.file
-            labelcol = csvfilefile.labelcol
-            start = csvfilefile.imgcolstart
-            end = csvfilefile.imgcolend + 1
-            size = int(math.sqrt(end-start))
-            if size**2 != (end-start):
-                raise ValueError('size is not valid!')
-            csvf = file.open(mode='r')
-            reader = csv.reader(csvf, delimiter=',')
-            next(reader, None)  # skip the headers
-            for i, row in enumerate(reader):
-                label = Label.objects.filter(name=row[labelcol])
-                if label is None:
-                    raise ValueError('label is not valid!')
-                img = np.array(row[start:end]).reshape(size, size)
-                image = Img.fromarray(img.astype(np.uint8), 'L')
-                img_array = img.astype(float)/255
-                params = {
-                          'name': f'{csvid}_{i}',
-                          'csvfile': csvfile[0],
-                          'row': i,
-                          'label': label[0]
-                          }
-                newimg, _ = Image.objects.get_or_create(user=user, **params)
-                fimg = io.BytesIO()
-                image.save(fimg, 'bmp')
-                newimg.image.save("image.bmp", fimg, save=True)
-                fimg.close()
-                fnp = io.BytesIO()
-                np.save(fnp, img_array)
-                newimg.img_array.save("image.npy", fnp, save=True)
-                fimg.close()
-                newimg.save()
+            job = IngestJob.objects.create(
+                user=request.user,
+                csvfile=csvfilefile,
+                create_labels=create_labels,
+                allow_empty=allow_empty
+            )
+            jobs.submit(ingest.run_ingest_job, job.id,
+                        jobs=IngestJob.objects.filter(id=job.id))
+            job.refresh_from_db()
+            data = dict(serializer.data)
+            data['job'] = serializers.IngestJobSerializer(job).data
             return Response(
-                serializer.data,
-                status=status.HTTP_200_OK
+                data,
+                status=status.HTTP_202_ACCEPTED
                 )
-            file.close()
         return Response(
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(methods=['PUT'], detail=True, url_path='stream', url_name='stream')
+    def stream_csvfile(self, request, pk=None):
+        """Ingest a csv sent as the raw request body while it arrives"""
+        csvfile = self.get_idle_csvfile()
+        keep_raw = bool(int(request.query_params.get('keep_raw', 0)))
+        create_labels = bool(
+            int(request.query_params.get('create_labels', 0))
+        )
+        allow_empty = bool(int(request.query_params.get('allow_empty', 0)))
+        body = request.stream
+        # DRF gives no stream for a missing or zero Content-Length
+        if body is None:
+            raise LengthRequired()
+        chunks = iter(lambda: body.read(ingest.CHUNK_BYTES), b'')
+        job = IngestJob.objects.create(user=request.user, csvfile=csvfile,
+                                       create_labels=create_labels,
+                                       allow_empty=allow_empty)
+        ingest.ingest_stream(job, chunks, keep_raw=keep_raw)
+        job.refresh_from_db()
+        if job.state == IngestJob.FAILED:
+            return Response(
+                serializers.IngestJobSerializer(job).data,
+                status=status.HTTP_400_BAD_REQUEST
+                )
+
+        return Response(serializers.IngestJobSerializer(job).data)
+
+    @action(methods=['GET'], detail=True, url_path='ingest-status')
+    def ingest_status(self, request, pk=None):
+        """Return the progress of the latest ingest job of a csvfile"""
+        csvfile = self.get_object()
+        job = csvfile.ingest_jobs.order_by('-id').first()
+        if job is None:
+            raise NotFound('csvfile has no ingest job')
+
+        return Response(serializers.IngestJobSerializer(job).data)
+
 
-class DatasetViewSet(BaseDatasetAttrViewSet):
+class DatasetViewSet(BaseDatasetAttrViewSet, mixins.RetrieveModelMixin):
     """Manage datasets in the database"""
     queryset = Dataset.objects.all()
     serializer_class = serializers.DatasetSerializer
+    cache_models = (Dataset, Label, Csvfile)
+
+    def get_queryset(self):
+        """Return datasets with the related objects the action needs"""
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = queryset.prefetch_related(
+                Prefetch('labels', queryset=Label.objects.only('id')),
+                Prefetch('csvfiles', queryset=Csvfile.objects.only('id')),
+            )
+        elif self.action == 'retrieve':
+            queryset = queryset.prefetch_related('labels', 'csvfiles')
+
+        return queryset
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'retrieve':
             return serializers.DatasetDetailSerializer
+        if self.action == 'materialize_dataset':
+            return serializers.MaterializeSerializer
+        if self.action == 'dataset_members':
+            return serializers.DatasetMembersSerializer
 
         return self.serializer_class
 
+    @action(methods=['POST'], detail=True, url_path='materialize',
+            url_name='materialize')
+    def materialize_dataset(self, request, pk=None):
+        """Build the shuffled and split row index of a dataset"""
+        dataset = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            meta = materialize.materialize(dataset,
+                                           **serializer.validated_data)
+        except ValueError as exc:
+            raise ValidationError(str(exc))
+
+        return Response(meta)
+
+    @action(methods=['POST'], detail=True, url_path='members',
+            url_name='members')
+    def dataset_members(self, request, pk=None):
+        """Add and remove labels and csvfiles of a dataset in bulk"""
+        dataset = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        summary = {}
+        with transaction.atomic():
+            for name in ('labels', 'csvfiles'):
+                related = getattr(dataset, name)
+                current = set(related.values_list('id', flat=True))
+                added = set(data.get(f'add_{name}', [])) - current
+                removed = set(data.get(f'remove_{name}', [])) & current
+                if added:
+                    related.add(*added)
+                if removed:
+                    related.remove(*removed)
+                summary[name] = {
+                    'added': len(added),
+                    'removed': len(removed),
+                    'total': len(current | added) - len(removed),
+                }
+
+        return Response(summary)
+
+    @action(methods=['GET'], detail=True, url_path='batches',
+            url_name='batches', renderer_classes=(BatchRenderer,))
+    def stream_batches(self, request, pk=None):
+        """Stream shuffled mini-batches of a dataset as binary frames
+
+        A Range: batches=K- header resumes the stream at batch K with a
+        206 response.
+        """
+        dataset = self.get_object()
+        batch_size = _int_param(request, 'batch_size', 128, 1,
+                                BATCH_MAX_SIZE)
+        seed = _int_param(request, 'seed', 0, 0, 2**32 - 1)
+        epoch = _int_param(request, 'epoch', 0, 0, 2**32 - 1)
+        split = request.query_params.get('split')
+        try:
+            rows = store.dataset_rows(dataset) if split is None else \
+                materialize.split_rows(dataset, split)
+        except ValueError as exc:
+            raise ValidationError(str(exc))
+        if rows is None:
+            raise ValidationError({'split': f'split {split} is not valid!'})
+        view, indices, _, targets = rows
+        try:
+            plan = batches.BatchPlan(view, indices, targets, batch_size,
+                                     seed=seed, epoch=epoch)
+        except ValueError as exc:
+            raise ValidationError(str(exc))
+        match = BATCH_RANGE.match(request.headers.get('Range', ''))
+        start = int(match.group(1)) if match else 0
+        if match and start >= len(plan):
+            response = Response(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response['Content-Range'] = f'batches */{len(plan)}'
+            return response
+        response = StreamingHttpResponse(
+            plan.frames(start), content_type=BatchRenderer.media_type,
+            status=status.HTTP_206_PARTIAL_CONTENT if match
+            else status.HTTP_200_OK
+        )
+        response['Accept-Ranges'] = 'batches'
+        response['X-Batch-Count'] = str(len(plan))
+        response['X-Row-Count'] = str(len(indices))
+        if match:
+            response['Content-Range'] = \
+                f'batches {start}-{len(plan) - 1}/{len(plan)}'
+
+        return response
+
+    @action(methods=['GET'], detail=True, url_path='export',
+            url_name='export',
+            renderer_classes=(NPZRenderer, NPYRenderer, IDXRenderer,
+                              ParquetRenderer))
+    def export_dataset(self, request, pk=None):
+        """Stream the images and labels of a dataset as one file"""
+        dataset = self.get_object()
+        renderer = request.accepted_renderer
+        split = request.query_params.get('split')
+        try:
+            chunks = export.FORMATS[renderer.format](
+                export.DatasetExport(dataset, split=split)
+            )
+        except ValueError as exc:
+            raise ValidationError(str(exc))
+        response = StreamingHttpResponse(chunks,
+                                         content_type=renderer.media_type)
+        name = slugify(dataset.name) or 'dataset'
+        if split:
+            name = f'{name}-{slugify(split)}'
+        filename = f'{name}.{renderer.extension}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+        return response
 
-class ImageViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
+
+class ImageViewSet(viewsets.GenericViewSet,
+                   mixins.ListModelMixin,
+                   mixins.RetrieveModelMixin):
     """Manage images in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachingTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = Image.objects.all()
     serializer_class = serializers.ImageSerializer
+    pagination_class = ImageCursorPagination
+    renderer_classes = tuple(
+        api_settings.DEFAULT_RENDERER_CLASSES
+    ) + BINARY_RENDERERS
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
-        queryset = self.queryset
+        params = self.request.query_params
+        assigned_only = bool(int(params.get('assigned_only', 0)))
+        queryset = self.queryset.filter(user=self.request.user)
         if assigned_only:
-            queryset = queryset.filter(dataset__isnull=False)
+            queryset = queryset.filter(
+                csvfile__dataset__isnull=False
+            ).distinct()
+        for name in IMAGE_FILTERS:
+            if name in params:
+                value = _int_param(self.request, name, 0, 1, 2**63 - 1)
+                queryset = queryset.filter(**{name: value})
+        if 'dataset' in params:
+            dataset = _int_param(self.request, 'dataset', 0, 1, 2**63 - 1)
+            queryset = queryset.filter(
+                csvfile__dataset=dataset,
+                label__dataset=dataset
+            )
+        fields = params.get('fields')
+        if self.action == 'list' and fields:
+            queryset = queryset.only(
+                *(f for f in fields.split(',') if f in IMAGE_COLUMNS)
+            )
+        elif self.action == 'retrieve':
+            queryset = queryset.select_related('csvfile', 'label').defer(
+                *CSVFILE_SUMMARIES
+            )
+        elif self.action == 'render_image':
+            queryset = queryset.select_related('csvfile').defer(
+                *CSVFILE_SUMMARIES
+            )
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-name').distinct()
+        return queryset
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'retrieve':
             return serializers.ImageDetailSerializer
+        if self.action == 'relabel_images':
+            return serializers.ImageRelabelSerializer
+        if self.action == 'delete_images':
+            return serializers.ImageBulkSerializer
 
         return self.serializer_class
+
+    def get_serializer(self, *args, **kwargs):
+        """Return a serializer projected on the requested fields"""
+        fields = self.request.query_params.get('fields')
+        if self.action == 'list' and fields:
+            kwargs['fields'] = fields.split(',')
+
+        return super().get_serializer(*args, **kwargs)
+
+    def _lean(self):
+        return self.action == 'list' and bool(
+            int(self.request.query_params.get('lean', 0))
+        )
+
+    def get_renderers(self):
+        """Encode the json of the lean list with orjson when installed"""
+        renderers = super().get_renderers()
+        if self._lean():
+            renderers = [renderer() for renderer in JSON_RENDERERS] + \
+                renderers
+
+        return renderers
+
+    def list(self, request, *args, **kwargs):
+        """List images; with lean=1 straight from the database rows
+
+        The lean path pages over .values() dicts, which hold the very
+        fields of ImageSerializer, so no model or serializer field is
+        built per row.
+        """
+        if not self._lean():
+            return super().list(request, *args, **kwargs)
+        fields = request.query_params.get('fields')
+        fields = fields.split(',') if fields else list(IMAGE_COLUMNS)
+        unknown = set(fields) - set(IMAGE_COLUMNS)
+        if unknown:
+            raise ValidationError(
+                {'fields': f'unknown fields {sorted(unknown)}'}
+            )
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *dict.fromkeys(fields + ['id'])
+        )
+        page = self.paginate_queryset(queryset)
+        if 'id' not in fields:
+            page = [{name: row[name] for name in fields} for row in page]
+
+        return self.get_paginated_response(page)
+
+    def _bulk_queryset(self, data):
+        """Return the images selected by ids, or else by the filters"""
+        queryset = self.get_queryset()
+        if 'ids' in data:
+            return queryset.filter(id__in=data['ids'])
+        params = self.request.query_params
+        if not any(name in params for name in IMAGE_FILTERS + ('dataset',)):
+            raise ValidationError('ids or a filter is required')
+
+        return queryset
+
+    @action(methods=['POST'], detail=False, url_path='relabel',
+            url_name='relabel')
+    def relabel_images(self, request):
+        """Set the label of the selected images in one update
+
+        The label arrays of the stored csvfiles are rewritten as well,
+        so training and exports see the new labels.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        label = serializer.validated_data['label']
+        images = self._bulk_queryset(serializer.validated_data)
+        with transaction.atomic():
+            selected = images.count()
+            targets = images.exclude(label=label)
+            rows = {}
+            for csvfile_id, row in targets.values_list('csvfile_id', 'row'):
+                rows.setdefault(csvfile_id, []).append(row)
+            relabeled = Image.objects.filter(
+                id__in=targets.values('id')
+            ).update(label=label)
+            ingest.relabel_store(rows, label.id)
+        cache.bump(request.user.id, Image)
+
+        return Response({'selected': selected, 'relabeled': relabeled})
+
+    @action(methods=['POST'], detail=False, url_path='delete',
+            url_name='delete')
+    def delete_images(self, request):
+        """Delete the selected images in one transaction
+
+        Their stored rows are kept, so the rows of the csvfile stay
+        aligned, but marked deleted and left out of every dataset.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        images = self._bulk_queryset(serializer.validated_data)
+        with transaction.atomic():
+            rows = {}
+            for csvfile_id, row in images.values_list('csvfile_id', 'row'):
+                rows.setdefault(csvfile_id, []).append(row)
+            linking = set(
+                Image.objects.filter(duplicate_of__in=images.values('id'))
+                .values_list('csvfile_id', flat=True)
+            ) - set(rows)
+            _, deleted = Image.objects.filter(
+                id__in=images.values('id')
+            ).delete()
+            ingest.relabel_store(rows, store.DELETED_LABEL)
+            ingest.refresh_duplicates(linking)
+        cache.bump(request.user.id, Image)
+
+        return Response({'deleted': deleted.get(Image._meta.label, 0)})
+
+    def _render_response(self, request, etag_parts, load_pixels):
+        """Render pixels with a strong ETag, answering 304 when unchanged
+
+        Clients must revalidate every time, since a re-ingest keeps the
+        image ids of rows whose pixels change.
+        """
+        scale = _int_param(request, 'scale', 1, 1, RENDER_MAX_SCALE)
+        etag_key = repr((etag_parts, scale, request.accepted_renderer.format))
+        etag = f'"{hashlib.sha1(etag_key.encode()).hexdigest()}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            pixels = load_pixels()
+            if scale > 1:
+                pixels = pixels.repeat(scale, axis=0).repeat(scale, axis=1)
+            response = Response(pixels)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+
+        return response
+
+    @action(methods=['GET'], detail=True, url_path='render',
+            url_name='render', renderer_classes=(PNGRenderer, BMPRenderer))
+    def render_image(self, request, pk=None):
+        """Render an image from the pixels of its csvfile"""
+        image = self.get_object()
+        if not image.csvfile.img_arrays:
+            raise PixelsMissing()
+
+        return self._render_response(
+            request,
+            (image.csvfile.img_arrays.name, image.row),
+            lambda: store.image_pixels(image)
+        )
+
+    @action(methods=['GET'], detail=False, url_path='render',
+            url_name='render-batch',
+            renderer_classes=(PNGRenderer, BMPRenderer))
+    def render_batch(self, request):
+        """Render many images as one sprite sheet in the order of ids"""
+        try:
+            ids = [int(i) for i in request.query_params['ids'].split(',')]
+        except (KeyError, ValueError):
+            raise ValidationError({'ids': 'comma separated image ids'})
+        if len(ids) > RENDER_MAX_IDS:
+            raise ValidationError(
+                {'ids': f'at most {RENDER_MAX_IDS} images'}
+            )
+        cols = _int_param(request, 'cols', 16, 1, RENDER_MAX_IDS)
+        rows = {
+            pk: (csvfile_id, store_name, row)
+            for pk, csvfile_id, store_name, row in self.get_queryset().filter(
+                id__in=ids
+            ).values_list('id', 'csvfile_id', 'csvfile__img_arrays', 'row')
+        }
+        if len(rows) != len(set(ids)):
+            raise NotFound('image not found')
+        if not all(store_name for _, store_name, _ in rows.values()):
+            raise PixelsMissing()
+
+        def load_pixels():
+            csvfiles = Csvfile.objects.in_bulk(
+                {csvfile_id for csvfile_id, _, _ in rows.values()}
+            )
+            arrays = {
+                csvfile_id: store.load_pixels(csvfile, mmap_mode='r')
+                for csvfile_id, csvfile in csvfiles.items()
+            }
+            try:
+                pixels = np.stack([
+                    arrays[rows[pk][0]][rows[pk][2]] for pk in ids
+                ])
+            except ValueError:
+                raise ValidationError({'ids': 'images differ in size'})
+
+            return store.sprite_sheet(pixels, cols)
+
+        return self._render_response(
+            request,
+            ([rows[pk][1:] for pk in ids], cols),
+            load_pixels
+        )
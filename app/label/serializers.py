@@ -3,6 +3,9 @@ from rest_framework import serializers
 from core.models import Label
 
 
+BULK_MAX_LABELS = 1000
+
+
 class LabelSerializer(serializers.ModelSerializer):
     """Serializer for label objects"""
 
@@ -10,3 +13,12 @@ class LabelSerializer(serializers.ModelSerializer):
         model = Label
         fields = ('id', 'name')
         read_only_fields = ('id',)
+
+
+class LabelBulkSerializer(serializers.Serializer):
+    """Validate the names of labels created in bulk"""
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=BULK_MAX_LABELS,
+    )
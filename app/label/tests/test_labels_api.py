@@ -6,11 +6,13 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Label
+from core.tests.queries import QueryCountMixin
 
 from label.serializers import LabelSerializer
 
 
 LABELS_URL = reverse('label:label-list')
+BULK_URL = reverse('label:label-bulk')
 
 
 class PublicLabelsApiTests(TestCase):
@@ -26,7 +28,7 @@ class PublicLabelsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateLabelsApiTests(TestCase):
+class PrivateLabelsApiTests(QueryCountMixin, TestCase):
     """Test the authorized user labels API"""
 
     def setUp(self):
@@ -81,3 +83,33 @@ class PrivateLabelsApiTests(TestCase):
         res = self.client.post(LABELS_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_labels_constant_queries(self):
+        """Test that labels are listed in one uncached query"""
+        def grow(size):
+            while Label.objects.filter(user=self.user).count() < size:
+                Label.objects.create(user=self.user, name='cat')
+
+        self.assertConstantQueries(LABELS_URL, grow, num=2)
+
+    def test_bulk_create_labels(self):
+        """Test creating the missing labels of a list in one request"""
+        Label.objects.create(user=self.user, name='cat')
+        names = ['cat', 'dog', 'bird', 'dog']
+        with self.assertNumQueries(5):
+            res = self.client.post(BULK_URL, {'names': names},
+                                   format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual(res.data['existing'], 1)
+        labels = Label.objects.filter(user=self.user)
+        self.assertEqual(res.data['labels'],
+                         dict(labels.values_list('name', 'id')))
+        self.assertEqual(labels.count(), 3)
+
+    def test_bulk_create_labels_invalid(self):
+        """Test that an empty list of names is rejected"""
+        res = self.client.post(BULK_URL, {'names': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
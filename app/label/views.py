@@ -1,25 +1,70 @@
-from rest_framework import viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
+from django.db import transaction
+
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework import viewsets, mixins, status
 from rest_framework.permissions import IsAuthenticated
 
+from core import cache
+from core.cache import CachedListMixin
 from core.models import Label
 
+from user.authentication import CachingTokenAuthentication
+
 from label import serializers
 
 
-class LabelViewSet(viewsets.GenericViewSet,
+class LabelViewSet(CachedListMixin,
+                   viewsets.GenericViewSet,
                    mixins.ListModelMixin,
                    mixins.CreateModelMixin):
     """Manage labels in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachingTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = Label.objects.all()
     serializer_class = serializers.LabelSerializer
+    cache_models = (Label,)
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
         return self.queryset.filter(user=self.request.user).order_by('-name')
 
+    def get_serializer_class(self):
+        """Return appropriate serializer class"""
+        if self.action == 'bulk_create':
+            return serializers.LabelBulkSerializer
+
+        return self.serializer_class
+
     def perform_create(self, serializer):
         """Create a new label"""
         serializer.save(user=self.request.user)
+
+    @action(methods=['POST'], detail=False, url_path='bulk',
+            url_name='bulk')
+    def bulk_create(self, request):
+        """Create the missing labels of a list of names in one insert"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        names = list(dict.fromkeys(serializer.validated_data['names']))
+        with transaction.atomic():
+            existing = set(
+                self.get_queryset().filter(name__in=names)
+                .values_list('name', flat=True)
+            )
+            missing = [name for name in names if name not in existing]
+            Label.objects.bulk_create(
+                Label(user=request.user, name=name) for name in missing
+            )
+        if missing:
+            cache.bump(request.user.id, Label)
+        labels = dict(
+            self.get_queryset().filter(name__in=names)
+            .values_list('name', 'id')
+        )
+
+        return Response(
+            {'created': len(missing), 'existing': len(existing),
+             'labels': labels},
+            status=status.HTTP_201_CREATED if missing else status.HTTP_200_OK
+        )
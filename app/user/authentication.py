@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.authentication import TokenAuthentication
+
+
+SHARED_KEY_PREFIX = 'auth-token:'
+
+
+class TokenCache:
+    """Thread safe LRU of token keys to users whose entries expire
+
+    Entries live at most ttl seconds, so a missed invalidation is
+    bounded. With AUTH_TOKEN_SHARED_CACHE naming a Django cache, lookups
+    are shared through that cache and every local hit is confirmed
+    there, so a token discarded by any process stops authenticating in
+    all of them on the next request.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _shared(self):
+        alias = settings.AUTH_TOKEN_SHARED_CACHE
+        return caches[alias] if alias else None
+
+    def _ttl(self):
+        return self.ttl or settings.AUTH_TOKEN_CACHE_TTL
+
+    def get(self, key):
+        """Return the cached user and token of a token key or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                value = entry[1]
+            else:
+                self._entries.pop(key, None)
+                value = None
+        shared = self._shared()
+        if shared is None:
+            return value
+        if value is not None:
+            if SHARED_KEY_PREFIX + key in shared:
+                return value
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        value = shared.get(SHARED_KEY_PREFIX + key)
+        if value is not None:
+            self._store(key, value)
+
+        return value
+
+    def _store(self, key, value):
+        maxsize = self.maxsize or settings.AUTH_TOKEN_CACHE_SIZE
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def set(self, key, value):
+        """Remember the user and token of a token key"""
+        self._store(key, value)
+        shared = self._shared()
+        if shared is not None:
+            shared.set(SHARED_KEY_PREFIX + key, value, self._ttl())
+
+    def discard(self, *keys):
+        """Forget token keys"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        shared = self._shared()
+        if shared is not None:
+            shared.delete_many([SHARED_KEY_PREFIX + key for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """Token authentication answering repeated tokens from token_cache
+
+    A cached token needs no query. Entries are dropped when the token is
+    deleted or its user saved, see user.signals.
+    """
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+
+        return credentials
@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from user.authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Stop accepting a deleted token from the cache"""
+    token_cache.discard(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_saved_user_tokens(sender, instance, created, **kwargs):
+    """Drop the cached tokens of a user, e.g. after it was deactivated"""
+    if created:
+        return
+    token_cache.discard(
+        *Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
@@ -0,0 +1,136 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from user.authentication import (
+    CachingTokenAuthentication, TokenCache, token_cache
+)
+
+
+ME_URL = reverse('user:me')
+SHARED_CACHE = override_settings(
+    AUTH_TOKEN_SHARED_CACHE='tokens',
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'tokens': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tokens',
+        },
+    }
+)
+
+
+class CachingTokenAuthenticationTests(TestCase):
+    """Test caching the token lookups of authenticated requests"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@me.com',
+            'testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachingTokenAuthentication()
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_cached_token_needs_no_query(self):
+        """Test that a repeated token is authenticated without queries"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(token, self.token)
+
+    def test_request_with_cached_token(self):
+        """Test that an API request hits the cache after the first one"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_is_rejected(self):
+        """Test that deleting a token removes it from the cache"""
+        key = self.token.key
+        self.auth.authenticate_credentials(key)
+
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(key)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test that deactivating a user drops its cached token"""
+        self.auth.authenticate_credentials(self.token.key)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_entries_expire(self):
+        """Test that cached tokens are looked up again after the ttl"""
+        cache = TokenCache(ttl=10)
+        cache.set('key', 'credentials')
+
+        with mock.patch('user.authentication.time.monotonic',
+                        return_value=10**9):
+            self.assertIsNone(cache.get('key'))
+
+    def test_least_recently_used_is_evicted(self):
+        """Test that the cache keeps at most maxsize tokens"""
+        cache = TokenCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+
+    @SHARED_CACHE
+    def test_shared_cache(self):
+        """Test that lookups are shared and invalidated through a cache"""
+        self.auth.authenticate_credentials(self.token.key)
+        token_cache.clear()
+
+        with self.assertNumQueries(0):
+            user, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+
+        key = self.token.key
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(key)
+
+    @SHARED_CACHE
+    def test_discard_reaches_other_processes(self):
+        """Test that a token discarded in one process fails in another"""
+        first, second = TokenCache(), TokenCache()
+        credentials = (self.user, self.token)
+        first.set(self.token.key, credentials)
+        self.assertEqual(second.get(self.token.key), credentials)
+
+        first.discard(self.token.key)
+
+        self.assertIsNone(second.get(self.token.key))
+        self.assertIsNone(first.get(self.token.key))